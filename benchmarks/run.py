@@ -0,0 +1,271 @@
+"""
+Benchmarks for the scoring and training hot paths.
+
+    python -m benchmarks.run                                  # in-process scoring
+    python -m benchmarks.run --http --train                   # + HTTP and training
+    python -m benchmarks.run --sizes 1000,1000000 --output benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Results are written as JSON ({"meta", "metrics"}); --compare exits non-zero
+when any metric is worse than the baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.generate_data import generate_orders  # noqa: E402
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+DATE_COLS = ["order_date", "requested_ship_date", "promised_ship_date"]
+
+Metrics = Dict[str, Dict[str, object]]
+
+# Timed runs measure scoring, so the API's prediction cache is switched off
+# (otherwise every repeated row is a cache hit), and warmup rows come from a
+# different seed than the timed ones
+NO_CACHE_ENV = {"PREDICTION_CACHE_MB": "0", "PREDICTION_CACHE_DIR": ""}
+WARMUP_SEED = 8
+
+
+def _metric(metrics: Metrics, name: str, value: float, unit: str, better: str = "lower") -> None:
+    metrics[name] = {"value": round(float(value), 6), "unit": unit, "better": better}
+    print(f"  {name:<45} {value:>14.3f} {unit}")
+
+
+def _latency_metrics(metrics: Metrics, prefix: str, timings_ms: List[float]) -> None:
+    p50, p95, p99 = np.percentile(timings_ms, [50, 95, 99])
+    _metric(metrics, f"{prefix}.p50_ms", p50, "ms")
+    _metric(metrics, f"{prefix}.p95_ms", p95, "ms")
+    _metric(metrics, f"{prefix}.p99_ms", p99, "ms")
+
+
+def open_orders(n: int, seed: int = 7) -> pd.DataFrame:
+    """API-shaped open orders (ISO date strings, no label)."""
+    df = generate_orders(n=n, seed=seed).drop(columns=["late_flag"])
+    for col in DATE_COLS:
+        df[col] = df[col].dt.strftime("%Y-%m-%d")
+    return df
+
+
+def bench_inprocess(sizes: List[int], n_single: int) -> Metrics:
+    os.environ.update(NO_CACHE_ENV)
+    from starlette.requests import Request
+    from src import api, inference
+
+    print("⚙️ In-process scoring")
+    metrics: Metrics = {}
+    records = open_orders(max(n_single, 1)).to_dict(orient="records")
+
+    # Load the model (and the lazily unpickled sklearn estimator) outside the timings
+    inference.score_order(open_orders(1, seed=WARMUP_SEED).to_dict(orient="records")[0])
+    if api.get_model().has_sklearn:
+        api.get_model().sklearn_model
+    timings = []
+    for rec in records[:n_single]:
+        t0 = time.perf_counter()
+        inference.score_order(rec)
+        timings.append((time.perf_counter() - t0) * 1000)
+    _latency_metrics(metrics, "inprocess.score_order", timings)
+
+    for n in sizes:
+        orders = [api.OrderPayload(**rec) for rec in open_orders(n).to_dict(orient="records")]
+        # The handler reads the Accept header and parse timing off the request
+        request = Request({"type": "http", "method": "POST", "path": "/batch_score", "headers": []})
+        t0 = time.perf_counter()
+        asyncio.run(api.batch_score(orders, request))
+        elapsed = time.perf_counter() - t0
+        _metric(metrics, f"inprocess.batch_score.{n}.ms", elapsed * 1000, "ms")
+        _metric(metrics, f"inprocess.batch_score.{n}.rows_per_s", n / elapsed, "rows/s", "higher")
+    return metrics
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_http(sizes: List[int], n_single: int) -> Metrics:
+    import requests
+
+    print("🌐 HTTP scoring (local uvicorn)")
+    metrics: Metrics = {}
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env={**os.environ, **NO_CACHE_ENV},
+    )
+    try:
+        session = requests.Session()
+        for _ in range(100):
+            try:
+                session.get(url, timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+
+        records = open_orders(max(n_single, 1)).to_dict(orient="records")
+        # Warm up both the single-order and large-batch model paths
+        warmup = open_orders(1000, seed=WARMUP_SEED).to_dict(orient="records")
+        session.post(f"{url}/score_order", json=warmup[0]).raise_for_status()
+        session.post(f"{url}/batch_score", json=warmup, timeout=600).raise_for_status()
+        timings = []
+        for rec in records[:n_single]:
+            t0 = time.perf_counter()
+            session.post(f"{url}/score_order", json=rec).raise_for_status()
+            timings.append((time.perf_counter() - t0) * 1000)
+        _latency_metrics(metrics, "http.score_order", timings)
+
+        for n in sizes:
+            body = json.dumps(open_orders(n).to_dict(orient="records"))
+            t0 = time.perf_counter()
+            r = session.post(
+                f"{url}/batch_score",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=3600,
+            )
+            r.raise_for_status()
+            elapsed = time.perf_counter() - t0
+            _metric(metrics, f"http.batch_score.{n}.ms", elapsed * 1000, "ms")
+            _metric(metrics, f"http.batch_score.{n}.rows_per_s", n / elapsed, "rows/s", "higher")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return metrics
+
+
+_TRAIN_CHILD = """
+import json, resource, sys, time
+from pathlib import Path
+from src import train_model
+t0 = time.perf_counter()
+train_model.main(Path(sys.argv[1]), Path(sys.argv[2]), Path(sys.argv[3]))
+print(json.dumps({
+    "wall_s": time.perf_counter() - t0,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def bench_train(sizes: List[int]) -> Metrics:
+    print("🌲 Training (train_model.main in a fresh process per size)")
+    metrics: Metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            data_path = Path(tmp) / f"train_{n}.csv"
+            generate_orders(n=n, seed=42).to_csv(data_path, index=False)
+            out = subprocess.run(
+                [
+                    sys.executable, "-c", _TRAIN_CHILD,
+                    str(data_path), str(Path(tmp) / f"model_{n}"), str(Path(tmp) / f"aggregates_{n}"),
+                ],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            stats = json.loads(out.stdout.strip().splitlines()[-1])
+            _metric(metrics, f"train.{n}.wall_s", stats["wall_s"], "s")
+            _metric(metrics, f"train.{n}.peak_rss_mb", stats["peak_rss_mb"], "MB")
+    return metrics
+
+
+def _meta() -> Dict[str, object]:
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(current: Metrics, baseline: Metrics, tolerance: float) -> List[str]:
+    """
+    Print current vs baseline for shared metrics; return the regressions.
+    """
+    regressions = []
+    print(f"\n📏 Compared with baseline (tolerance {tolerance:.0%})")
+    for name in sorted(set(current) & set(baseline)):
+        cur, base = current[name]["value"], baseline[name]["value"]
+        if not base:
+            continue
+        change = (cur - base) / base
+        worse = change > tolerance if current[name]["better"] == "lower" else change < -tolerance
+        flag = "❌ REGRESSION" if worse else "ok"
+        print(f"  {name:<45} {base:>12.3f} -> {cur:>12.3f} ({change:+.1%}) {flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def _sizes(text: str) -> List[int]:
+    return [int(s) for s in text.split(",") if s]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_sizes, default=[1000, 10000, 100000], help="batch sizes (comma-separated)")
+    parser.add_argument("--single", type=int, default=500, help="single-order calls to time")
+    parser.add_argument("--no-inprocess", action="store_true", help="skip in-process scoring")
+    parser.add_argument("--http", action="store_true", help="also benchmark over HTTP with local uvicorn")
+    parser.add_argument("--train", action="store_true", help="also benchmark train_model.main")
+    parser.add_argument("--train-sizes", type=_sizes, default=[1000, 10000], help="training set sizes")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--compare", type=Path, help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    metrics: Metrics = {}
+    if not args.no_inprocess:
+        metrics.update(bench_inprocess(args.sizes, args.single))
+    if args.http:
+        metrics.update(bench_http(args.sizes, args.single))
+    if args.train:
+        metrics.update(bench_train(args.train_sizes))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({"meta": _meta(), "metrics": metrics}, indent=2))
+    print(f"💾 Results written to: {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["metrics"]
+        regressions = compare(metrics, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Rolling per-key history tables, refreshed from closed orders
+AGG_STORE_DIR = Path(os.getenv("AGG_STORE_DIR", ROOT / "data" / "aggregates"))
+# Months of history kept per key
+AGG_WINDOW_MONTHS = int(os.getenv("AGG_WINDOW_MONTHS", "12"))
+# Pseudo-orders at the global rate blended into each key (smooths rare keys)
+AGG_PRIOR_ORDERS = float(os.getenv("AGG_PRIOR_ORDERS", "20"))
+
+AGG_ENTITIES = ["customer_id", "item_id", "plant"]
+AGG_STATS = ["order_count", "late_rate", "lead_time_mean", "lead_time_std"]
+# Every feature the store can serve, e.g. "customer_id_late_rate"
+AGGREGATE_FEATURES = [f"{entity}_{stat}" for entity in AGG_ENTITIES for stat in AGG_STATS]
+
+# Per-(key, month) sums kept in the bucket tables
+_SUMS = ["count", "late", "lead", "lead_sq"]
+MANIFEST_NAME = "manifest.json"
+
+
+def _month_number(dates) -> np.ndarray:
+    return pd.to_datetime(np.asarray(dates)).values.astype("datetime64[M]").astype(np.int64)
+
+
+def _history_sums(history: pd.DataFrame) -> np.ndarray:
+    lead = history["historical_lead_time_days"].to_numpy(np.float64)
+    return np.column_stack([
+        np.ones(len(history)),
+        history["late_flag"].to_numpy(np.float64),
+        lead,
+        lead ** 2,
+    ])
+
+
+def _prior(grand: np.ndarray) -> np.ndarray:
+    lead_mean = grand[2] / grand[0]
+    return np.array([grand[1] / grand[0], lead_mean, grand[3] / grand[0] - lead_mean ** 2])
+
+
+def _features(totals: np.ndarray, prior: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Smoothed stats from (n, 4) sums [count, late, lead, lead_sq]; prior is
+    the global [late_rate, lead_mean, lead_var].
+    """
+    count = totals[:, 0]
+    weight = count + AGG_PRIOR_ORDERS
+    lead_mean = (totals[:, 2] + AGG_PRIOR_ORDERS * prior[1]) / weight
+    lead_sq = (totals[:, 3] + AGG_PRIOR_ORDERS * (prior[2] + prior[1] ** 2)) / weight
+    return {
+        "order_count": count,
+        "late_rate": (totals[:, 1] + AGG_PRIOR_ORDERS * prior[0]) / weight,
+        "lead_time_mean": lead_mean,
+        "lead_time_std": np.sqrt(np.maximum(lead_sq - lead_mean ** 2, 0.0)),
+    }
+
+
+def _feature_table(totals: np.ndarray, prior: np.ndarray) -> np.ndarray:
+    """
+    (n_keys + 1, len(AGG_STATS)) float32 table; the last row (all-zero
+    sums) is what an unseen key gets, i.e. the global prior.
+    """
+    totals = np.vstack([totals, np.zeros((1, len(_SUMS)))])
+    stats = _features(totals, prior)
+    return np.column_stack([stats[name] for name in AGG_STATS]).astype(np.float32)
+
+
+class AggregateStore:
+    """
+    Rolling per-customer / item / plant order history in array-indexed
+    tables: keys[i] owns row i of a (n_keys, window_months, 4) bucket array
+    of monthly sums and row i of a feature table holding the smoothed
+    window stats. Feature tables are memory-mapped for scoring; lookups
+    are one hash-index probe per key column, vectorized over the batch.
+    """
+
+    def __init__(self, directory: Path, keys, buckets, tables, slot_months, prior, watermark, generation=0):
+        self.directory = Path(directory)
+        self.generation = generation
+        self.keys = {e: pd.Index(keys[e], dtype=object) for e in keys}
+        self.buckets = buckets
+        self.tables = tables
+        self.slot_months = np.asarray(slot_months, dtype=np.int64)
+        self.prior = np.asarray(prior, dtype=np.float64)
+        self.watermark = watermark
+
+    @property
+    def window_months(self) -> int:
+        return len(self.slot_months)
+
+    @classmethod
+    def empty(cls, directory: Path, window_months: int = AGG_WINDOW_MONTHS) -> "AggregateStore":
+        return cls(
+            directory,
+            keys={e: np.array([], dtype=str) for e in AGG_ENTITIES},
+            buckets={e: np.zeros((0, window_months, len(_SUMS))) for e in AGG_ENTITIES},
+            tables={e: np.zeros((1, len(AGG_STATS)), dtype=np.float32) for e in AGG_ENTITIES},
+            slot_months=np.full(window_months, -1),
+            prior=[0.0, 0.0, 0.0],
+            watermark=None,
+        )
+
+    @classmethod
+    def load(cls, directory: Path = AGG_STORE_DIR) -> "AggregateStore":
+        directory = Path(directory)
+        manifest = json.loads((directory / MANIFEST_NAME).read_text())
+        gen = manifest["generation"]
+        return cls(
+            directory,
+            keys={e: np.load(directory / f"{e}_keys.{gen}.npy") for e in AGG_ENTITIES},
+            # Buckets are only needed to refresh, so they stay on disk until then
+            buckets={e: np.load(directory / f"{e}_buckets.{gen}.npy", mmap_mode="r") for e in AGG_ENTITIES},
+            # Plain ndarray views over the mapped pages (np.memmap indexing is slower)
+            tables={
+                e: np.load(directory / f"{e}_features.{gen}.npy", mmap_mode="r").view(np.ndarray)
+                for e in AGG_ENTITIES
+            },
+            slot_months=manifest["slot_months"],
+            prior=manifest["prior"],
+            watermark=manifest["watermark"],
+            generation=gen,
+        )
+
+    def refresh(self, history: pd.DataFrame, since_watermark: bool = True) -> int:
+        """
+        Add closed orders (needs late_flag) dated after the watermark, roll
+        the window forward and rebuild the feature tables. Returns rows
+        added. since_watermark=False takes every row, for building a store
+        from history read in chunks that are not in date order.
+        """
+        dates = pd.to_datetime(history["order_date"])
+        if since_watermark and self.watermark is not None:
+            history = history[dates > pd.Timestamp(self.watermark)]
+            dates = pd.to_datetime(history["order_date"])
+        if history.empty:
+            return 0
+
+        months = _month_number(dates)
+        latest = max(int(months.max()), int(self.slot_months.max()))
+        window = np.arange(latest - self.window_months + 1, latest + 1)
+        slots = window % self.window_months
+        stale = slots[self.slot_months[slots] != window]
+        keep = months >= window[0]
+        history, months = history[keep], months[keep]
+
+        sums = _history_sums(history)
+
+        totals = {}
+        for entity in AGG_ENTITIES:
+            values = history[entity].astype(str).to_numpy()
+            index = self.keys[entity]
+            new_keys = pd.unique(values[index.get_indexer(values) < 0])
+            index = index.append(pd.Index(new_keys)) if len(new_keys) else index
+            self.keys[entity] = index
+
+            buckets = np.zeros((len(index), self.window_months, len(_SUMS)))
+            buckets[:len(self.buckets[entity])] = self.buckets[entity]
+            # Slots whose month fell out of the window start over
+            buckets[:, stale] = 0.0
+            np.add.at(buckets, (index.get_indexer(values), months % self.window_months), sums)
+            self.buckets[entity] = buckets
+            totals[entity] = buckets.sum(axis=1)
+
+        self.slot_months[slots] = window
+        self.prior = _prior(totals[AGG_ENTITIES[0]].sum(axis=0))
+        self.tables = {e: _feature_table(totals[e], self.prior) for e in AGG_ENTITIES}
+        newest = str(dates.max().date())
+        self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+        return len(history)
+
+    def save(self) -> None:
+        """
+        Write the tables as a new generation, then switch the manifest to
+        it; readers never mix files from two refreshes.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        previous, gen = self.generation, self.generation + 1
+        for entity in AGG_ENTITIES:
+            np.save(self.directory / f"{entity}_keys.{gen}.npy", self.keys[entity].to_numpy(dtype=str))
+            np.save(self.directory / f"{entity}_buckets.{gen}.npy", np.asarray(self.buckets[entity]))
+            np.save(self.directory / f"{entity}_features.{gen}.npy", self.tables[entity])
+        manifest = {
+            "generation": gen,
+            "window_months": self.window_months,
+            "slot_months": self.slot_months.tolist(),
+            "prior": self.prior.tolist(),
+            "watermark": self.watermark,
+            "n_keys": {e: len(self.keys[e]) for e in AGG_ENTITIES},
+        }
+        tmp = self.directory / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=2))
+        tmp.replace(self.directory / MANIFEST_NAME)
+        self.generation = gen
+
+        # Processes still mapping the old generation keep their (unlinked) pages
+        for path in self.directory.glob(f"*.{previous}.npy"):
+            path.unlink()
+
+    def lookup(self, data: Mapping, names: Iterable[str] = AGGREGATE_FEATURES) -> Dict[str, np.ndarray]:
+        """
+        Aggregate features for a batch of orders (DataFrame or field ->
+        column mapping). Unseen keys get the global prior.
+        """
+        names = list(names)
+        out: Dict[str, np.ndarray] = {}
+        for entity in AGG_ENTITIES:
+            wanted = [n for n in names if n.startswith(f"{entity}_")]
+            if not wanted:
+                continue
+            index = self.keys[entity]
+            values = data[entity]
+            if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+                # Typed ERP frames: probe each category once, then map codes
+                cat = values.cat
+                codes = np.append(index.get_indexer(cat.categories.astype(str)), -1)[cat.codes]
+            else:
+                codes = index.get_indexer(pd.Index(np.asarray(values), dtype=object).astype(str))
+            codes[codes < 0] = len(index)
+            rows = self.tables[entity][codes]
+            for name in wanted:
+                out[name] = rows[:, AGG_STATS.index(name[len(entity) + 1:])]
+        return out
+
+    def lookup_one(self, record: Mapping, names: Iterable[str] = AGGREGATE_FEATURES) -> Dict[str, float]:
+        """
+        Single-order counterpart of lookup (one hash probe per key).
+        """
+        names = set(names)
+        out: Dict[str, float] = {}
+        for entity in AGG_ENTITIES:
+            index = self.keys[entity]
+            try:
+                code = index.get_loc(str(record[entity]))
+            except KeyError:
+                code = len(index)
+            row = self.tables[entity][code].tolist()
+            for stat, value in zip(AGG_STATS, row):
+                name = f"{entity}_{stat}"
+                if name in names:
+                    out[name] = value
+        return out
+
+
+_store: Optional[AggregateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> AggregateStore:
+    """
+    Shared lazy loader for the scoring path (memory-mapped on first use).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if not (AGG_STORE_DIR / MANIFEST_NAME).exists():
+                    raise FileNotFoundError(
+                        f"No aggregate store at {AGG_STORE_DIR}; build it with python -m src.train_model "
+                        "(or python -m src.aggregate_store) or set AGG_STORE_DIR"
+                    )
+                _store = AggregateStore.load(AGG_STORE_DIR)
+    return _store
+
+
+class PointInTimeAggregates:
+    """
+    Training-time aggregate features: each row sees only its keys' orders
+    from the window_months before its own order month, i.e. what the
+    store held when the order was scored. (Using the full store would leak
+    each row's own late_flag into its features.)
+
+    add() accumulates per (key, month) sums chunk by chunk, so history
+    can be streamed; lookup() then serves any chunk of it.
+    """
+
+    def __init__(self, window_months: int = AGG_WINDOW_MONTHS):
+        self.window_months = window_months
+        self._parts: Dict[str, list] = {e: [] for e in AGG_ENTITIES}
+        self._cum: Dict[str, np.ndarray] = {}
+        self._keys: Dict[str, pd.Index] = {}
+        self._first_month = 0
+        self.prior = np.zeros(3)
+
+    def add(self, history: pd.DataFrame) -> "PointInTimeAggregates":
+        months = _month_number(history["order_date"])
+        sums = pd.DataFrame(_history_sums(history), columns=_SUMS)
+        sums["month"] = months
+        for entity in AGG_ENTITIES:
+            sums["key"] = history[entity].astype(str).to_numpy()
+            self._parts[entity].append(sums.groupby(["key", "month"]).sum())
+        self._cum = {}
+        return self
+
+    def _build(self) -> None:
+        parts = {e: pd.concat(self._parts[e]).groupby(level=[0, 1]).sum() for e in AGG_ENTITIES}
+        self._parts = {e: [parts[e]] for e in AGG_ENTITIES}
+        months = parts[AGG_ENTITIES[0]].index.get_level_values(1)
+        self._first_month = int(months.min())
+        n_months = int(months.max()) - self._first_month + 1
+        self.prior = _prior(parts[AGG_ENTITIES[0]][_SUMS].to_numpy().sum(axis=0))
+
+        for entity, grouped in parts.items():
+            keys = grouped.index.get_level_values(0)
+            self._keys[entity] = pd.Index(keys.unique())
+            codes = self._keys[entity].get_indexer(keys)
+            m = grouped.index.get_level_values(1).to_numpy() - self._first_month
+            # cum[k, m] = sums for key k over months before m
+            cum = np.zeros((len(self._keys[entity]), n_months + 1, len(_SUMS)))
+            cum[codes, m + 1] = grouped[_SUMS].to_numpy()
+            np.cumsum(cum, axis=1, out=cum)
+            self._cum[entity] = cum
+
+    def lookup(self, data: pd.DataFrame, names: Iterable[str] = AGGREGATE_FEATURES) -> Dict[str, np.ndarray]:
+        if not self._cum:
+            self._build()
+        names = list(names)
+        months = _month_number(data["order_date"]) - self._first_month
+        start = np.maximum(months - self.window_months, 0)
+
+        out: Dict[str, np.ndarray] = {}
+        for entity in AGG_ENTITIES:
+            wanted = [n for n in names if n.startswith(f"{entity}_")]
+            if not wanted:
+                continue
+            codes = self._keys[entity].get_indexer(data[entity].astype(str).to_numpy())
+            cum = self._cum[entity]
+            totals = cum[codes, months] - cum[codes, start]
+            totals[codes < 0] = 0.0
+            stats = _features(totals, self.prior)
+            for name in wanted:
+                out[name] = stats[name[len(entity) + 1:]].astype(np.float32)
+        return out
+
+
+def point_in_time_features(
+    history: pd.DataFrame,
+    names: Iterable[str] = AGGREGATE_FEATURES,
+    window_months: int = AGG_WINDOW_MONTHS,
+) -> Dict[str, np.ndarray]:
+    """
+    PointInTimeAggregates over one in-memory frame.
+    """
+    return PointInTimeAggregates(window_months).add(history).lookup(history, names)
+
+
+def build_store(history: pd.DataFrame, directory: Path = AGG_STORE_DIR) -> AggregateStore:
+    """
+    Fresh store from a frame of closed orders (used by train_model).
+    """
+    store = AggregateStore.empty(directory)
+    store.refresh(history)
+    store.save()
+    return store
+
+
+if __name__ == "__main__":
+    from src.erp_client import load_open_orders
+
+    parser = argparse.ArgumentParser(description="Refresh the aggregate feature store")
+    parser.add_argument("--file", default="open_orders_train.csv", help="closed-order history CSV under data/")
+    parser.add_argument("--store-dir", type=Path, default=AGG_STORE_DIR)
+    args = parser.parse_args()
+
+    if (args.store_dir / MANIFEST_NAME).exists():
+        store = AggregateStore.load(args.store_dir)
+    else:
+        store = AggregateStore.empty(args.store_dir)
+    added = store.refresh(load_open_orders(args.file))
+    store.save()
+    print(f"📚 Added {added} orders; watermark {store.watermark} ({args.store_dir})")
@@ -1,22 +1,124 @@
-from pathlib import Path
-from typing import List
-from typing import List
+import io
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 
-
-import joblib
+import numpy as np
 import pandas as pd
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationInfo, field_validator
+
+from src.aggregate_store import get_store
+from src.backend import COUNTERS as BACKEND_COUNTERS
+from src.backend import AdmissionMiddleware, ScoringBackend
+from src.batching import MicroBatcher, QueueFull
+from src.inference import EXPLAIN_TOP_K, FLAT_FOREST_MAX_ROWS, explanation_basis, predict
+from src.metrics import MetricsMiddleware, MetricsRegistry
+from src.model_store import get_model
+from src.prediction_cache import COUNTERS as CACHE_COUNTERS
+from src.prediction_cache import PredictionCache, row_keys
+from src.schema import ORDER_RANGES, ColumnarValidationError, parse_date, validate_columns
+from src.serialize import COLUMNAR_JSON, ENCODERS, JSON, Drivers, negotiate, results_ndjson
+
+# Opt-in coalescing of concurrent /score_order calls into small batches
+COALESCE = os.getenv("SCORE_COALESCE", "0") == "1"
+COALESCE_MAX_WAIT_MS = float(os.getenv("COALESCE_MAX_WAIT_MS", "2"))
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "64"))
+COALESCE_MAX_QUEUE = int(os.getenv("COALESCE_MAX_QUEUE", "1024"))
+
+# Rows parsed and scored per chunk by /batch_score/stream
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "5000"))
+
+# Scoring lanes: worker processes for big batches (0 = none), plus
+# separate thread pools (0 = one thread per core) so interactive calls
+# don't queue behind bulk work
+SCORING_PROCESSES = int(os.getenv("SCORING_PROCESSES", "0"))
+POOL_MIN_ROWS = int(os.getenv("POOL_MIN_ROWS", "20000"))
+POOL_SHARD_ROWS = int(os.getenv("POOL_SHARD_ROWS", "10000"))
+INTERACTIVE_THREADS = int(os.getenv("INTERACTIVE_THREADS", "0"))
+BULK_THREADS = int(os.getenv("BULK_THREADS", "0"))
+# Load shedding: requests waiting per lane beyond its threads before new
+# ones get an immediate 503 + Retry-After
+INTERACTIVE_MAX_QUEUE = int(os.getenv("INTERACTIVE_MAX_QUEUE", "256"))
+BULK_MAX_QUEUE = int(os.getenv("BULK_MAX_QUEUE", "4"))
+
+# Prediction cache keyed by feature-row hash + scoring version (0 MB = off);
+# PREDICTION_CACHE_DIR adds an on-disk tier that survives restarts
+PREDICTION_CACHE_MB = float(os.getenv("PREDICTION_CACHE_MB", "64"))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", "86400"))
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR", "")
+
+backend = ScoringBackend(
+    processes=SCORING_PROCESSES,
+    pool_min_rows=POOL_MIN_ROWS,
+    pool_shard_rows=POOL_SHARD_ROWS,
+    interactive_threads=INTERACTIVE_THREADS,
+    bulk_threads=BULK_THREADS,
+    interactive_max_rows=FLAT_FOREST_MAX_ROWS,
+    interactive_max_queue=INTERACTIVE_MAX_QUEUE,
+    bulk_max_queue=BULK_MAX_QUEUE,
+)
+
+cache = (
+    PredictionCache(
+        int(PREDICTION_CACHE_MB * 2**20),
+        PREDICTION_CACHE_TTL_S,
+        disk_dir=PREDICTION_CACHE_DIR or None,
+    )
+    if PREDICTION_CACHE_MB > 0
+    else None
+)
+
+batcher = (
+    MicroBatcher(
+        predict,
+        COALESCE_MAX_WAIT_MS,
+        COALESCE_MAX_BATCH,
+        COALESCE_MAX_QUEUE,
+        executor=backend.interactive,
+    )
+    if COALESCE
+    else None
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the model and its aggregate store now, so the first request
+    # doesn't load them on the event loop and a missing artifact fails startup
+    if get_model().encoder.aggregates:
+        get_store()
+    backend.start()
+    if batcher is not None:
+        await batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    backend.stop()
+
 
-app = FastAPI(title="ERP AI Delay Risk API")
+app = FastAPI(title="ERP AI Delay Risk API", lifespan=lifespan)
 
-ROOT = Path(__file__).resolve().parents[1]
-MODEL_PATH = ROOT / "models" / "delay_model.pkl"
 
-# load model + training columns
-bundle = joblib.load(MODEL_PATH)
-model = bundle["model"]
-model_cols = bundle["columns"]
+@app.exception_handler(ColumnarValidationError)
+async def _validation_error(request: Request, exc: ColumnarValidationError) -> JSONResponse:
+    # Bad values caught past request parsing (e.g. by the encoder) are client errors too
+    return JSONResponse({"detail": exc.errors}, status_code=422)
+
+# Per-endpoint latency, per-stage timings and row counters, served at /metrics
+SCORING_ENDPOINTS = ["/score_order", "/batch_score", "/batch_score/columnar", "/batch_score/stream"]
+# Backend lane each endpoint is admitted to (shed requests still count in metrics)
+ENDPOINT_LANES = {endpoint: "bulk" for endpoint in SCORING_ENDPOINTS}
+ENDPOINT_LANES["/score_order"] = "interactive"
+app.add_middleware(AdmissionMiddleware, backend=backend, lanes=ENDPOINT_LANES)
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics, endpoints=SCORING_ENDPOINTS)
+metrics.register_source("backend", backend.counters, BACKEND_COUNTERS)
+if cache is not None:
+    metrics.register_source("prediction_cache", cache.counters, CACHE_COUNTERS)
 
 
 class OrderPayload(BaseModel):
@@ -37,119 +139,376 @@ class OrderPayload(BaseModel):
     weekday_ordered: int
     month_ordered: int
 
+    @field_validator("order_date", "requested_ship_date", "promised_ship_date")
+    @classmethod
+    def _parseable_date(cls, value: str) -> str:
+        # Same parser the encoder uses, so anything accepted here encodes
+        if np.isnat(parse_date(value)):
+            raise ValueError("not a date")
+        return value
+
+    @field_validator(*ORDER_RANGES)
+    @classmethod
+    def _in_range(cls, value: float, info: ValidationInfo) -> float:
+        # Same bounds as validate_columns, so every endpoint accepts the same orders
+        low, high = ORDER_RANGES[info.field_name]
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValueError(f"outside [{low}, {high}]")
+        return value
+
+
+# Keep ID-like columns as strings when parsing CSV (leading zeros etc.)
+STRING_FIELDS = {name: str for name, tp in OrderPayload.__annotations__.items() if tp is str}
+
 
 @app.get("/")
 def root():
     return {"status": "ok", "message": "ERP Delay Risk API is running"}
 
 
-@app.post("/score_order")
-def score_order(order: OrderPayload):
-    # 1) Turn payload into a one-row DataFrame
-    df = pd.DataFrame([order.dict()])
+@app.get("/model_info")
+def model_info():
+    """
+    Decision threshold and risk bands stored with the model, so clients
+    label risk the same way the API flags it.
+    """
+    m = get_model()
+    return {
+        "model_version": m.version,
+        "scoring_version": m.scoring_version,
+        "threshold": m.threshold,
+        "risk_bands": m.risk_bands,
+        "n_features": len(m.feature_cols),
+    }
+
+
+@app.get("/metrics")
+def get_metrics(format: str = "prometheus"):
+    """
+    Server-side request latency, per-stage timings (parse, validate, encode,
+    predict, serialize), batch sizes and scored-row counters. Prometheus text by
+    default; ?format=json returns p50/p95/p99 summaries per endpoint.
+    """
+    if format == "json":
+        return metrics.to_json()
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
 
-    # 2) One-hot encode like we did at training time
-    df = pd.get_dummies(df)
 
-    # 3) Add any missing training columns and align order
-    for col in model_cols:
-        if col not in df.columns:
-            df[col] = 0
-    df = df[model_cols]
+def _observe_parse(endpoint: str, request: Request) -> None:
+    # Body read + pydantic validation happen before the handler runs
+    start = getattr(request.state, "request_start", None)
+    if start is not None:
+        metrics.observe_stage(endpoint, "parse", (time.perf_counter() - start) * 1000)
 
-    # 4) Predict with the trained model
-    proba = model.predict_proba(df)[0][1]   # probability of late (class 1)
-    pred = int(model.predict(df)[0])
 
-    # 5) Return a JSON response
-    return {
-        "order_id": order.order_id,
-        "late_flag_pred": pred,
-        "late_probability": round(float(proba), 4)
-    }
-@app.post("/batch_score")
-def batch_score(orders: List[OrderPayload]):
+def _response_format(request: Request, default: str) -> str:
+    return negotiate(request.headers.get("accept"), default)
+
+
+def _encoded_response(fmt: str, order_ids, probs, preds, drivers: Optional[Drivers] = None) -> Response:
+    return Response(ENCODERS[fmt](order_ids, probs, preds, drivers), media_type=fmt)
+
+
+def _check_top_k(top_k: int) -> None:
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1")
+
+
+async def _score(endpoint: str, X, explain: bool, top_k: int):
     """
-    Score multiple orders in one call.
-    Accepts a JSON array of OrderPayload objects.
-    Returns per-order predictions plus summary stats.
+    Cached probs/flags, or (explain) fresh ones plus per-order drivers from
+    the same forest pass. Returns (probs, flags, drivers or None).
     """
-    if not orders:
-        return {"n_orders": 0, "late_count": 0, "results": []}
-
-    # 1) Turn list of payloads into DataFrame
-    df = pd.DataFrame([o.dict() for o in orders])
-
-    # 2) One-hot encode like training
-    df = pd.get_dummies(df)
-
-    # 3) Add any missing training columns and align order
-    for col in model_cols:
-        if col not in df.columns:
-            df[col] = 0
-    df = df[model_cols]
-
-    # 4) Predict with the trained model
-    probs = model.predict_proba(df)[:, 1]
-    preds = model.predict(df)
-
-    results = []
-    for order_obj, pred, prob in zip(orders, preds, probs):
-        results.append(
-            {
-                "order_id": order_obj.order_id,
-                "late_flag_pred": int(pred),
-                "late_probability": round(float(prob), 4),
-            }
+    if not explain:
+        with metrics.stage(endpoint, "predict"):
+            probs, preds = await _predict_cached(X, backend.predict)
+        return probs, preds, None
+    with metrics.stage(endpoint, "explain"):
+        probs, preds, top_fields, top_values = await backend.explain(X, top_k)
+    base, fields = explanation_basis()
+    names = np.array(fields, dtype=object)[top_fields]
+    return probs, preds, Drivers(base, names, top_values)
+
+
+def _cache_lookup(X):
+    keys = row_keys(X, get_model().scoring_version)
+    return (keys, *cache.lookup(keys))
+
+
+async def _predict_cached(X, score):
+    """
+    Serve rows from the prediction cache and send only the misses to
+    score (an async X -> (probs, flags)); fresh results are cached.
+    """
+    if cache is None:
+        return await score(X)
+
+    # Small batches hash inline; big ones go to the bulk lane
+    if len(X) <= FLAT_FOREST_MAX_ROWS:
+        keys, probs, flags, hit = _cache_lookup(X)
+    else:
+        keys, probs, flags, hit = await backend.run_bulk(_cache_lookup, X)
+    if hit.all():
+        return probs, flags
+
+    miss = np.flatnonzero(~hit)
+    miss_probs, miss_flags = await score(X[miss])
+    probs[miss], flags[miss] = miss_probs, miss_flags
+    miss_keys = [keys[i] for i in miss]
+    if len(miss) <= FLAT_FOREST_MAX_ROWS:
+        cache.store(miss_keys, miss_probs, miss_flags)
+    else:
+        await backend.run_bulk(cache.store, miss_keys, miss_probs, miss_flags)
+    return probs, flags
+
+
+async def _score_single(X):
+    # With coalescing on, concurrent calls share one forest pass
+    if batcher is None:
+        return await backend.predict(X)
+    try:
+        proba, pred = await batcher.submit(X)
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Scoring queue is full, retry shortly",
+            headers={"Retry-After": "1"},
         )
+    return np.array([proba]), np.array([pred], dtype=np.int8)
+
+
+@app.post("/score_order")
+async def score_order(order: OrderPayload, request: Request):
+    endpoint = "/score_order"
+    _observe_parse(endpoint, request)
+
+    # 1) Encode payload straight into a preallocated feature row, on the
+    #    interactive lane (date parsing and store lookups stay off the loop)
+    with metrics.stage(endpoint, "encode"):
+        X = await backend.run_interactive(get_model().encoder.transform_one, order.model_dump())
+
+    # 2) Predict once (or reuse a cached prediction for the same row);
+    #    the flag comes from the model's threshold
+    with metrics.stage(endpoint, "predict"):
+        probs, preds = await _predict_cached(X, _score_single)
+        proba, pred = float(probs[0]), int(preds[0])
+    metrics.observe_batch(endpoint, 1)
+
+    # 3) Return a JSON response
+    with metrics.stage(endpoint, "serialize"):
+        return JSONResponse({
+            "order_id": order.order_id,
+            "late_flag_pred": pred,
+            "late_probability": round(proba, 4)
+        })
+
+
+def _encode_payloads(orders: List[OrderPayload]):
+    df = pd.DataFrame([o.model_dump() for o in orders])
+    return get_model().encoder.transform(df)
 
-    late_count = int((preds == 1).sum())
 
-    return {
-        "n_orders": len(orders),
-        "late_count": late_count,
-        "results": results,
-    }
 @app.post("/batch_score")
-def batch_score(orders: List[OrderPayload]):
+async def batch_score(
+    orders: List[OrderPayload],
+    request: Request,
+    explain: bool = False,
+    top_k: int = EXPLAIN_TOP_K,
+):
     """
     Score multiple orders in one call.
     Accepts a JSON array of OrderPayload objects.
-    Returns per-order predictions plus summary stats.
+    Returns per-order predictions plus summary stats, as JSON by default
+    or in the format the Accept header asks for (see src/serialize.py).
+    With ?explain=true each order also gets its top_k drivers: the raw
+    fields that moved its probability most from the base probability.
     """
+    endpoint = "/batch_score"
+    _observe_parse(endpoint, request)
+    _check_top_k(top_k)
+    fmt = _response_format(request, JSON)
+    order_ids = [o.order_id for o in orders]
     if not orders:
-        return {"n_orders": 0, "late_count": 0, "results": []}
-
-    # Payloads -> DataFrame
-    df = pd.DataFrame([o.dict() for o in orders])
-
-    # One-hot encode
-    df = pd.get_dummies(df)
-
-    # Align with training columns
-    for col in model_cols:
-        if col not in df.columns:
-            df[col] = 0
-    df = df[model_cols]
-
-    # Predict
-    probs = model.predict_proba(df)[:, 1]
-    preds = model.predict(df)
-
-    results = []
-    for order_obj, pred, prob in zip(orders, preds, probs):
-        results.append(
-            {
-                "order_id": order_obj.order_id,
-                "late_flag_pred": int(pred),
-                "late_probability": round(float(prob), 4),
-            }
-        )
+        return _encoded_response(fmt, order_ids, np.empty(0), np.empty(0, dtype=np.int8))
 
-    late_count = int((preds == 1).sum())
+    # 1) Encode into the training feature layout (bulk lane)
+    with metrics.stage(endpoint, "encode"):
+        X = await backend.run_bulk(_encode_payloads, orders)
 
-    return {
-        "n_orders": len(orders),
-        "late_count": late_count,
-        "results": results,
-    }
+    # 2) Predict the cache misses once (or explain every row), on the lane that fits the batch size
+    probs, preds, drivers = await _score(endpoint, X, explain, top_k)
+    metrics.observe_batch(endpoint, len(orders))
+
+    # 3) Render results straight from the arrays, off the event loop
+    with metrics.stage(endpoint, "serialize"):
+        return await backend.run_bulk(_encoded_response, fmt, order_ids, probs, preds, drivers)
+
+
+def _encode_columns(payload: dict):
+    with metrics.stage("/batch_score/columnar", "validate"):
+        columns = validate_columns(payload)
+    with metrics.stage("/batch_score/columnar", "encode"):
+        return columns["order_id"], get_model().encoder.transform(columns)
+
+
+@app.post("/batch_score/columnar")
+async def batch_score_columnar(request: Request, explain: bool = False, top_k: int = EXPLAIN_TOP_K):
+    """
+    Score a column-oriented batch: one JSON object whose keys are the
+    OrderPayload field names and whose values are equal-length arrays.
+    Validation runs per column (dtype + range), with no per-order models,
+    and results come back as parallel arrays in the same order (or in
+    the format the Accept header asks for). ?explain=true adds drivers
+    as for /batch_score.
+    """
+    endpoint = "/batch_score/columnar"
+    _check_top_k(top_k)
+    fmt = _response_format(request, COLUMNAR_JSON)
+    body = await request.body()
+    try:
+        with metrics.stage(endpoint, "parse"):
+            payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON object")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Expected {field: [values...]}")
+
+    try:
+        order_ids, X = await backend.run_bulk(_encode_columns, payload)
+    except ColumnarValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors)
+
+    probs, preds, drivers = await _score(endpoint, X, explain, top_k)
+    metrics.observe_batch(endpoint, len(preds))
+
+    with metrics.stage(endpoint, "serialize"):
+        return await backend.run_bulk(_encoded_response, fmt, order_ids, probs, preds, drivers)
+
+
+async def _iter_lines(request: Request, quoted: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield non-empty lines from the request body as it arrives. quoted=True
+    yields CSV records instead: a line break inside a "quoted" field
+    continues the record.
+    """
+    buffer = b""
+    record: List[bytes] = []
+    in_quotes = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if quoted:
+                record.append(line)
+                in_quotes ^= line.count(b'"') % 2 == 1
+                if in_quotes:
+                    continue
+                line, record = b"\n".join(record), []
+            if line.strip():
+                yield line
+    line = b"\n".join([*record, buffer])
+    if line.strip():
+        yield line
+
+
+def _parse_chunk(lines: List[bytes], csv_header: Optional[bytes]):
+    """
+    Parse one chunk of NDJSON or CSV lines, validate it with the same
+    column checks as /batch_score/columnar and encode it. Returns
+    (order_ids, feature matrix); raises ColumnarValidationError with row
+    numbers relative to the chunk.
+    """
+    with metrics.stage("/batch_score/stream", "parse"):
+        if csv_header is None:
+            records, bad = [], []
+            for i, line in enumerate(lines):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    records.append(record)
+                else:
+                    bad.append(i)
+            if bad:
+                raise ColumnarValidationError(
+                    [{"loc": ["body"], "msg": "not a JSON object", "type": "json_invalid", "rows": bad[:10]}]
+                )
+            df = pd.DataFrame(records)
+        else:
+            try:
+                df = pd.read_csv(io.BytesIO(b"\n".join([csv_header, *lines])), dtype=STRING_FIELDS)
+            except ValueError:  # pandas ParserError included
+                raise ColumnarValidationError([{"loc": ["body"], "msg": "malformed CSV", "type": "csv_invalid"}])
+
+    with metrics.stage("/batch_score/stream", "validate"):
+        columns = validate_columns({c: df[c].to_numpy() for c in df.columns})
+    with metrics.stage("/batch_score/stream", "encode"):
+        return columns["order_id"], get_model().encoder.transform(columns)
+
+
+def _offset_rows(errors: List[dict], offset: int) -> List[dict]:
+    return [{**err, "rows": [offset + i for i in err["rows"]]} if "rows" in err else err for err in errors]
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator is still reading the request.
+    Starlette's disconnect listener would swallow request body messages on
+    older ASGI servers; a client disconnect surfaces from request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/batch_score/stream")
+async def batch_score_stream(request: Request):
+    """
+    Score an NDJSON (default) or CSV (Content-Type: text/csv) request body
+    in chunks of STREAM_CHUNK_ROWS, streaming NDJSON results back as each
+    chunk finishes. The last line is {"n_orders": ..., "late_count": ...}.
+    Rows are validated like /batch_score/columnar: a chunk with bad rows
+    ends the stream with {"error": "invalid rows", "detail": [...]}, whose
+    entries match a 422 body with rows counted from the first data row.
+    """
+    endpoint = "/batch_score/stream"
+    is_csv = "csv" in request.headers.get("content-type", "")
+
+    async def results():
+        n_orders = late_count = 0
+        first_row = 0  # stream row number of chunk[0]
+        csv_header = None
+        chunk: List[bytes] = []
+
+        async def flush():
+            nonlocal n_orders, late_count
+            order_ids, X = await backend.run_bulk(_parse_chunk, chunk, csv_header)
+            with metrics.stage(endpoint, "predict"):
+                probs, preds = await _predict_cached(X, backend.predict)
+            n_orders += len(preds)
+            late_count += int(preds.sum())
+            with metrics.stage(endpoint, "serialize"):
+                return await backend.run_bulk(results_ndjson, order_ids, probs, preds, None, False)
+
+        try:
+            async for line in _iter_lines(request, quoted=is_csv):
+                if is_csv and csv_header is None:
+                    csv_header = line
+                    continue
+                chunk.append(line)
+                if len(chunk) >= STREAM_CHUNK_ROWS:
+                    yield await flush()
+                    first_row += len(chunk)
+                    chunk = []
+            if chunk:
+                yield await flush()
+        except ColumnarValidationError as exc:
+            error = {"error": "invalid rows", "detail": _offset_rows(exc.errors, first_row)}
+            yield (json.dumps(error) + "\n").encode("utf-8")
+            return
+
+        metrics.observe_batch(endpoint, n_orders)
+        yield (json.dumps({"n_orders": n_orders, "late_count": late_count}) + "\n").encode("utf-8")
+
+    return _DuplexStreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,202 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pooled keep-alive connections per host (one per upload worker, plus headroom)
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "8"))
+# Retries after the first attempt, with exponential backoff from API_BACKOFF_S
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_BACKOFF_S = float(os.getenv("API_BACKOFF_S", "0.5"))
+# Batch uploads: CSV rows per request, and requests in flight at once
+BATCH_CHUNK_ROWS = int(os.getenv("BATCH_CHUNK_ROWS", "5000"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))
+
+# Overload / gateway statuses worth another attempt (scoring is idempotent)
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class ChunkProgress(NamedTuple):
+    index: int
+    done: int
+    total: int
+    rows: int
+    ms: float
+    attempts: int
+
+
+class BatchRejected(ValueError):
+    """
+    The stream endpoint ended a chunk with {"error", "detail"}. detail holds
+    the same entries as a 422 body, with rows counted from the upload's
+    first data row.
+    """
+
+    def __init__(self, message: str, detail: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.detail = detail
+
+
+def _csv_records(data: bytes) -> List[bytes]:
+    """
+    Split CSV bytes into records, keeping line endings. A line break inside
+    a quoted field continues the record (quotes are balanced at a record's
+    end; an escaped "" counts twice).
+    """
+    records: List[bytes] = []
+    pending: List[bytes] = []
+    in_quotes = False
+    for line in data.splitlines(keepends=True):
+        pending.append(line)
+        in_quotes ^= line.count(b'"') % 2 == 1
+        if not in_quotes:
+            records.append(b"".join(pending))
+            pending = []
+    if pending:
+        records.append(b"".join(pending))
+    return records
+
+
+class ScoringClient:
+    """
+    Client for the scoring API over one pooled requests.Session, so calls
+    reuse keep-alive connections instead of a new TCP/TLS handshake each.
+
+    Transient failures (connection errors, 429/502/503/504) are retried
+    with exponential backoff and jitter, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = API_POOL_SIZE,
+        retries: int = API_RETRIES,
+        backoff_s: float = API_BACKOFF_S,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _sleep_before_retry(self, attempt: int, response: Optional[requests.Response]) -> None:
+        delay = self.backoff_s * 2 ** attempt * (1 + random.random())
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        time.sleep(delay)
+
+    def _request(self, method: str, path: str, handle: Callable[[requests.Response], Any], **kwargs):
+        """
+        Send with retries; handle(response) runs inside the retry loop so
+        a stream cut off mid-body is retried too. Returns (result, attempts).
+        """
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                with self.session.request(method, f"{self.base_url}{path}", **kwargs) as r:
+                    if r.status_code in RETRY_STATUSES and not last:
+                        self._sleep_before_retry(attempt, r)
+                        continue
+                    r.raise_for_status()
+                    return handle(r), attempt + 1
+            except RETRY_ERRORS:
+                if last:
+                    raise
+                self._sleep_before_retry(attempt, None)
+
+    def get_json(self, path: str, timeout: float = 5, **kwargs) -> Any:
+        return self._request("GET", path, lambda r: r.json(), timeout=timeout, **kwargs)[0]
+
+    def score_order(self, payload: Dict[str, Any], timeout: float = 30) -> Dict[str, Any]:
+        return self._request("POST", "/score_order", lambda r: r.json(), json=payload, timeout=timeout)[0]
+
+    def _score_csv_chunk(self, body: bytes, first_row: int, timeout: float):
+        def collect(r: requests.Response):
+            results: List[Dict[str, Any]] = []
+            summary: Dict[str, Any] = {"n_orders": 0, "late_count": 0}
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                row = orjson.loads(line)
+                if "error" in row:
+                    detail = [
+                        {**err, "rows": [first_row + i for i in err["rows"]]} if "rows" in err else err
+                        for err in row.get("detail", [])
+                    ]
+                    raise BatchRejected(row["error"], detail)
+                if "n_orders" in row:
+                    summary = row
+                else:
+                    results.append(row)
+            return summary, results
+
+        return self._request(
+            "POST",
+            "/batch_score/stream",
+            collect,
+            data=body,
+            headers={"Content-Type": "text/csv"},
+            stream=True,
+            timeout=timeout,
+        )
+
+    def score_csv(
+        self,
+        data: bytes,
+        chunk_rows: int = BATCH_CHUNK_ROWS,
+        parallelism: int = BATCH_PARALLELISM,
+        on_progress: Optional[Callable[[ChunkProgress], None]] = None,
+        timeout: float = 60,
+    ) -> Dict[str, Any]:
+        """
+        Score a CSV upload as chunk_rows-row requests (each with the
+        header), at most parallelism in flight. on_progress is called on
+        the caller's thread as each chunk finishes; results come back in
+        input order. timeout applies per chunk, between streamed lines.
+        Invalid rows raise BatchRejected.
+        """
+        records = _csv_records(data) or [b""]
+        header, rows = records[0].rstrip(b"\r\n") + b"\n", records[1:]
+        if rows and not rows[-1].endswith(b"\n"):
+            rows[-1] += b"\n"
+        starts = range(0, max(len(rows), 1), chunk_rows)
+        chunks = [header + b"".join(rows[i:i + chunk_rows]) for i in starts]
+
+        def run(i: int):
+            t0 = time.perf_counter()
+            (summary, results), attempts = self._score_csv_chunk(chunks[i], starts[i], timeout)
+            return summary, results, (time.perf_counter() - t0) * 1000, attempts
+
+        parts: List[Optional[list]] = [None] * len(chunks)
+        n_orders = late_count = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(chunks)))) as pool:
+            futures = {pool.submit(run, i): i for i in range(len(chunks))}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    summary, results, ms, attempts = future.result()
+                    parts[i] = results
+                    n_orders += int(summary["n_orders"])
+                    late_count += int(summary["late_count"])
+                    if on_progress is not None:
+                        on_progress(ChunkProgress(i, done, len(chunks), len(results), ms, attempts))
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+
+        return {
+            "n_orders": n_orders,
+            "late_count": late_count,
+            "n_chunks": len(chunks),
+            "results": [row for part in parts for row in part],
+        }
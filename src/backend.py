@@ -0,0 +1,187 @@
+import asyncio
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.inference import explain, predict
+from src.model_store import get_model
+
+
+LANES = ("interactive", "bulk")
+# Monotonic counters in ScoringBackend.counters()
+COUNTERS = tuple(f"shed_{lane}" for lane in LANES)
+
+
+class Overloaded(Exception):
+    """Raised when a lane already has its limit of requests admitted."""
+
+
+def _warm_worker() -> int:
+    # Touch the model so a worker's first real shard doesn't pay for loading
+    return get_model().forest.n_trees
+
+
+class ScoringBackend:
+    """
+    Routes scoring work by size onto separate lanes:
+
+    - interactive: a small thread pool for single orders and small batches,
+      so their latency isn't stuck behind a backfill;
+    - bulk: a thread pool for encoding and mid-size batches;
+    - pool: optional worker processes for batches of pool_min_rows or more,
+      scored in shards of pool_shard_rows and merged back in order.
+
+    The pool is forked after the parent has loaded the model, so workers
+    share the memory-mapped forest (and the parent's sklearn pages) instead
+    of each loading a private copy.
+
+    Thread counts of 0 mean one per core. Each lane admits at most its
+    thread count plus max_queue requests (see AdmissionMiddleware); past
+    that, acquire() raises Overloaded instead of letting work queue up.
+    """
+
+    def __init__(
+        self,
+        processes: int = 0,
+        pool_min_rows: int = 20000,
+        pool_shard_rows: int = 10000,
+        interactive_threads: int = 0,
+        bulk_threads: int = 0,
+        interactive_max_rows: int = 256,
+        interactive_max_queue: int = 256,
+        bulk_max_queue: int = 4,
+    ):
+        cores = os.cpu_count() or 1
+        interactive_threads = interactive_threads or max(2, cores)
+        bulk_threads = bulk_threads or cores
+        self.processes = processes
+        self.pool_min_rows = pool_min_rows
+        self.pool_shard_rows = pool_shard_rows
+        self.interactive_max_rows = interactive_max_rows
+        self.interactive = ThreadPoolExecutor(interactive_threads, thread_name_prefix="score-interactive")
+        self.bulk = ThreadPoolExecutor(bulk_threads, thread_name_prefix="score-bulk")
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+        # Admission control; only touched from the event loop thread
+        self.limits = {
+            "interactive": interactive_threads + interactive_max_queue,
+            "bulk": bulk_threads + bulk_max_queue,
+        }
+        self.admitted = {lane: 0 for lane in LANES}
+        self.shed = {lane: 0 for lane in LANES}
+
+    def start(self) -> None:
+        if self.processes <= 0:
+            return
+        m = get_model()
+        if m.has_sklearn:
+            m.sklearn_model  # load before forking so workers inherit it
+        self.pool = ProcessPoolExecutor(self.processes, mp_context=mp.get_context("fork"))
+        # Fork every worker now, while the server is still single-threaded
+        for f in [self.pool.submit(_warm_worker) for _ in range(self.processes)]:
+            f.result()
+
+    def stop(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        self.interactive.shutdown(wait=False, cancel_futures=True)
+        self.bulk.shutdown(wait=False, cancel_futures=True)
+
+    def acquire(self, lane: str) -> None:
+        if self.admitted[lane] >= self.limits[lane]:
+            self.shed[lane] += 1
+            raise Overloaded(f"{self.admitted[lane]} {lane} requests in flight, retry shortly")
+        self.admitted[lane] += 1
+
+    def release(self, lane: str) -> None:
+        self.admitted[lane] -= 1
+
+    def counters(self) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for lane in LANES:
+            out[f"{lane}_admitted"] = self.admitted[lane]
+            out[f"{lane}_limit"] = self.limits[lane]
+            out[f"shed_{lane}"] = self.shed[lane]
+        return out
+
+    async def run_interactive(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.interactive, fn, *args)
+
+    async def run_bulk(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.bulk, fn, *args)
+
+    async def _score(self, fn, X: np.ndarray, *args) -> Tuple[np.ndarray, ...]:
+        """
+        fn(X, *args) -> tuple of per-row arrays, on whichever lane fits the
+        batch size; pool shards are concatenated back in order.
+        """
+        n_rows = len(X)
+        if n_rows <= self.interactive_max_rows:
+            return await self.run_interactive(fn, X, *args)
+        if self.pool is None or n_rows < self.pool_min_rows:
+            return await self.run_bulk(fn, X, *args)
+
+        loop = asyncio.get_running_loop()
+        shards = [
+            loop.run_in_executor(self.pool, fn, X[start:start + self.pool_shard_rows], *args)
+            for start in range(0, n_rows, self.pool_shard_rows)
+        ]
+        results = await asyncio.gather(*shards)
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    async def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        inference.predict on whichever lane fits the batch size.
+        """
+        return await self._score(predict, X)
+
+    async def explain(self, X: np.ndarray, top_k: int) -> Tuple[np.ndarray, ...]:
+        """
+        inference.explain (probs, flags, top fields, top contributions), laned like predict.
+        """
+        return await self._score(explain, X, top_k)
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware: admits each request on a scoring path to its
+    backend lane before the body is read or parsed, and answers 503 with
+    Retry-After straight away when the lane is full. The slot is held
+    until the response (streams included) has been sent.
+    """
+
+    def __init__(self, app, backend: ScoringBackend, lanes: Dict[str, str], retry_after_s: int = 1):
+        self.app = app
+        self.backend = backend
+        self.lanes = dict(lanes)
+        self.retry_after = str(retry_after_s).encode()
+
+    async def __call__(self, scope, receive, send):
+        lane = self.lanes.get(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            self.backend.acquire(lane)
+        except Overloaded as exc:
+            body = json.dumps({"detail": str(exc)}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", self.retry_after),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.backend.release(lane)
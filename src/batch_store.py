@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Scored batches shared by every dashboard session on this instance
+BATCH_STORE_DIR = Path(os.getenv("BATCH_STORE_DIR", ROOT / "data" / "batches"))
+# Batches older than this, or beyond the newest BATCH_STORE_MAX_BATCHES, are deleted on save
+BATCH_STORE_TTL_S = float(os.getenv("BATCH_STORE_TTL_S", "86400"))
+BATCH_STORE_MAX_BATCHES = int(os.getenv("BATCH_STORE_MAX_BATCHES", "100"))
+# Parquet row-group size: a page read touches one or two groups
+ROW_GROUP_ROWS = 10_000
+
+
+class ScoredBatchStore:
+    """
+    Scored batches (input columns + predictions) saved once as Parquet
+    under a batch ID. Sessions keep only the ID and read pages, columns
+    or a CSV export back from the file, so memory scales with page size
+    rather than batch size times viewers.
+    """
+
+    def __init__(
+        self,
+        directory: Path = BATCH_STORE_DIR,
+        ttl_s: float = BATCH_STORE_TTL_S,
+        max_batches: int = BATCH_STORE_MAX_BATCHES,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self.max_batches = max_batches
+
+    def _path(self, batch_id: str, suffix: str = ".parquet") -> Path:
+        if not batch_id.isalnum():
+            raise KeyError(batch_id)
+        return self.directory / f"{batch_id}{suffix}"
+
+    def save(self, df: pd.DataFrame) -> str:
+        batch_id = uuid.uuid4().hex
+        path = self._path(batch_id)
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, row_group_size=ROW_GROUP_ROWS)
+        tmp.replace(path)
+        self.evict()
+        return batch_id
+
+    def exists(self, batch_id: str) -> bool:
+        return self._path(batch_id).exists()
+
+    def n_rows(self, batch_id: str) -> int:
+        return pq.ParquetFile(self._path(batch_id)).metadata.num_rows
+
+    def page(self, batch_id: str, page: int, page_rows: int) -> pd.DataFrame:
+        """
+        Rows [page * page_rows, (page + 1) * page_rows), reading only the
+        row groups that hold them.
+        """
+        f = pq.ParquetFile(self._path(batch_id))
+        sizes = [f.metadata.row_group(i).num_rows for i in range(f.num_row_groups)]
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        start = page * page_rows
+        end = min(start + page_rows, int(bounds[-1]))
+        groups = [i for i in range(len(sizes)) if bounds[i] < end and bounds[i + 1] > start]
+        if not groups:
+            return f.schema_arrow.empty_table().to_pandas()
+        table = f.read_row_groups(groups)
+        offset = start - int(bounds[groups[0]])
+        return table.slice(offset, end - start).to_pandas()
+
+    def read(self, batch_id: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Whole batch, or just the named columns (those missing are skipped).
+        """
+        path = self._path(batch_id)
+        if columns is not None:
+            present = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in present]
+        return pq.read_table(path, columns=columns).to_pandas()
+
+    def export_csv(self, batch_id: str) -> Path:
+        """
+        CSV copy of a batch, written once (row group by row group) next to
+        the Parquet file and reused for later downloads.
+        """
+        path = self._path(batch_id, ".csv")
+        if not path.exists():
+            f = pq.ParquetFile(self._path(batch_id))
+            # Unique tmp name: concurrent sessions may export the same batch
+            tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp, "w", newline="") as out:
+                # Header from the schema, so an empty batch still gets one
+                f.schema_arrow.empty_table().to_pandas().to_csv(out, index=False)
+                for i in range(f.num_row_groups):
+                    f.read_row_group(i).to_pandas().to_csv(out, header=False, index=False)
+            tmp.replace(path)
+        return path
+
+    def evict(self) -> None:
+        batches = []
+        for path in self.directory.glob("*.parquet"):
+            try:
+                batches.append((path.stat().st_mtime, path))
+            except FileNotFoundError:  # evicted by a concurrent save
+                continue
+        batches.sort(reverse=True)
+        cutoff = time.time() - self.ttl_s
+        for i, (mtime, path) in enumerate(batches):
+            if i >= self.max_batches or mtime < cutoff:
+                path.unlink(missing_ok=True)
+                path.with_suffix(".csv").unlink(missing_ok=True)
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# score_fn: feature matrix -> (probabilities, flags), e.g. inference.predict
+ScoreFn = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+class QueueFull(Exception):
+    """Raised when the coalescing queue is at its depth limit."""
+
+
+def _fail(batch: List[Tuple[np.ndarray, asyncio.Future]], exc: BaseException) -> None:
+    for _, fut in batch:
+        if not fut.done():
+            fut.set_exception(exc)
+
+
+class MicroBatcher:
+    """
+    Coalesces single-order scoring calls into small matrices.
+
+    Requests wait at most max_wait_ms (or until max_batch rows are queued),
+    then the whole group is scored in one call on the executor and each
+    caller's future gets its own row back. submit() refuses new work once
+    max_queue rows are waiting, so callers can shed load instead of queueing.
+    """
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        max_wait_ms: float = 2.0,
+        max_batch: int = 64,
+        max_queue: int = 1024,
+        executor=None,
+    ):
+        self.score_fn = score_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the worker and fail every order still waiting, queued or mid-batch,
+        so no caller is left awaiting a future nobody will resolve.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            _fail(pending, RuntimeError("MicroBatcher stopped"))
+
+    async def submit(self, row: np.ndarray) -> Tuple[float, int]:
+        """
+        Queue one encoded (1, n_features) row; resolves to (probability, flag).
+        """
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher is not running; await start() first")
+        if self.depth >= self.max_queue:
+            raise QueueFull(f"{self.depth} orders already waiting")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, fut))
+        return await fut
+
+    async def _collect(self, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        """
+        Fill batch in place, so rows already taken off the queue are still
+        reachable if the worker is cancelled mid-collect.
+        """
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[np.ndarray, asyncio.Future]] = []
+            try:
+                await self._collect(batch)
+                X = np.vstack([row for row, _ in batch])
+                probs, flags = await loop.run_in_executor(self.executor, self.score_fn, X)
+            except asyncio.CancelledError:
+                _fail(batch, RuntimeError("MicroBatcher stopped"))
+                raise
+            except Exception as exc:
+                _fail(batch, exc)
+                continue
+            for (_, fut), prob, flag in zip(batch, probs, flags):
+                # Callers that disconnected have already cancelled their future
+                if not fut.done():
+                    fut.set_result((float(prob), int(flag)))
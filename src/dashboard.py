@@ -2,12 +2,16 @@ import os
 import hmac
 import time
 from datetime import date, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 import requests
 import pandas as pd
 import streamlit as st
 
+from src.api_client import BatchRejected, ChunkProgress, ScoringClient
+from src.batch_store import ScoredBatchStore
+from src.kpis import KPI_COLUMNS, batch_kpis
+
 
 # ============================================================
 # Page Config (MUST be first Streamlit call)
@@ -125,26 +129,64 @@ def _latency_stats(values: List[float]) -> Dict[str, Optional[float]]:
 # ============================================================
 # API helpers
 # ============================================================
+@st.cache_resource
+def get_client() -> ScoringClient:
+    """One pooled client per dashboard process: keep-alive connections are reused across reruns and sessions."""
+    return ScoringClient(API_URL)
+
 def score_single(payload: Dict[str, Any]) -> Dict[str, Any]:
     t0 = time.perf_counter()
-    r = requests.post(f"{API_URL}/score_order", json=payload, timeout=30)
-    ms = (time.perf_counter() - t0) * 1000
-    _record_latency(ms)
-    r.raise_for_status()
-    return r.json()
+    try:
+        return get_client().score_order(payload)
+    finally:
+        _record_latency((time.perf_counter() - t0) * 1000)
 
-def score_batch(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+def score_batch(csv_file, on_progress: Optional[Callable[[ChunkProgress], None]] = None) -> Dict[str, Any]:
+    """Upload a CSV to /batch_score/stream in parallel row chunks and collect the results."""
     t0 = time.perf_counter()
-    r = requests.post(f"{API_URL}/batch_score", json=records, timeout=60)
-    ms = (time.perf_counter() - t0) * 1000
-    _record_latency(ms)
-    r.raise_for_status()
-    return r.json()
+    result = get_client().score_csv(csv_file.getvalue(), on_progress=on_progress)
+    _record_latency((time.perf_counter() - t0) * 1000)
+    return result
+
+DEFAULT_RISK_BANDS = {"high": 0.70, "medium": 0.40}
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_risk_bands() -> Dict[str, float]:
+    """Risk bands stored with the deployed model (falls back to defaults)."""
+    try:
+        return get_client().get_json("/model_info")["risk_bands"]
+    except (requests.RequestException, KeyError, ValueError):
+        return DEFAULT_RISK_BANDS
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_server_metrics() -> Optional[Dict[str, Any]]:
+    """Server-side latency/stage percentiles from /metrics (None if unavailable)."""
+    try:
+        return get_client().get_json("/metrics", params={"format": "json"})
+    except (requests.RequestException, ValueError):
+        return None
+
+@st.cache_resource
+def get_batch_store() -> ScoredBatchStore:
+    """Scored batches on local disk, shared by all sessions; sessions hold only batch IDs."""
+    return ScoredBatchStore()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_batch_kpis(batch_id: str) -> Dict[str, Any]:
+    """KPI aggregates for one stored batch, computed once per batch ID (not per rerun or session)."""
+    return batch_kpis(get_batch_store().read(batch_id, KPI_COLUMNS))
+
+# Rows of a stored batch rendered per page in the Batch tab
+PAGE_ROWS = 1000
+
+def _fmt_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f} ms"
 
 def risk_label(prob: float) -> str:
-    if prob >= 0.70:
+    bands = fetch_risk_bands()
+    if prob >= bands["high"]:
         return "🔴 HIGH"
-    if prob >= 0.40:
+    if prob >= bands["medium"]:
         return "🟠 MEDIUM"
     return "🟢 LOW"
 
@@ -261,44 +303,51 @@ with tab1:
 with tab2:
     st.subheader("Batch Score Orders (CSV Upload)")
 
-    st.info("CSV must include ALL OrderPayload columns. If not, FastAPI will return a 422.")
+    st.info("CSV must include ALL OrderPayload columns. If not, the API reports the missing ones.")
 
     file = st.file_uploader("Upload CSV", type=["csv"])
 
     if file:
-        df = pd.read_csv(file)
         st.write("Input Preview")
-        st.dataframe(df.head(), use_container_width=True)
+        st.dataframe(pd.read_csv(file, nrows=5), use_container_width=True)
+        file.seek(0)
 
         if st.button("🚀 Score Batch"):
-            records = df.to_dict(orient="records")
+            progress = st.progress(0.0, text="Uploading…")
+            chunk_table = st.empty()
+            chunk_rows: List[Dict[str, Any]] = []
+
+            def show_progress(p: ChunkProgress) -> None:
+                chunk_rows.append({
+                    "chunk": p.index + 1,
+                    "rows": p.rows,
+                    "ms": round(p.ms),
+                    "attempts": p.attempts,
+                })
+                progress.progress(p.done / p.total, text=f"Scored chunk {p.done}/{p.total}")
+                chunk_table.dataframe(pd.DataFrame(chunk_rows).sort_values("chunk"), use_container_width=True)
 
             try:
-                with st.spinner("Scoring batch…"):
-                    result = score_batch(records)
+                result = score_batch(file, on_progress=show_progress)
 
                 # API returns: { n_orders, late_count, results:[{order_id, late_flag_pred, late_probability}] }
-                n_orders = int(result["n_orders"])
-                late_count = int(result["late_count"])
                 results_df = pd.DataFrame(result["results"])
-
-                # Join predictions back to input for KPI calculations / drill-down
-                merged = df.copy()
-                merged = merged.merge(results_df, on="order_id", how="left")
-
-                st.success(f"Batch complete: {late_count} late out of {n_orders} ({(late_count/max(n_orders,1)):.1%})")
-                st.dataframe(merged, use_container_width=True)
-
-                # Export
-                st.download_button(
-                    "⬇️ Download scored CSV",
-                    data=merged.to_csv(index=False).encode("utf-8"),
-                    file_name="scored_orders.csv",
-                    mime="text/csv",
-                )
-
-                # Store for KPI tab
-                st.session_state["last_batch_scored"] = merged
+                df = pd.read_csv(file)
+
+                # Join predictions back to input for KPI calculations / drill-down.
+                # Results come back in input order, so this is usually a column assign.
+                if len(results_df) == len(df) and (results_df["order_id"].astype(str).to_numpy() == df["order_id"].astype(str).to_numpy()).all():
+                    merged = df.assign(**{c: results_df[c].to_numpy() for c in results_df.columns if c != "order_id"})
+                else:
+                    merged = df.merge(results_df, on="order_id", how="left")
+
+                # Saved once for paging, export and the KPI tab; the session keeps only the ID
+                st.session_state["last_batch_id"] = get_batch_store().save(merged)
+                st.session_state["last_batch_summary"] = {
+                    "n_orders": int(result["n_orders"]),
+                    "late_count": int(result["late_count"]),
+                }
+                del df, merged, results_df, result
 
             except requests.HTTPError as e:
                 st.error(f"API error: {e}")
@@ -306,6 +355,37 @@ with tab2:
                     st.code(e.response.text)
                 except Exception:
                     pass
+            except BatchRejected as e:
+                st.error(f"API rejected the batch: {e}")
+                st.json(e.detail)
+            except ValueError as e:
+                st.error(f"API rejected the batch: {e}")
+            except requests.RequestException as e:
+                st.error(f"API unreachable after retries: {e}")
+
+    batch_id = st.session_state.get("last_batch_id")
+    store = get_batch_store()
+    if batch_id and store.exists(batch_id):
+        summary = st.session_state["last_batch_summary"]
+        n_orders, late_count = summary["n_orders"], summary["late_count"]
+        st.success(f"Batch complete: {late_count} late out of {n_orders} ({(late_count/max(n_orders,1)):.1%})")
+
+        n_rows = store.n_rows(batch_id)
+        n_pages = max(-(-n_rows // PAGE_ROWS), 1)
+        page = st.number_input(f"Page (of {n_pages}, {PAGE_ROWS:,} rows each)", min_value=1, max_value=n_pages, value=1)
+        st.dataframe(store.page(batch_id, page - 1, PAGE_ROWS), use_container_width=True)
+
+        # Export: CSV written from the stored batch on first click, then reused.
+        # Deferred data needs streamlit>=1.52; Streamlit reads the handle into
+        # its media store only when the button is clicked.
+        st.download_button(
+            "⬇️ Download scored CSV",
+            data=lambda: open(store.export_csv(batch_id), "rb"),
+            file_name="scored_orders.csv",
+            mime="text/csv",
+        )
+    elif batch_id:
+        st.warning("The last scored batch has expired; score it again.")
 
 
 # ============================================================
@@ -314,12 +394,33 @@ with tab2:
 with tab3:
     st.subheader("ERP KPIs, Charts, and Latency")
 
-    # Latency block (client-side)
+    # Latency block (server-side, all clients)
+    server = fetch_server_metrics()
+    endpoints = (server or {}).get("endpoints", {})
+    if endpoints:
+        endpoint = st.selectbox("Endpoint", sorted(endpoints), key="metrics_endpoint")
+        ep = endpoints[endpoint]
+        lat = ep["latency_ms"]
+        a, b, c, d = st.columns(4)
+        a.metric("Server p50", _fmt_ms(lat["p50"]))
+        b.metric("Server p95", _fmt_ms(lat["p95"]))
+        c.metric("Server p99", _fmt_ms(lat["p99"]))
+        d.metric("Rows/sec", "-" if ep["rows_per_sec"] is None else f"{ep['rows_per_sec']:,.0f}")
+
+        # Requests rejected before scoring (422, 503) record no stages
+        if ep["stages_ms"]:
+            stages = pd.DataFrame(ep["stages_ms"]).T[["count", "p50", "p95", "p99"]]
+            st.caption("Per-stage server timings (ms)")
+            st.dataframe(stages.round(2), use_container_width=True)
+    else:
+        st.info("Server metrics unavailable (no scoring calls yet, or /metrics unreachable).")
+
+    # Round trips from this session (client-side)
     lat_stats = _latency_stats(st.session_state.latency_ms)
     a, b, c, d = st.columns(4)
-    a.metric("Latency p50", "-" if lat_stats["p50"] is None else f"{lat_stats['p50']:.0f} ms")
-    b.metric("Latency p95", "-" if lat_stats["p95"] is None else f"{lat_stats['p95']:.0f} ms")
-    c.metric("Latency Avg", "-" if lat_stats["avg"] is None else f"{lat_stats['avg']:.0f} ms")
+    a.metric("Round-trip p50", "-" if lat_stats["p50"] is None else f"{lat_stats['p50']:.0f} ms")
+    b.metric("Round-trip p95", "-" if lat_stats["p95"] is None else f"{lat_stats['p95']:.0f} ms")
+    c.metric("Round-trip Avg", "-" if lat_stats["avg"] is None else f"{lat_stats['avg']:.0f} ms")
     d.metric("Last Call", "-" if st.session_state.last_latency_ms is None else f"{st.session_state.last_latency_ms:.0f} ms")
 
     if st.session_state.latency_ms:
@@ -327,40 +428,21 @@ with tab3:
 
     st.divider()
 
-    batch = st.session_state.get("last_batch_scored")
-    if batch is None:
+    batch_id = st.session_state.get("last_batch_id")
+    if batch_id is None or not get_batch_store().exists(batch_id):
         st.warning("Run a batch score first to populate KPIs and charts.")
         st.stop()
 
-    # ---- ERP-style KPIs ----
-    # On-time % is approximated as (1 - late_probability thresholded or late_flag_pred)
-    total = len(batch)
-    late_count = int((batch["late_flag_pred"] == 1).sum()) if "late_flag_pred" in batch.columns else 0
-    late_rate = late_count / max(total, 1)
-    on_time_rate = 1.0 - late_rate
-
-    avg_lead = float(batch["historical_lead_time_days"].mean()) if "historical_lead_time_days" in batch.columns else float("nan")
-    avg_supplier_rel = float(batch["supplier_reliability_score"].mean()) if "supplier_reliability_score" in batch.columns else float("nan")
-
-    # ATP ratio (Available-to-Promise proxy)
-    if {"current_available_qty", "order_qty"}.issubset(set(batch.columns)):
-        atp_ratio = float((batch["current_available_qty"] / batch["order_qty"].clip(lower=1)).clip(upper=1).mean())
-    else:
-        atp_ratio = float("nan")
-
-    # Backlog proxy (open customer orders)
-    backlog_avg = float(batch["num_open_orders_customer"].mean()) if "num_open_orders_customer" in batch.columns else float("nan")
-
-    # Finance risk proxy (past due invoices rate)
-    past_due_rate = float(batch["past_due_invoices_flag"].mean()) if "past_due_invoices_flag" in batch.columns else float("nan")
+    # ---- ERP-style KPIs (aggregated once per batch) ----
+    kpis = cached_batch_kpis(batch_id)
 
     k1, k2, k3, k4, k5, k6 = st.columns(6)
-    k1.metric("Orders Scored", f"{total}")
-    k2.metric("On-Time %", f"{on_time_rate:.1%}")
-    k3.metric("Late %", f"{late_rate:.1%}")
-    k4.metric("Avg Lead Time (days)", "-" if pd.isna(avg_lead) else f"{avg_lead:.2f}")
-    k5.metric("ATP Ratio (avg)", "-" if pd.isna(atp_ratio) else f"{atp_ratio:.2f}")
-    k6.metric("Past Due Rate", "-" if pd.isna(past_due_rate) else f"{past_due_rate:.1%}")
+    k1.metric("Orders Scored", f"{kpis['total']}")
+    k2.metric("On-Time %", f"{kpis['on_time_rate']:.1%}")
+    k3.metric("Late %", f"{kpis['late_rate']:.1%}")
+    k4.metric("Avg Lead Time (days)", "-" if pd.isna(kpis["avg_lead"]) else f"{kpis['avg_lead']:.2f}")
+    k5.metric("ATP Ratio (avg)", "-" if pd.isna(kpis["atp_ratio"]) else f"{kpis['atp_ratio']:.2f}")
+    k6.metric("Past Due Rate", "-" if pd.isna(kpis["past_due_rate"]) else f"{kpis['past_due_rate']:.1%}")
 
     st.divider()
 
@@ -369,27 +451,35 @@ with tab3:
 
     with c1:
         st.markdown("**Risk Distribution (late_probability)**")
-        if "late_probability" in batch.columns:
-            st.bar_chart(batch["late_probability"])
+        if kpis["risk_dist"] is not None:
+            st.bar_chart(kpis["risk_dist"])
         else:
             st.info("No late_probability column found. (Batch should include it from API results.)")
 
     with c2:
         st.markdown("**Late Probability Histogram**")
-        if "late_probability" in batch.columns:
-            hist = pd.cut(batch["late_probability"], bins=[0, .2, .4, .6, .8, 1.0]).value_counts().sort_index()
-            st.bar_chart(hist)
+        if kpis["risk_hist"] is not None:
+            st.bar_chart(kpis["risk_hist"])
         else:
             st.info("No late_probability column found.")
 
     st.divider()
 
+    if kpis["groups"]:
+        st.markdown("**Highest-risk plants, customers and items** (by expected late orders)")
+        for col, tab in zip(kpis["groups"], st.tabs([c.replace("_id", "").title() for c in kpis["groups"]])):
+            with tab:
+                st.dataframe(kpis["groups"][col], use_container_width=True)
+
+        st.divider()
+
     st.markdown("**Supplier Reliability vs Predicted Risk**")
-    if {"supplier_reliability_score", "late_probability"}.issubset(set(batch.columns)):
-        scatter = batch[["supplier_reliability_score", "late_probability"]].copy()
-        st.scatter_chart(scatter, x="supplier_reliability_score", y="late_probability")
+    if kpis["scatter"] is not None:
+        if len(kpis["scatter"]) < kpis["total"]:
+            st.caption(f"Random sample of {len(kpis['scatter']):,} of {kpis['total']:,} orders")
+        st.scatter_chart(kpis["scatter"], x="supplier_reliability_score", y="late_probability")
     else:
         st.info("Missing columns for supplier vs risk chart.")
 
     if DEBUG_UI:
-        st.write("Batch columns:", list(batch.columns))
+        st.write("Batch ID:", batch_id)
@@ -1,20 +1,153 @@
- import pandas as pd
+import hashlib
+import os
 from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.order_delta import FingerprintStore, OrderDelta
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
 
+# Parquet copies of ERP extracts, reused while the source CSV is unchanged
+CACHE_DIR = Path(os.getenv("ERP_CACHE_DIR", DATA_DIR / ".cache"))
+# Rows per chunk when reading an extract
+ERP_CHUNK_ROWS = int(os.getenv("ERP_CHUNK_ROWS", "250000"))
+
+# Explicit extract schema: categorical keys, downcast ints, float32 measures
+# (columns missing from an extract are ignored)
+ERP_DTYPES = {
+    "order_id": str,
+    "customer_id": "category",
+    "item_id": "category",
+    "plant": "category",
+    "order_priority": "int8",
+    "order_qty": "int32",
+    "current_available_qty": "int32",
+    "historical_lead_time_days": "float32",
+    "supplier_reliability_score": "float32",
+    "num_open_orders_customer": "int32",
+    "past_due_invoices_flag": "int8",
+    "weekday_ordered": "int8",
+    "month_ordered": "int8",
+    "late_flag": "int8",
+}
+DATE_COLS = ["order_date", "requested_ship_date", "promised_ship_date"]
+# Bump when ERP_DTYPES changes so stale caches are rebuilt
+CACHE_FORMAT = "2"
+
+
+def _cache_path(csv_path: Path) -> Path:
+    # Keyed by the source's path, size and mtime: a changed or same-named
+    # extract never reads another file's cache
+    st = csv_path.stat()
+    key = f"{csv_path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{CACHE_FORMAT}"
+    return CACHE_DIR / f"{csv_path.stem}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.parquet"
+
+
+def _source_stamp(csv_path: Path) -> dict:
+    st = csv_path.stat()
+    return {
+        b"erp_source": csv_path.name.encode(),
+        b"erp_source_size": str(st.st_size).encode(),
+        b"erp_source_mtime_ns": str(st.st_mtime_ns).encode(),
+        b"erp_cache_format": CACHE_FORMAT.encode(),
+    }
+
+
+def _cache_is_fresh(csv_path: Path) -> bool:
+    cache = _cache_path(csv_path)
+    if not cache.exists():
+        return False
+    metadata = pq.read_schema(cache).metadata or {}
+    stamp = _source_stamp(csv_path)
+    return all(metadata.get(k) == v for k, v in stamp.items())
+
+
+def _arrow_schema(chunk: pd.DataFrame, stamp: dict) -> pa.Schema:
+    """
+    Cache schema fixed from the first chunk, with int32 dictionary indices:
+    pandas sizes category codes per chunk (int8 for <128 values, int16
+    beyond), so later chunks would otherwise not match the writer.
+    """
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    fields = [
+        pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+        for f in schema
+    ]
+    return pa.schema(fields, metadata={**(schema.metadata or {}), **stamp})
+
+
+def iter_open_orders(
+    filename: str = "open_orders_train.csv", chunk_rows: int = ERP_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the extract as typed DataFrames of up to chunk_rows rows.
+
+    Reads from the Parquet cache when it matches the CSV (size + mtime);
+    otherwise parses the CSV chunk by chunk and writes the cache as it goes
+    (kept only if the whole file is read).
+    """
+    csv_path = DATA_DIR / filename
+    cache = _cache_path(csv_path)
+
+    if _cache_is_fresh(csv_path):
+        for batch in pq.ParquetFile(cache).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+        return
+
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache.with_name(cache.name + ".tmp")
+    stamp = _source_stamp(csv_path)
+    writer = None
+    try:
+        for chunk in pd.read_csv(
+            csv_path,
+            dtype=ERP_DTYPES,
+            parse_dates=DATE_COLS,
+            chunksize=chunk_rows,
+        ):
+            if writer is None:
+                schema = _arrow_schema(chunk, stamp)
+                writer = pq.ParquetWriter(tmp, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield chunk
+        if writer is not None:
+            writer.close()
+            writer = None
+            tmp.replace(cache)
+            for stale in cache.parent.glob(f"{csv_path.stem}-*.parquet"):
+                if stale != cache:
+                    stale.unlink(missing_ok=True)
+    finally:
+        if writer is not None:
+            writer.close()
+            tmp.unlink(missing_ok=True)
+
 
 def load_open_orders(filename: str = "open_orders_train.csv") -> pd.DataFrame:
     """
     Simulate pulling 'open orders' from ERP.
 
-    For now this just loads a CSV from the data/ folder.
-    In a real system this would call SAP/NetSuite/Sage/etc. APIs.
+    For now this loads a CSV from the data/ folder (typed per ERP_DTYPES,
+    via the Parquet cache). In a real system this would call
+    SAP/NetSuite/Sage/etc. APIs.
     """
     csv_path = DATA_DIR / filename
-    df = pd.read_csv(
-        csv_path,
-        parse_dates=["order_date", "requested_ship_date", "promised_ship_date"],
-    )
-    return df
+    if not _cache_is_fresh(csv_path):
+        # Build the cache one chunk at a time, then read it back columnar
+        for _ in iter_open_orders(filename):
+            pass
+    return pd.read_parquet(_cache_path(csv_path))
+
+
+def load_open_orders_delta(store: FingerprintStore, filename: str = "open_orders_train.csv") -> OrderDelta:
+    """
+    Delta mode: compare the current open-order book against the store's
+    last committed fingerprints and return the new, changed and closed
+    orders. Commit the delta to the store once it has been scored.
+    """
+    return store.diff(load_open_orders(filename))
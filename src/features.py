@@ -1,13 +1,382 @@
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
 import pandas as pd
 
+from src.aggregate_store import AGG_ENTITIES, AGGREGATE_FEATURES, get_store
+from src.schema import parse_date, require_dates
+
+# Row identifiers: unique per order, never useful to the model
+ID_COLS = ["order_id"]
+
+# Raw date fields; derived features see them as float days since epoch
+DATE_COLS = ["order_date", "requested_ship_date", "promised_ship_date"]
+
+# Categoricals with more levels than this are frequency-encoded, not one-hot
+MAX_ONEHOT_LEVELS = 20
+
+
+class DerivedFeature(NamedTuple):
+    inputs: tuple
+    fn: Callable[[Mapping[str, np.ndarray]], np.ndarray]
+
+
+# name -> DerivedFeature; registration order is feature column order
+DERIVED_FEATURES: Dict[str, DerivedFeature] = {}
+
+
+def derived_feature(name: str, *inputs: str):
+    """
+    Register a derived feature. fn gets {input: float32 array} (dates as
+    days since epoch) and must return one value per row using NumPy ops
+    only, so the same code serves training batches and single orders.
+    """
+    def register(fn):
+        DERIVED_FEATURES[name] = DerivedFeature(tuple(inputs), fn)
+        return fn
+    return register
+
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    return (days + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+
+
+def _month(days: np.ndarray) -> np.ndarray:
+    return days.astype(np.int64).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+
+@derived_feature("requested_lead_time_days", "order_date", "requested_ship_date")
+def _requested_lead_time(c):
+    return c["requested_ship_date"] - c["order_date"]
+
+
+@derived_feature("promised_lead_time_days", "order_date", "promised_ship_date")
+def _promised_lead_time(c):
+    return c["promised_ship_date"] - c["order_date"]
+
+
+@derived_feature("promise_slack_days", "requested_ship_date", "promised_ship_date")
+def _promise_slack(c):
+    return c["promised_ship_date"] - c["requested_ship_date"]
+
+
+@derived_feature("atp_shortfall_ratio", "order_qty", "current_available_qty")
+def _atp_shortfall_ratio(c):
+    # Share of the order not covered by available-to-promise stock
+    qty = c["order_qty"]
+    return np.maximum(qty - c["current_available_qty"], 0) / np.maximum(qty, 1)
+
+
+@derived_feature("promised_ship_weekday", "promised_ship_date")
+def _promised_ship_weekday(c):
+    return _weekday(c["promised_ship_date"])
+
+
+@derived_feature("promised_ship_month", "promised_ship_date")
+def _promised_ship_month(c):
+    return _month(c["promised_ship_date"])
+
+
+def _to_days(values, field: str = "date") -> np.ndarray:
+    """
+    Vectorized date parse: any date-like column -> float days since epoch.
+    """
+    return require_dates(field, values).astype(np.int64).astype(np.float32)
+
+
+def _day_number(value, field: str = "date") -> float:
+    """
+    Scalar counterpart of _to_days for single-order scoring: same parser,
+    and the same error for an empty or unparseable date.
+    """
+    day = parse_date(value)
+    if np.isnat(day):
+        require_dates(field, [value])
+    return float(day.astype(np.int64))
+
+
+def available_derived(columns: Iterable[str]) -> List[str]:
+    """
+    Registered features whose inputs are all present.
+    """
+    columns = set(columns)
+    return [name for name, f in DERIVED_FEATURES.items() if columns.issuperset(f.inputs)]
+
+
+def compute_derived(inputs: Mapping[str, np.ndarray], names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """
+    Evaluate derived features over prepared input arrays (see _derived_inputs).
+    """
+    return {name: DERIVED_FEATURES[name].fn(inputs) for name in names}
+
+
+def _derived_inputs(data: Mapping, fields: Iterable[str]) -> Dict[str, np.ndarray]:
+    # Each date column is parsed once, however many features use it
+    return {
+        c: _to_days(data[c], c) if c in DATE_COLS else np.asarray(data[c], dtype=np.float32)
+        for c in fields
+    }
+
 
 def add_derived_features(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Placeholder for engineered features.
-    You can expand this later.
+    Add every registered derived feature whose inputs are in df.
     """
-    if {"order_date", "requested_ship_date"}.issubset(df.columns):
-        df["requested_lead_time_days"] = (
-            (df["requested_ship_date"] - df["order_date"]).dt.days
-        )
+    names = available_derived(df.columns)
+    fields = sorted({c for name in names for c in DERIVED_FEATURES[name].inputs})
+    for name, values in compute_derived(_derived_inputs(df, fields), names).items():
+        df[name] = values
     return df
+
+
+class FeatureEncoder:
+    """
+    Maps raw order fields straight onto the model's feature columns.
+
+    Fitted once at training time and stored in the model bundle, so scoring
+    fills a preallocated NumPy matrix from dict lookups instead of running
+    pd.get_dummies and re-aligning columns per request. Layout: numeric
+    fields, derived features, aggregate-store features, frequency-encoded
+    keys, then one-hot indicators.
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        numeric_cols: List[str],
+        categories: Dict[str, Dict[str, int]],
+        frequencies: Optional[Dict[str, Dict[str, float]]] = None,
+        derived: Optional[List[str]] = None,
+        aggregates: Optional[List[str]] = None,
+    ):
+        self.columns = list(columns)
+        self.numeric_cols = list(numeric_cols)
+        # field -> {category value -> column index}
+        self.categories = {f: dict(m) for f, m in categories.items()}
+        # field -> {category value -> share of training rows}
+        self.frequencies = {f: dict(m) for f, m in (frequencies or {}).items()}
+        self.derived = list(derived or [])
+        # Per customer/item/plant history features, joined from the aggregate store
+        self.aggregates = list(aggregates or [])
+
+        col_index = {c: i for i, c in enumerate(self.columns)}
+        self._numeric_idx = np.array(
+            [col_index[c] for c in self.numeric_cols], dtype=np.intp
+        )
+        self._derived_idx = [col_index[name] for name in self.derived]
+        self._derived_fields = sorted({c for name in self.derived for c in DERIVED_FEATURES[name].inputs})
+        self._aggregate_idx = {name: col_index[name] for name in self.aggregates}
+        self._freq_idx = {f: col_index[f"{f}_freq"] for f in self.frequencies}
+        self._vocab = {
+            f: (pd.Index(list(m.keys())), np.fromiter(m.values(), dtype=np.intp, count=len(m)))
+            for f, m in self.categories.items()
+        }
+        self._freq_vocab = {
+            f: (pd.Index(list(m.keys())), np.append(np.fromiter(m.values(), dtype=np.float32, count=len(m)), 0.0))
+            for f, m in self.frequencies.items()
+        }
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form (stored in the model manifest)."""
+        return {
+            "columns": self.columns,
+            "numeric_cols": self.numeric_cols,
+            "categories": self.categories,
+            "frequencies": self.frequencies,
+            "derived": self.derived,
+            "aggregates": self.aggregates,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "FeatureEncoder":
+        d = dict(d)
+        if "date_deltas" in d:  # artifacts written before the feature registry
+            d["derived"] = d.pop("date_deltas")
+        return cls(**d)
+
+    @classmethod
+    def fit(
+        cls,
+        df: pd.DataFrame,
+        drop_first: bool = False,
+        drop_cols: Iterable[str] = ID_COLS,
+        max_onehot_levels: int = MAX_ONEHOT_LEVELS,
+    ) -> "FeatureEncoder":
+        """
+        Learn the feature layout from a training frame of raw order fields.
+
+        Row identifiers are dropped, registered derived features are added
+        (date columns are only used through them), aggregate-store columns
+        already joined onto df are kept as such, high-cardinality keys are
+        frequency-encoded and the rest one-hot.
+        """
+        return cls.fit_chunks([df], drop_first, drop_cols, max_onehot_levels)
+
+    @classmethod
+    def fit_chunks(
+        cls,
+        chunks: Iterable[pd.DataFrame],
+        drop_first: bool = False,
+        drop_cols: Iterable[str] = ID_COLS,
+        max_onehot_levels: int = MAX_ONEHOT_LEVELS,
+        aggregates: Optional[Iterable[str]] = None,
+    ) -> "FeatureEncoder":
+        """
+        fit() over a frame streamed in chunks: the first chunk fixes the
+        columns, category counts are summed over all of them. aggregates
+        names the store features to reserve columns for when they are not
+        joined onto the chunks.
+        """
+        drop_cols = list(drop_cols)
+        counts: Optional[Dict[str, pd.Series]] = None
+        for chunk in chunks:
+            if counts is None:
+                chunk = chunk.drop(columns=[c for c in drop_cols if c in chunk.columns])
+                derived = available_derived(chunk.columns)
+                if aggregates is None:
+                    aggregates = [c for c in AGGREGATE_FEATURES if c in chunk.columns]
+                aggregates = list(aggregates)
+                chunk = chunk.drop(columns=[c for c in DATE_COLS + aggregates if c in chunk.columns])
+                numeric_cols = [c for c in chunk.columns if pd.api.types.is_numeric_dtype(chunk[c])]
+                categorical_cols = [c for c in chunk.columns if c not in numeric_cols]
+                counts = {c: pd.Series(dtype=np.float64) for c in categorical_cols}
+            for col in categorical_cols:
+                vc = chunk[col].dropna().astype(str).value_counts()
+                counts[col] = counts[col].add(vc, fill_value=0)
+        if counts is None:
+            raise ValueError("no training rows")
+
+        columns = numeric_cols + derived + aggregates
+        frequencies: Dict[str, Dict[str, float]] = {}
+        categories: Dict[str, Dict[str, int]] = {}
+        for col in categorical_cols:
+            if len(counts[col]) > max_onehot_levels:
+                share = counts[col].sort_values(ascending=False, kind="stable") / counts[col].sum()
+                frequencies[col] = {k: float(v) for k, v in share.items()}
+                columns.append(f"{col}_freq")
+
+        for col in categorical_cols:
+            if col in frequencies:
+                continue
+            levels = sorted(counts[col].index)
+            if drop_first:
+                levels = levels[1:]
+            categories[col] = {}
+            for v in levels:
+                categories[col][v] = len(columns)
+                columns.append(f"{col}_{v}")
+
+        return cls(columns, numeric_cols, categories, frequencies, derived, aggregates)
+
+    @classmethod
+    def from_columns(cls, columns: List[str], categorical_cols: Iterable[str]) -> "FeatureEncoder":
+        """
+        Rebuild an encoder from a bundle that only stored the one-hot column list.
+        """
+        prefixes = [(f, f"{f}_") for f in categorical_cols]
+        numeric_cols = []
+        categories: Dict[str, Dict[str, int]] = {f: {} for f, _ in prefixes}
+        for i, col in enumerate(columns):
+            for field, prefix in prefixes:
+                if col.startswith(prefix):
+                    categories[field][col[len(prefix):]] = i
+                    break
+            else:
+                numeric_cols.append(col)
+        return cls(columns, numeric_cols, categories)
+
+    def transform(self, data: Mapping) -> np.ndarray:
+        """
+        Encode a DataFrame (or any mapping of field -> column values).
+        Unknown categories encode as all zeros / zero frequency.
+        """
+        n_rows = len(data) if isinstance(data, pd.DataFrame) else len(data[next(iter(data))])
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+        for col, idx in zip(self.numeric_cols, self._numeric_idx):
+            X[:, idx] = np.asarray(data[col], dtype=np.float32)
+
+        if self.derived:
+            inputs = _derived_inputs(data, self._derived_fields)
+            for name, idx in zip(self.derived, self._derived_idx):
+                X[:, idx] = DERIVED_FEATURES[name].fn(inputs)
+
+        if self.aggregates:
+            # Columns already in data win (training passes point-in-time values)
+            missing = [name for name in self.aggregates if name not in data]
+            joined = get_store().lookup(data, missing) if missing else {}
+            for name, idx in self._aggregate_idx.items():
+                X[:, idx] = joined[name] if name in joined else np.asarray(data[name], dtype=np.float32)
+
+        for field, (vocab, share) in self._freq_vocab.items():
+            codes = vocab.get_indexer(np.asarray(data[field]).astype(str))
+            X[:, self._freq_idx[field]] = share[codes]  # code -1 hits the trailing 0.0
+
+        rows = np.arange(n_rows)
+        for field, (vocab, col_idx) in self._vocab.items():
+            codes = vocab.get_indexer(np.asarray(data[field]).astype(str))
+            hit = codes >= 0
+            X[rows[hit], col_idx[codes[hit]]] = 1.0
+
+        return X
+
+    def transform_one(self, record: Mapping) -> np.ndarray:
+        """
+        Encode a single order dict into a (1, n_features) row.
+        """
+        X = np.zeros((1, self.n_features), dtype=np.float32)
+        row = X[0]
+        for col, idx in zip(self.numeric_cols, self._numeric_idx):
+            row[idx] = record[col]
+        if self.derived:
+            # Length-1 arrays through the same feature functions as transform()
+            inputs = {
+                c: np.array([_day_number(record[c], c) if c in DATE_COLS else record[c]], dtype=np.float32)
+                for c in self._derived_fields
+            }
+            for name, idx in zip(self.derived, self._derived_idx):
+                row[idx] = DERIVED_FEATURES[name].fn(inputs)[0]
+        if self.aggregates:
+            missing = [name for name in self.aggregates if name not in record]
+            joined = get_store().lookup_one(record, missing) if missing else {}
+            for name, idx in self._aggregate_idx.items():
+                row[idx] = joined[name] if name in joined else record[name]
+        for field, shares in self.frequencies.items():
+            row[self._freq_idx[field]] = shares.get(str(record[field]), 0.0)
+        for field, mapping in self.categories.items():
+            idx = mapping.get(str(record[field]))
+            if idx is not None:
+                row[idx] = 1.0
+        return X
+
+    def source_fields(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Raw order fields behind the feature columns (in first-use order) and
+        an (n_features, n_fields) matrix mapping per-column amounts onto
+        them: one-hot and frequency columns go to their field, aggregate
+        features to their customer/item/plant key, and a derived feature is
+        split evenly across its inputs. Row sums are 1, so totals carry over.
+        """
+        inputs: Dict[str, Iterable[str]] = {}
+        for name in self.derived:
+            inputs[name] = DERIVED_FEATURES[name].inputs
+        for name in self.aggregates:
+            inputs[name] = [next((e for e in AGG_ENTITIES if name.startswith(f"{e}_")), name)]
+        for field in self.frequencies:
+            inputs[f"{field}_freq"] = [field]
+        onehot = {idx: field for field, mapping in self.categories.items() for idx in mapping.values()}
+
+        fields: Dict[str, int] = {}
+        entries = []
+        for i, col in enumerate(self.columns):
+            sources = [onehot[i]] if i in onehot else list(inputs.get(col, [col]))
+            for field in sources:
+                entries.append((i, fields.setdefault(field, len(fields)), 1.0 / len(sources)))
+        weights = np.zeros((self.n_features, len(fields)), dtype=np.float32)
+        for i, j, w in entries:
+            weights[i, j] += w
+        return list(fields), weights
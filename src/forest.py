@@ -0,0 +1,222 @@
+from pathlib import Path
+import threading
+import time
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLE_PATH = ROOT / "data" / "open_orders_scoring_sample.csv"
+
+
+class FlatForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous node arrays.
+
+    All trees share one set of arrays; tree t starts at roots[t]. Leaves
+    point back at themselves (threshold = +inf), and a whole batch is
+    walked level by level across every tree at once.
+    value holds the class-1 fraction of every node, leaves included.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, is_leaf=None):
+        # np.ascontiguousarray keeps memory-mapped arrays mapped (no copy)
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        # children[2 * node] is the left child, children[2 * node + 1] the right
+        self.children = np.ascontiguousarray(children, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        if is_leaf is None:
+            is_leaf = self.children[0::2] == np.arange(len(self.feature))
+        self.is_leaf = np.ascontiguousarray(is_leaf, dtype=bool)
+        # Built on first use by explain-style callers (see leaf_contributions)
+        self._leaf_contrib = None
+        self._leaf_contrib_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Locks don't pickle; the contribution table is rebuilt on demand
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_leaf_contrib")}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._leaf_contrib = None
+        self._leaf_contrib_lock = threading.Lock()
+
+    def arrays(self) -> dict:
+        """The flat node arrays, keyed by constructor argument name."""
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "value": self.value,
+            "roots": self.roots,
+            "is_leaf": self.is_leaf,
+        }
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, clf) -> "FlatForest":
+        """
+        Export every estimator's tree_ into one set of flat arrays.
+        """
+        feature, threshold, children, value, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in clf.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            node_ids = np.arange(n) + offset
+            leaf = tree.children_left == -1
+
+            counts = tree.value[:, 0, :]
+            frac = counts[:, 1] / counts.sum(axis=1)
+
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            left = np.where(leaf, node_ids, tree.children_left + offset)
+            right = np.where(leaf, node_ids, tree.children_right + offset)
+            children.append(np.column_stack([left, right]).ravel())
+            value.append(frac)
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(feature),
+            np.concatenate(threshold),
+            np.concatenate(children),
+            np.concatenate(value),
+            np.array(roots),
+            max_depth,
+        )
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Leaf node index reached in every tree, shape (n_rows, n_trees).
+
+        Walks one level per step for every (row, tree) pair still above a
+        leaf, so cost follows the actual path lengths, not the deepest tree.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        node = np.tile(self.roots, n_rows)
+        X_flat = X.ravel()
+        base = np.repeat(np.arange(n_rows) * X.shape[1], self.n_trees)
+
+        active = np.flatnonzero(~self.is_leaf[node])
+        while active.size:
+            cur = node[active]
+            go_right = X_flat[base[active] + self.feature[cur]] > self.threshold[cur]
+            nxt = self.children[2 * cur + go_right]
+            node[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+
+        return node.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Same output as RandomForestClassifier.predict_proba for binary labels.
+        """
+        p1 = self.value[self.apply(X)].mean(axis=1)
+        return np.column_stack([1.0 - p1, p1])
+
+    @property
+    def bias(self) -> float:
+        """Mean root value: the forest's prediction before any split."""
+        return float(self.value[self.roots].mean())
+
+    def leaf_contributions(self, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Saabas path contributions, precomputed per leaf. Returns (leaf_row,
+        contrib): for leaf node i, contrib[leaf_row[i]] holds, per feature,
+        the sum of value[child] - value[parent] over the splits on that
+        feature along the path to i, so its row sums to value[i] minus the
+        root value. Built top-down in one pass per depth and cached.
+        """
+        if self._leaf_contrib is None:
+            # Concurrent first explains build the table once; the rest wait for it
+            with self._leaf_contrib_lock:
+                if self._leaf_contrib is None:
+                    self._leaf_contrib = self._build_leaf_contributions(n_features)
+        return self._leaf_contrib
+
+    def _build_leaf_contributions(self, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+        contrib = np.zeros((self.n_nodes, n_features), dtype=np.float32)
+        frontier = self.roots
+        while frontier.size:
+            inner = frontier[~self.is_leaf[frontier]]
+            level = []
+            for side in (0, 1):
+                child = self.children[2 * inner + side]
+                contrib[child] = contrib[inner]
+                contrib[child, self.feature[inner]] += self.value[child] - self.value[inner]
+                level.append(child)
+            frontier = np.concatenate(level)
+        leaves = np.flatnonzero(self.is_leaf)
+        leaf_row = np.full(self.n_nodes, -1, dtype=np.intp)
+        leaf_row[leaves] = np.arange(len(leaves))
+        return leaf_row, np.ascontiguousarray(contrib[leaves])
+
+    def contributions(self, leaves: np.ndarray, n_features: int) -> np.ndarray:
+        """
+        Per-feature contributions, shape (n_rows, n_features), for the
+        leaves apply() returned: the mean over trees of each leaf's path
+        contributions, so bias + a row's sum is that row's probability.
+        One sparse (rows x leaves) product, no per-row path walk.
+        """
+        leaf_row, contrib = self.leaf_contributions(n_features)
+        n_rows, n_trees = leaves.shape
+        weights = sp.csr_matrix(
+            (
+                np.full(n_rows * n_trees, 1.0 / n_trees, dtype=np.float32),
+                leaf_row[leaves].ravel(),
+                np.arange(0, n_rows * n_trees + 1, n_trees),
+            ),
+            shape=(n_rows, len(contrib)),
+        )
+        return weights @ contrib
+
+
+def check_parity(n_single: int = 200) -> None:
+    """
+    Compare the deployed FlatForest against its sklearn estimator on the
+    scoring sample and report single-order latency.
+    """
+    from src.model_store import get_model
+
+    m = get_model()
+    model = m.sklearn_model
+    forest = m.forest
+    X = m.encoder.transform(pd.read_csv(SAMPLE_PATH))
+
+    expected = model.predict_proba(X)
+    got = forest.predict_proba(X)
+    max_diff = float(np.abs(expected - got).max())
+    print(f"🌲 {forest.n_trees} trees, {forest.n_nodes} nodes, max depth {forest.max_depth}")
+    print(f"🔍 Max |sklearn - flat| over {len(X)} rows: {max_diff:.2e}")
+    assert max_diff <= 1e-9, "FlatForest drifted from sklearn probabilities"
+
+    timings = []
+    for i in range(n_single):
+        row = X[i % len(X)][None, :]
+        t0 = time.perf_counter()
+        forest.predict_proba(row)
+        timings.append((time.perf_counter() - t0) * 1000)
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"⏱️ Single-order latency: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+
+if __name__ == "__main__":
+    check_parity()
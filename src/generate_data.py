@@ -1,41 +1,57 @@
+import argparse
+import os
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator, List, Optional
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
+# Rows generated (and written) per chunk by iter_orders / write_orders
+GEN_CHUNK_ROWS = int(os.getenv("GEN_CHUNK_ROWS", "1000000"))
 
-def generate_orders(n: int = 5000, seed: int = 42) -> pd.DataFrame:
-    rng = np.random.default_rng(seed)
+PLANTS = ["PLANT_A", "PLANT_B", "PLANT_C"]
+# Late-risk logit intercept when no target late rate is given
+BASE_LOGIT = -1.0
+
+
+def _key_vocab(prefix: str, n: int) -> List[str]:
+    return [f"{prefix}{i:04d}" for i in range(1, n + 1)]
 
-    # --- Core IDs & basic fields ---
-    base_date = pd.Timestamp("2024-01-01")
-    order_dates = base_date + pd.to_timedelta(
-        rng.integers(0, 365, size=n),
-        unit="D",
-    )
 
-    customer_ids = [f"C{rng.integers(1, 501):04d}" for _ in range(n)]
-    item_ids = [f"ITEM{rng.integers(1, 201):04d}" for _ in range(n)]
-    plants = rng.choice(["PLANT_A", "PLANT_B", "PLANT_C"], size=n, p=[0.5, 0.3, 0.2])
+def _order_ids(start: int, n: int) -> pd.api.extensions.ExtensionArray:
+    # Arrow-built strings: ~10x faster than formatting n Python ints
+    ids = pa.array(np.arange(100000 + start, 100000 + start + n)).cast(pa.string())
+    return pd.array(pc.binary_join_element_wise("O", ids, ""), dtype="str")
+
+
+def _draw(rng: np.random.Generator, n: int, n_customers: int, n_items: int, days: int) -> dict:
+    """
+    Raw order fields plus the late-risk logit (without intercept), all
+    drawn as whole arrays.
+    """
+    day = rng.integers(0, days, size=n)
+
+    customer = rng.integers(1, n_customers + 1, size=n)
+    item = rng.integers(1, n_items + 1, size=n)
+    plant = rng.choice(len(PLANTS), size=n, p=[0.5, 0.3, 0.2])
 
     # Priority: 1=Expedite, 2=Normal, 3=Low
     order_priority = rng.choice([1, 2, 3], size=n, p=[0.2, 0.5, 0.3])
 
-    # Lead times and dates
+    # Lead times
     historical_lead_time = rng.normal(loc=7, scale=2, size=n).clip(1, 21)
     requested_lead = historical_lead_time + rng.normal(loc=0, scale=1.5, size=n)
     requested_lead = np.clip(np.round(requested_lead), 1, 30)
 
-    requested_ship_date = order_dates + pd.to_timedelta(requested_lead, unit="D")
-    promised_ship_date = order_dates + pd.to_timedelta(
-        np.round(historical_lead_time),
-        unit="D",
-    )
-
     # Quantities and supply situation
     order_qty = rng.integers(1, 500, size=n)
     current_available_qty = order_qty + rng.integers(-200, 300, size=n)
@@ -46,57 +62,207 @@ def generate_orders(n: int = 5000, seed: int = 42) -> pd.DataFrame:
     num_open_orders_customer = rng.integers(1, 20, size=n)
     past_due_invoices_flag = rng.choice([0, 1], size=n, p=[0.7, 0.3])
 
-    weekday_ordered = order_dates.weekday
-    month_ordered = order_dates.month
-
-    # --- Generate late_flag based on risk drivers ---
-    base = -1.0
-    prob = (
-        base
-        + 0.8 * (order_priority == 3)  # low priority
+    # --- Late-risk drivers ---
+    logit = (
+        0.8 * (order_priority == 3)  # low priority
         + 0.5 * (current_available_qty < order_qty)  # not enough stock
         + 1.0 * (supplier_reliability_score < 0.8)  # shaky supplier
         + 0.6 * past_due_invoices_flag
         + 0.4 * (requested_lead < historical_lead_time)  # customer asking too fast
     )
+
+    return {
+        "day": day,
+        "customer": customer,
+        "item": item,
+        "plant": plant,
+        "order_priority": order_priority,
+        "historical_lead_time": historical_lead_time,
+        "requested_lead": requested_lead,
+        "order_qty": order_qty,
+        "current_available_qty": current_available_qty,
+        "supplier_reliability_score": supplier_reliability_score,
+        "num_open_orders_customer": num_open_orders_customer,
+        "past_due_invoices_flag": past_due_invoices_flag,
+        "logit": logit,
+    }
+
+
+@lru_cache(maxsize=None)
+def _late_rate_intercept(late_rate: float, drift: float, days: int) -> float:
+    """
+    Logit intercept giving a late_rate share of late orders, solved by
+    bisection on a fixed calibration sample (so every chunk agrees).
+    """
+    cols = _draw(np.random.default_rng(0), 200_000, 500, 200, days)
+    z = cols["logit"] + drift * cols["day"] / days
+    lo, hi = -20.0, 20.0
+    for _ in range(50):
+        mid = (lo + hi) / 2
+        if np.mean(1 / (1 + np.exp(-(z + mid)))) < late_rate:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def generate_orders(
+    n: int = 5000,
+    seed=42,
+    n_customers: int = 500,
+    n_items: int = 200,
+    late_rate: Optional[float] = None,
+    drift: float = 0.0,
+    start_date: str = "2024-01-01",
+    days: int = 365,
+    id_start: int = 0,
+) -> pd.DataFrame:
+    """
+    n synthetic orders over days days from start_date.
+
+    n_customers / n_items set key cardinality, late_rate the expected share
+    of late orders (default: whatever the risk drivers give, ~45%) and
+    drift the late-risk logit shift from the first to the last day
+    (concept drift; 0 = stationary). seed may be an int or SeedSequence.
+    """
+    rng = np.random.default_rng(seed)
+    cols = _draw(rng, n, n_customers, n_items, days)
+
+    order_dates = np.datetime64(start_date, "D") + cols["day"]
+    requested_ship_date = order_dates + cols["requested_lead"].astype(np.int64)
+    promised_ship_date = order_dates + np.round(cols["historical_lead_time"]).astype(np.int64)
+
+    # --- Generate late_flag based on risk drivers ---
+    base = BASE_LOGIT if late_rate is None else _late_rate_intercept(late_rate, drift, days)
+    prob = base + cols["logit"] + drift * cols["day"] / days
     prob = 1 / (1 + np.exp(-prob))  # logistic
 
     late_flag = rng.binomial(1, prob)
 
+    order_dates = pd.DatetimeIndex(order_dates)
     df = pd.DataFrame(
         {
-            "order_id": [f"O{100000 + i}" for i in range(n)],
-            "customer_id": customer_ids,
-            "item_id": item_ids,
-            "plant": plants,
+            "order_id": _order_ids(id_start, n),
+            "customer_id": pd.Categorical.from_codes(cols["customer"] - 1, _key_vocab("C", n_customers)),
+            "item_id": pd.Categorical.from_codes(cols["item"] - 1, _key_vocab("ITEM", n_items)),
+            "plant": pd.Categorical.from_codes(cols["plant"], PLANTS),
             "order_date": order_dates,
-            "requested_ship_date": requested_ship_date,
-            "promised_ship_date": promised_ship_date,
-            "order_priority": order_priority,
-            "order_qty": order_qty,
-            "current_available_qty": current_available_qty,
-            "historical_lead_time_days": np.round(historical_lead_time, 1),
-            "supplier_reliability_score": np.round(supplier_reliability_score, 2),
-            "num_open_orders_customer": num_open_orders_customer,
-            "past_due_invoices_flag": past_due_invoices_flag,
-            "weekday_ordered": weekday_ordered,
-            "month_ordered": month_ordered,
-            "late_flag": late_flag,
+            "requested_ship_date": pd.DatetimeIndex(requested_ship_date),
+            "promised_ship_date": pd.DatetimeIndex(promised_ship_date),
+            "order_priority": cols["order_priority"].astype(np.int8),
+            "order_qty": cols["order_qty"].astype(np.int32),
+            "current_available_qty": cols["current_available_qty"].astype(np.int32),
+            "historical_lead_time_days": np.round(cols["historical_lead_time"], 1),
+            "supplier_reliability_score": np.round(cols["supplier_reliability_score"], 2),
+            "num_open_orders_customer": cols["num_open_orders_customer"].astype(np.int32),
+            "past_due_invoices_flag": cols["past_due_invoices_flag"].astype(np.int8),
+            "weekday_ordered": order_dates.weekday.astype(np.int8),
+            "month_ordered": order_dates.month.astype(np.int8),
+            "late_flag": late_flag.astype(np.int8),
         }
     )
 
     return df
 
 
+def iter_orders(n: int, chunk_rows: int = GEN_CHUNK_ROWS, seed: int = 42, **knobs) -> Iterator[pd.DataFrame]:
+    """
+    generate_orders in chunks of up to chunk_rows rows, each drawn from its
+    own child seed; order ids continue across chunks.
+    """
+    n_chunks = max(-(-n // chunk_rows), 1)
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+        start = i * chunk_rows
+        yield generate_orders(min(chunk_rows, n - start), child, id_start=start, **knobs)
+
+
+# Generated values never contain separators or quotes
+_CSV_OPTIONS = pa_csv.WriteOptions(quoting_style="none")
+
+
+def _csv_table(df: pd.DataFrame) -> pa.Table:
+    # Dates as plain YYYY-MM-DD, like the extracts erp_client reads
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+        elif pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    return table
+
+
+def write_orders(
+    path: Path, n: int, fmt: str = "parquet", chunk_rows: int = GEN_CHUNK_ROWS, seed: int = 42, **knobs
+) -> List[Path]:
+    """
+    Stream n orders to disk one chunk at a time. A path ending in .csv or
+    .parquet gets a single file; any other path becomes a directory of
+    part-NNNNN.{fmt} partitions, one per chunk. Returns the files written.
+    """
+    path = Path(path)
+    single = path.suffix in (".csv", ".parquet")
+    if single:
+        fmt = path.suffix[1:]
+        path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        path.mkdir(parents=True, exist_ok=True)
+
+    written: List[Path] = []
+    writer = None
+    try:
+        for i, chunk in enumerate(iter_orders(n, chunk_rows, seed, **knobs)):
+            table = _csv_table(chunk) if fmt == "csv" else pa.Table.from_pandas(chunk, preserve_index=False)
+            if not single:
+                part = path / f"part-{i:05d}.{fmt}"
+                if fmt == "csv":
+                    pa_csv.write_csv(table, part, _CSV_OPTIONS)
+                else:
+                    pq.write_table(table, part)
+                written.append(part)
+                continue
+            if writer is None:
+                if fmt == "csv":
+                    writer = pa_csv.CSVWriter(path, table.schema, write_options=_CSV_OPTIONS)
+                else:
+                    writer = pq.ParquetWriter(path, table.schema)
+                written.append(path)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
 if __name__ == "__main__":
-    # Training data with label
-    train_df = generate_orders(n=5000, seed=42)
-    train_path = DATA_DIR / "open_orders_train.csv"
-    train_df.to_csv(train_path, index=False)
-    print(f"Wrote training data → {train_path}")
-
-    # Scoring sample (no late_flag, like real open orders)
-    scoring_df = train_df.sample(200, random_state=123).drop(columns=["late_flag"])
-    scoring_path = DATA_DIR / "open_orders_scoring_sample.csv"
-    scoring_df.to_csv(scoring_path, index=False)
-    print(f"Wrote scoring sample → {scoring_path}")
+    parser = argparse.ArgumentParser(description="Generate synthetic open orders")
+    parser.add_argument("--rows", type=int, help="stream this many rows to --out instead of the default files")
+    parser.add_argument("--out", type=Path, default=DATA_DIR / "generated", help="file (.csv/.parquet) or partition directory")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="partition format")
+    parser.add_argument("--chunk-rows", type=int, default=GEN_CHUNK_ROWS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--late-rate", type=float, help="target share of late orders")
+    parser.add_argument("--drift", type=float, default=0.0, help="late-risk logit shift over the date range")
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    if args.rows is not None:
+        files = write_orders(
+            args.out, args.rows, args.format, args.chunk_rows, args.seed,
+            n_customers=args.customers, n_items=args.items, late_rate=args.late_rate,
+            drift=args.drift, days=args.days,
+        )
+        print(f"Wrote {args.rows} orders → {args.out} ({len(files)} file(s))")
+    else:
+        # Training data with label
+        train_df = generate_orders(n=5000, seed=42)
+        train_path = DATA_DIR / "open_orders_train.csv"
+        train_df.to_csv(train_path, index=False)
+        print(f"Wrote training data → {train_path}")
+
+        # Scoring sample (no late_flag, like real open orders)
+        scoring_df = train_df.sample(200, random_state=123).drop(columns=["late_flag"])
+        scoring_path = DATA_DIR / "open_orders_scoring_sample.csv"
+        scoring_df.to_csv(scoring_path, index=False)
+        print(f"Wrote scoring sample → {scoring_path}")
@@ -1,38 +1,88 @@
-from pathlib import Path
-import json
+import os
+from typing import List, Tuple
 
-import joblib
-import pandas as pd
+import numpy as np
 
-ROOT = Path(__file__).resolve().parents[1]
-MODELS_DIR = ROOT / "models"
+from src.model_store import get_model
 
-MODEL_PATH = MODELS_DIR / "delay_model.pkl"
-FEATURE_COLS_PATH = MODELS_DIR / "feature_columns.json"
+# Batches up to this size use the flat-array walk (lowest latency); larger
+# ones use sklearn's compiled traversal, which has better per-row throughput
+FLAT_FOREST_MAX_ROWS = int(os.getenv("FLAT_FOREST_MAX_ROWS", "256"))
+# Drivers returned per order by explain(), and rows explained per step
+# (bounds the leaf-index and contribution buffers)
+EXPLAIN_TOP_K = int(os.getenv("EXPLAIN_TOP_K", "3"))
+EXPLAIN_CHUNK_ROWS = int(os.getenv("EXPLAIN_CHUNK_ROWS", "10000"))
 
-# Load model & metadata once at import
-model = joblib.load(MODEL_PATH)
-feature_cols = json.loads(FEATURE_COLS_PATH.read_text())
 
+def predict(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One pass over the forest: late probabilities plus thresholded flags.
+    """
+    m = get_model()
+    if len(X) <= FLAT_FOREST_MAX_ROWS or not m.has_sklearn:
+        probs = m.forest.predict_proba(X)[:, 1]
+    else:
+        probs = m.sklearn_model.predict_proba(X)[:, 1]
+    flags = (probs >= m.threshold).astype(np.int8)
+    return probs, flags
 
-def score_order(order_payload: dict) -> dict:
+
+def _leaves(m, X: np.ndarray) -> np.ndarray:
+    # FlatForest node ids either way: sklearn's are per tree, offset by roots
+    if len(X) <= FLAT_FOREST_MAX_ROWS or not m.has_sklearn:
+        return m.forest.apply(X)
+    return m.sklearn_model.apply(X) + m.forest.roots
+
+
+def explain(X: np.ndarray, top_k: int = EXPLAIN_TOP_K) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
-    order_payload: dict with same keys as training features.
-    Returns: { "late_probability": float, "late_flag": int }
+    Scores plus per-order drivers from one pass over the forest: the leaves
+    behind each probability also give its Saabas contributions, rolled up
+    to raw order fields (see explanation_basis). Returns probs, flags and
+    (n_rows, k) field indices and signed contributions of the top_k fields
+    by magnitude, largest first.
     """
-    df = pd.DataFrame([order_payload])
+    m = get_model()
+    _, weights = m.encoder.source_fields()
+    k = min(top_k, weights.shape[1])
+    n_rows = len(X)
+    probs = np.empty(n_rows)
+    top_fields = np.empty((n_rows, k), dtype=np.intp)
+    top_values = np.empty((n_rows, k))
+
+    for start in range(0, n_rows, EXPLAIN_CHUNK_ROWS):
+        rows = slice(start, min(start + EXPLAIN_CHUNK_ROWS, n_rows))
+        leaves = _leaves(m, X[rows])
+        probs[rows] = m.forest.value[leaves].mean(axis=1)
+        contrib = m.forest.contributions(leaves, m.encoder.n_features) @ weights
+        size = np.abs(contrib)
+        idx = np.argpartition(-size, k - 1, axis=1)[:, :k]
+        idx = np.take_along_axis(idx, np.argsort(-np.take_along_axis(size, idx, axis=1), axis=1), axis=1)
+        top_fields[rows] = idx
+        top_values[rows] = np.take_along_axis(contrib, idx, axis=1)
 
-    # Ensure same columns as during training
-    for col in feature_cols:
-        if col not in df.columns:
-            df[col] = None
+    flags = (probs >= m.threshold).astype(np.int8)
+    return probs, flags, top_fields, top_values
 
-    df = df[feature_cols]
 
-    proba = model.predict_proba(df)[:, 1][0]
-    flag = int(proba >= 0.5)
+def explanation_basis() -> Tuple[float, List[str]]:
+    """
+    What explain() results are relative to: the base probability every
+    order starts from, and the field names its indices refer to.
+    """
+    m = get_model()
+    return m.forest.bias, m.encoder.source_fields()[0]
+
+
+def score_order(order_payload: dict) -> dict:
+    """
+    order_payload: dict with same keys as training features.
+    Returns: { "late_probability": float, "late_flag": int }
+    """
+    X = get_model().encoder.transform_one(order_payload)
+    probs, flags = predict(X)
 
     return {
-        "late_probability": float(proba),
-        "late_flag": flag,
+        "late_probability": float(probs[0]),
+        "late_flag": int(flags[0]),
     }
@@ -0,0 +1,99 @@
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# Coarse risk histogram (matches the dashboard's risk bands) and a finer one
+# that replaces plotting every row's probability
+RISK_BINS = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
+RISK_DIST_BINS = 20
+# Entities shown per group-by table, ranked by expected late orders
+TOP_GROUPS = 20
+# Scatter charts get at most this many points
+SCATTER_POINTS = 2000
+GROUP_COLS = ["plant", "customer_id", "item_id"]
+# Every column batch_kpis reads (so stored batches can be loaded column-pruned)
+KPI_COLUMNS = GROUP_COLS + [
+    "late_flag_pred",
+    "late_probability",
+    "order_qty",
+    "current_available_qty",
+    "historical_lead_time_days",
+    "supplier_reliability_score",
+    "num_open_orders_customer",
+    "past_due_invoices_flag",
+]
+
+
+def _mean(batch: pd.DataFrame, col: str) -> float:
+    return float(batch[col].mean()) if col in batch.columns else float("nan")
+
+
+def _histogram(probs: np.ndarray, bins) -> pd.Series:
+    counts, edges = np.histogram(probs, bins=bins, range=(0.0, 1.0))
+    labels = [f"{lo:.2f}–{hi:.2f}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return pd.Series(counts, index=labels, name="orders")
+
+
+def _group_table(batch: pd.DataFrame, col: str, top: int) -> pd.DataFrame:
+    grouped = batch.groupby(col, observed=True, sort=False).agg(
+        orders=("late_probability", "size"),
+        late_rate=("late_flag_pred", "mean"),
+        avg_risk=("late_probability", "mean"),
+        expected_late=("late_probability", "sum"),
+    )
+    return grouped.nlargest(top, "expected_late").round(3)
+
+
+def batch_kpis(batch: pd.DataFrame, top: int = TOP_GROUPS, scatter_points: int = SCATTER_POINTS) -> Dict[str, Any]:
+    """
+    Everything the KPI tab shows for one scored batch, computed in one go:
+    headline KPIs, pre-binned risk histograms, per plant/customer/item
+    tables and a downsampled reliability-vs-risk scatter. The result is
+    small and independent of batch size, so it can be cached per batch.
+    """
+    total = len(batch)
+    late_count = int((batch["late_flag_pred"] == 1).sum()) if "late_flag_pred" in batch.columns else 0
+    late_rate = late_count / max(total, 1)
+
+    if {"current_available_qty", "order_qty"}.issubset(batch.columns):
+        qty = batch["order_qty"].to_numpy(dtype=np.float64)
+        atp = batch["current_available_qty"].to_numpy(dtype=np.float64) / np.maximum(qty, 1)
+        atp_ratio = float(np.minimum(atp, 1).mean()) if total else float("nan")
+    else:
+        atp_ratio = float("nan")
+
+    out: Dict[str, Any] = {
+        "total": total,
+        "late_count": late_count,
+        "late_rate": late_rate,
+        # On-time % is approximated as 1 - predicted late rate
+        "on_time_rate": 1.0 - late_rate,
+        "avg_lead": _mean(batch, "historical_lead_time_days"),
+        "avg_supplier_rel": _mean(batch, "supplier_reliability_score"),
+        "atp_ratio": atp_ratio,
+        "backlog_avg": _mean(batch, "num_open_orders_customer"),
+        "past_due_rate": _mean(batch, "past_due_invoices_flag"),
+        "risk_hist": None,
+        "risk_dist": None,
+        "groups": {},
+        "scatter": None,
+    }
+
+    if "late_probability" not in batch.columns:
+        return out
+
+    probs = batch["late_probability"].to_numpy(dtype=np.float64)
+    out["risk_hist"] = _histogram(probs, RISK_BINS)
+    out["risk_dist"] = _histogram(probs, RISK_DIST_BINS)
+
+    if "late_flag_pred" in batch.columns:
+        out["groups"] = {col: _group_table(batch, col, top) for col in GROUP_COLS if col in batch.columns}
+
+    if "supplier_reliability_score" in batch.columns:
+        scatter = batch[["supplier_reliability_score", "late_probability"]]
+        if len(scatter) > scatter_points:
+            scatter = scatter.sample(scatter_points, random_state=0)
+        out["scatter"] = scatter.reset_index(drop=True)
+
+    return out
@@ -0,0 +1,196 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets (ms): geometric from 10 µs to ~2 min, fixed memory per series
+LATENCY_BUCKETS_MS = [round(0.01 * 1.5 ** i, 4) for i in range(41)]
+# Rows per request
+BATCH_SIZE_BUCKETS = [1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000]
+
+
+class Histogram:
+    """
+    Fixed-bucket streaming histogram (Prometheus-style cumulative buckets)
+    with interpolated quantile estimates, clamped to the observed range.
+    """
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lower = max(self.bounds[i - 1] if i > 0 else 0.0, self.min)
+                upper = min(self.bounds[i] if i < len(self.bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    Per-endpoint request latency, per-stage timings, batch sizes and row
+    counters, exposed as Prometheus text or a JSON summary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+        self.batch_sizes: Dict[str, Histogram] = {}
+        self.rows: Dict[str, int] = {}
+        self.busy_seconds: Dict[str, float] = {}
+        self.sources: Dict[str, Tuple[Callable[[], Dict[str, float]], set]] = {}
+
+    def register_source(self, name: str, fn: Callable[[], Dict[str, float]], counters: Iterable[str] = ()) -> None:
+        """
+        Publish values owned by another component (e.g. cache stats) as
+        erp_<name>_<key>; keys listed in counters are exported as counters.
+        """
+        self.sources[name] = (fn, set(counters))
+
+    def observe_request(self, endpoint: str, status: int, ms: float) -> None:
+        with self._lock:
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS_MS)).observe(ms)
+            self.busy_seconds[endpoint] = self.busy_seconds.get(endpoint, 0.0) + ms / 1000
+
+    def observe_stage(self, endpoint: str, stage: str, ms: float) -> None:
+        with self._lock:
+            self.stages.setdefault((endpoint, stage), Histogram(LATENCY_BUCKETS_MS)).observe(ms)
+
+    def observe_batch(self, endpoint: str, n_rows: int) -> None:
+        with self._lock:
+            self.batch_sizes.setdefault(endpoint, Histogram(BATCH_SIZE_BUCKETS)).observe(n_rows)
+            self.rows[endpoint] = self.rows.get(endpoint, 0) + n_rows
+
+    @contextmanager
+    def stage(self, endpoint: str, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(endpoint, stage, (time.perf_counter() - t0) * 1000)
+
+    def to_json(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, hist in self.latency.items():
+                busy = self.busy_seconds.get(endpoint, 0.0)
+                rows = self.rows.get(endpoint, 0)
+                endpoints[endpoint] = {
+                    "requests": sum(n for (ep, _), n in self.requests.items() if ep == endpoint),
+                    "rows": rows,
+                    "rows_per_sec": rows / busy if busy else None,
+                    "latency_ms": hist.summary(),
+                    "batch_size": self.batch_sizes[endpoint].summary() if endpoint in self.batch_sizes else None,
+                    "stages_ms": {
+                        stage: h.summary()
+                        for (ep, stage), h in sorted(self.stages.items())
+                        if ep == endpoint
+                    },
+                }
+        sources = {name: fn() for name, (fn, _) in self.sources.items()}
+        return {"uptime_s": time.time() - self.started, "endpoints": endpoints, **sources}
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: Dict[tuple, Histogram], labels: List[str]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(series.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                base = ",".join(f'{lbl}="{val}"' for lbl, val in zip(labels, key))
+                cumulative = 0
+                for bound, c in zip(h.bounds + ["+Inf"], h.counts):
+                    cumulative += c
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{base}}} {h.sum}")
+                lines.append(f"{name}_count{{{base}}} {h.count}")
+
+        with self._lock:
+            lines.append("# HELP erp_requests_total Scoring requests by endpoint and status")
+            lines.append("# TYPE erp_requests_total counter")
+            for (endpoint, status), n in sorted(self.requests.items()):
+                lines.append(f'erp_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+
+            lines.append("# HELP erp_scored_rows_total Orders scored by endpoint")
+            lines.append("# TYPE erp_scored_rows_total counter")
+            for endpoint, n in sorted(self.rows.items()):
+                lines.append(f'erp_scored_rows_total{{endpoint="{endpoint}"}} {n}')
+
+            histogram("erp_request_duration_ms", "End-to-end request latency", self.latency, ["endpoint"])
+            histogram("erp_stage_duration_ms", "Time per request stage", self.stages, ["endpoint", "stage"])
+            histogram("erp_batch_size_rows", "Orders per request", self.batch_sizes, ["endpoint"])
+
+        for name, (fn, counters) in sorted(self.sources.items()):
+            for key, value in fn().items():
+                metric = f"erp_{name}_{key}_total" if key in counters else f"erp_{name}_{key}"
+                lines.append(f"# TYPE {metric} {'counter' if key in counters else 'gauge'}")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every request to a tracked endpoint (safe
+    with streaming request/response bodies). Stores the request start time
+    in scope state so handlers can derive their parse/validate stage.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, endpoints):
+        self.app = app
+        self.registry = registry
+        self.endpoints = set(endpoints)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.endpoints:
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = t0
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.observe_request(
+                scope["path"], status, (time.perf_counter() - t0) * 1000
+            )
@@ -0,0 +1,125 @@
+import itertools
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+
+from src.features import FeatureEncoder
+from src.forest import FlatForest
+from src.model_store import save_artifact
+
+# Candidate forests: tree count x depth x leaf size
+SEARCH_GRID = {
+    "n_estimators": [50, 100, 300],
+    "max_depth": [8, 12, 16, None],
+    "min_samples_leaf": [1, 5, 20],
+}
+# Smallest model whose validation AUC is within this of the best candidate wins
+AUC_TOLERANCE = float(os.getenv("SEARCH_AUC_TOLERANCE", "0.005"))
+# Parallel candidate fits (-1 = all cores); each fit is single-threaded
+SEARCH_JOBS = int(os.getenv("SEARCH_JOBS", "-1"))
+# Single-order latency is the median over this many one-row predictions
+LATENCY_ROWS = 200
+
+
+class Candidate(NamedTuple):
+    params: dict
+    auc: float
+    artifact_bytes: int
+    n_nodes: int
+    single_row_us: float
+    batch_row_us: float
+    fit_s: float
+
+
+def candidate_grid(grid: Dict[str, list] = SEARCH_GRID) -> List[dict]:
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def _fit(params: dict, X: np.ndarray, y: np.ndarray) -> Tuple[RandomForestClassifier, float]:
+    t0 = time.perf_counter()
+    clf = RandomForestClassifier(**params, random_state=42, n_jobs=1).fit(X, y)
+    return clf, time.perf_counter() - t0
+
+
+def _artifact_bytes(clf, encoder: FeatureEncoder, forest: FlatForest) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        save_artifact(Path(tmp), clf, encoder, forest, 0.5, {})
+        return sum(p.stat().st_size for p in Path(tmp).iterdir())
+
+
+def _latency_us(clf, forest: FlatForest, X: np.ndarray) -> Tuple[float, float]:
+    """
+    Per-row latency on the scoring paths in inference.predict: the flat
+    forest for one order, sklearn for a large batch.
+    """
+    rows = X[:LATENCY_ROWS]
+    single = []
+    for i in range(len(rows)):
+        t0 = time.perf_counter()
+        forest.predict_proba(rows[i:i + 1])
+        single.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    clf.predict_proba(X)
+    batch = (time.perf_counter() - t0) / len(X)
+    return float(np.median(single)) * 1e6, batch * 1e6
+
+
+def search(
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    encoder: FeatureEncoder,
+    grid: Dict[str, list] = SEARCH_GRID,
+    n_jobs: int = SEARCH_JOBS,
+) -> List[Candidate]:
+    """
+    Fit every grid candidate in parallel, then score each one (AUC on the
+    validation split) and measure its artifact size and latency. Timings
+    run one candidate at a time so they do not compete for cores.
+    """
+    params = candidate_grid(grid)
+    fitted = Parallel(n_jobs=n_jobs)(delayed(_fit)(p, X_train, y_train) for p in params)
+
+    results = []
+    for p, (clf, fit_s) in zip(params, fitted):
+        forest = FlatForest.from_sklearn(clf)
+        single_us, batch_us = _latency_us(clf, forest, X_val)
+        results.append(Candidate(
+            params=p,
+            auc=float(roc_auc_score(y_val, clf.predict_proba(X_val)[:, 1])),
+            artifact_bytes=_artifact_bytes(clf, encoder, forest),
+            n_nodes=forest.n_nodes,
+            single_row_us=single_us,
+            batch_row_us=batch_us,
+            fit_s=fit_s,
+        ))
+    return results
+
+
+def select(results: List[Candidate], auc_tolerance: float = AUC_TOLERANCE) -> Candidate:
+    """
+    Smallest artifact (then fastest single-order scoring) among the
+    candidates within auc_tolerance of the best validation AUC.
+    """
+    best_auc = max(c.auc for c in results)
+    eligible = [c for c in results if c.auc >= best_auc - auc_tolerance]
+    return min(eligible, key=lambda c: (c.artifact_bytes, c.single_row_us))
+
+
+def print_results(results: List[Candidate], chosen: Candidate) -> None:
+    print(f"   {'trees':>5} {'depth':>5} {'leaf':>4} {'AUC':>7} {'MB':>8} {'1-row µs':>9} {'batch µs/row':>12}")
+    for c in sorted(results, key=lambda c: c.artifact_bytes):
+        mark = " ⬅" if c is chosen else ""
+        print(
+            f"   {c.params['n_estimators']:>5} {str(c.params['max_depth']):>5} "
+            f"{c.params['min_samples_leaf']:>4} {c.auc:>7.4f} {c.artifact_bytes / 1e6:>8.2f} "
+            f"{c.single_row_us:>9.0f} {c.batch_row_us:>12.2f}{mark}"
+        )
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+
+from src.aggregate_store import get_store
+from src.features import FeatureEncoder
+from src.forest import FlatForest
+
+ROOT = Path(__file__).resolve().parents[1]
+MODELS_DIR = ROOT / "models"
+
+# Memory-mapped artifact directory written by train_model.py
+MODEL_DIR = Path(os.getenv("MODEL_DIR", MODELS_DIR / "delay_model"))
+# Single-file pickle bundle used before the artifact directory existed
+LEGACY_MODEL_PATH = MODELS_DIR / "delay_model.pkl"
+# Set MODEL_VERIFY=0 to skip checksum verification at load time
+MODEL_VERIFY = os.getenv("MODEL_VERIFY", "1") == "1"
+
+FORMAT = "erp-delay-risk/flat-forest"
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+SKLEARN_NAME = "sklearn_model.joblib"
+
+# String fields that legacy bundles one-hot encoded (no stored encoder)
+LEGACY_CATEGORICAL_COLS = [
+    "order_id",
+    "customer_id",
+    "item_id",
+    "plant",
+    "order_date",
+    "requested_ship_date",
+    "promised_ship_date",
+]
+
+
+class ModelArtifact:
+    """
+    Everything the scoring path needs: encoder, flat forest, decision
+    threshold and risk bands. The sklearn estimator (only used for very
+    large batches) is unpickled on first access.
+    """
+
+    def __init__(
+        self,
+        encoder: FeatureEncoder,
+        forest: FlatForest,
+        threshold: float,
+        risk_bands: Dict[str, float],
+        version: str,
+        sklearn_path: Optional[Path] = None,
+        sklearn_model=None,
+    ):
+        self.encoder = encoder
+        self.forest = forest
+        self.threshold = float(threshold)
+        self.risk_bands = dict(risk_bands)
+        self.version = version
+        self._sklearn_path = sklearn_path
+        self._sklearn_model = _single_threaded(sklearn_model)
+        self._sklearn_lock = threading.Lock()
+
+    @property
+    def feature_cols(self) -> List[str]:
+        return self.encoder.columns
+
+    @property
+    def scoring_version(self) -> str:
+        """
+        Model version plus the aggregate store generation it reads, for
+        anything keyed on "would this order score the same": a store
+        refresh changes features without changing the model.
+        """
+        if not self.encoder.aggregates:
+            return self.version
+        return f"{self.version}+agg{get_store().generation}"
+
+    @property
+    def has_sklearn(self) -> bool:
+        return self._sklearn_model is not None or (
+            self._sklearn_path is not None and self._sklearn_path.exists()
+        )
+
+    @property
+    def sklearn_model(self):
+        if self._sklearn_model is None:
+            with self._sklearn_lock:
+                if self._sklearn_model is None:
+                    self._sklearn_model = _single_threaded(joblib.load(self._sklearn_path))
+        return self._sklearn_model
+
+
+def _single_threaded(clf):
+    """
+    Training fits with n_jobs=-1, which would make every predict_proba fan
+    out over all cores from inside the API's own scoring threads/processes.
+    """
+    if clf is not None and getattr(clf, "n_jobs", None) not in (None, 1):
+        clf.n_jobs = 1
+    return clf
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def save_artifact(
+    directory: Path,
+    clf,
+    encoder: FeatureEncoder,
+    forest: FlatForest,
+    threshold: float,
+    risk_bands: Dict[str, float],
+) -> str:
+    """
+    Write the forest arrays as .npy files plus a manifest holding the
+    format header, encoder, scoring parameters and per-file checksums.
+    Returns the model version (a hash over the artifact contents).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    arrays = {}
+    for name, arr in forest.arrays().items():
+        path = directory / f"{name}.npy"
+        np.save(path, np.ascontiguousarray(arr))
+        arrays[name] = {"file": path.name, "sha256": _sha256(path)}
+
+    if clf is not None:
+        joblib.dump(_single_threaded(clf), directory / SKLEARN_NAME)
+
+    body = {
+        "max_depth": forest.max_depth,
+        "threshold": float(threshold),
+        "risk_bands": dict(risk_bands),
+        "encoder": encoder.to_dict(),
+        "arrays": arrays,
+    }
+    version = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:12]
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "model_version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **body,
+    }
+
+    # Manifest goes last and atomically, so a half-written artifact never loads
+    tmp = directory / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(directory / MANIFEST_NAME)
+    return version
+
+
+def load_artifact(directory: Path, verify: bool = True) -> ModelArtifact:
+    """
+    Open an artifact directory with the forest arrays memory-mapped
+    read-only, so worker processes on one host share the same pages.
+    """
+    directory = Path(directory)
+    manifest = json.loads((directory / MANIFEST_NAME).read_text())
+    if manifest.get("format") != FORMAT or manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported model artifact {manifest.get('format')!r} "
+            f"v{manifest.get('format_version')} in {directory}"
+        )
+
+    arrays = {}
+    for name, meta in manifest["arrays"].items():
+        path = directory / meta["file"]
+        if verify and _sha256(path) != meta["sha256"]:
+            raise ValueError(f"Checksum mismatch for {path}")
+        arrays[name] = np.load(path, mmap_mode="r")
+
+    return ModelArtifact(
+        encoder=FeatureEncoder.from_dict(manifest["encoder"]),
+        forest=FlatForest(max_depth=manifest["max_depth"], **arrays),
+        threshold=manifest["threshold"],
+        risk_bands=manifest["risk_bands"],
+        version=manifest["model_version"],
+        sklearn_path=directory / SKLEARN_NAME,
+    )
+
+
+def load_legacy_bundle(path: Path) -> ModelArtifact:
+    """
+    Load the old single-file joblib bundle ({"model", "columns", ...}).
+    """
+    bundle = joblib.load(path)
+    model = bundle["model"]
+    encoder = bundle.get("encoder") or FeatureEncoder.from_columns(
+        bundle["columns"], LEGACY_CATEGORICAL_COLS
+    )
+    return ModelArtifact(
+        encoder=encoder,
+        forest=bundle.get("forest") or FlatForest.from_sklearn(model),
+        threshold=bundle.get("threshold", 0.5),
+        risk_bands=bundle.get("risk_bands", {"high": 0.70, "medium": 0.40}),
+        version=f"legacy-{_sha256(path)[:12]}",
+        sklearn_model=model,
+    )
+
+
+_model: Optional[ModelArtifact] = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> ModelArtifact:
+    """
+    Shared lazy loader for api.py and inference.py: the artifact is opened
+    on first use, not at import, and then reused by every caller.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if (MODEL_DIR / MANIFEST_NAME).exists():
+                    _model = load_artifact(MODEL_DIR, verify=MODEL_VERIFY)
+                else:
+                    _model = load_legacy_bundle(LEGACY_MODEL_PATH)
+    return _model
+
+
+if __name__ == "__main__":
+    # Convert the legacy pickle bundle into the memory-mapped artifact layout
+    legacy = load_legacy_bundle(LEGACY_MODEL_PATH)
+    version = save_artifact(
+        MODEL_DIR,
+        legacy.sklearn_model,
+        legacy.encoder,
+        legacy.forest,
+        legacy.threshold,
+        legacy.risk_bands,
+    )
+    print(f"💾 Wrote model artifact {version} to: {MODEL_DIR}")
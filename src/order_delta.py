@@ -0,0 +1,139 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from src.schema import ORDER_SCHEMA
+
+# Columns whose values decide whether an order has changed
+FINGERPRINT_COLS = [c for c in ORDER_SCHEMA if c != "order_id"]
+
+
+def fingerprint(df: pd.DataFrame) -> np.ndarray:
+    """
+    64-bit content hash per order over FINGERPRINT_COLS (vectorized).
+    """
+    return pd.util.hash_pandas_object(df[FINGERPRINT_COLS], index=False).to_numpy(np.uint64)
+
+
+class OrderDelta(NamedTuple):
+    new: pd.DataFrame
+    changed: pd.DataFrame
+    closed: np.ndarray  # order_ids no longer in the feed
+    order_ids: np.ndarray  # full snapshot, for FingerprintStore.commit
+    fingerprints: np.ndarray
+
+    @property
+    def to_score(self) -> pd.DataFrame:
+        return pd.concat([self.new, self.changed], ignore_index=True)
+
+
+class FingerprintStore:
+    """
+    Last committed fingerprint per order_id, persisted as one .npz file.
+    A store written under a different model version reports every known
+    order as changed, so a model change forces a full re-score.
+    """
+
+    def __init__(self, path: Path, model_version: str):
+        self.path = Path(path)
+        self.model_version = model_version
+        self.order_ids = np.array([], dtype=str)
+        self.fingerprints = np.array([], dtype=np.uint64)
+        self.stale = False
+        if self.path.exists():
+            with np.load(self.path) as stored:
+                self.order_ids = stored["order_ids"]
+                self.fingerprints = stored["fingerprints"]
+                self.stale = str(stored["model_version"]) != model_version
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def diff(self, df: pd.DataFrame) -> OrderDelta:
+        if not df["order_id"].is_unique:
+            # An order listed twice in one extract: its last line wins
+            df = df.drop_duplicates("order_id", keep="last")
+        order_ids = df["order_id"].astype(str).to_numpy()
+        current = fingerprint(df)
+
+        pos = pd.Index(self.order_ids).get_indexer(order_ids)
+        is_new = pos < 0
+        is_changed = ~is_new
+        if not self.stale:
+            is_changed[~is_new] = self.fingerprints[pos[~is_new]] != current[~is_new]
+        still_open = np.zeros(len(self.order_ids), dtype=bool)
+        still_open[pos[~is_new]] = True
+        closed = self.order_ids[~still_open]
+
+        return OrderDelta(
+            new=df[is_new].reset_index(drop=True),
+            changed=df[is_changed].reset_index(drop=True),
+            closed=closed,
+            order_ids=order_ids,
+            fingerprints=current,
+        )
+
+    def commit(self, delta: OrderDelta) -> None:
+        """
+        Record delta's snapshot as scored; call after the scored table is updated.
+        """
+        self.order_ids = delta.order_ids.astype(str)
+        self.fingerprints = delta.fingerprints
+        self.stale = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(
+            tmp,
+            order_ids=self.order_ids,
+            fingerprints=self.fingerprints,
+            model_version=np.array(self.model_version),
+        )
+        tmp.replace(self.path)
+
+
+class ScoredOrderTable:
+    """
+    Materialized latest score per open order (SQLite, keyed by order_id),
+    updated in place so each cycle costs O(delta) writes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scored_orders ("
+            "order_id TEXT PRIMARY KEY, late_flag_pred INTEGER, late_probability REAL, "
+            "model_version TEXT, scored_at REAL)"
+        )
+
+    def merge(self, order_ids, probs, preds, closed, model_version: str) -> None:
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scored_orders VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    map(str, order_ids),
+                    map(int, preds),
+                    map(float, np.round(probs, 4)),
+                    [model_version] * len(preds),
+                    [now] * len(preds),
+                ),
+            )
+            self._db.executemany(
+                "DELETE FROM scored_orders WHERE order_id = ?", ((str(o),) for o in closed)
+            )
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM scored_orders").fetchone()[0]
+
+    def read(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM scored_orders", self._db)
+
+    def close(self) -> None:
+        self._db.close()
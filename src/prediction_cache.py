@@ -0,0 +1,152 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Rough resident size of one in-memory entry (16-byte key, OrderedDict slot,
+# value tuple), used to turn the memory cap into an entry limit
+ENTRY_BYTES = 240
+# Rows per IN (...) lookup against the disk tier
+DISK_LOOKUP_CHUNK = 500
+# Stats exported as monotonically increasing counters
+COUNTERS = ("hits", "misses", "evictions", "expirations", "disk_hits")
+
+
+def row_keys(X: np.ndarray, model_version: str) -> List[bytes]:
+    """
+    Content address for each encoded feature row: a 128-bit BLAKE2b of the
+    float32 row bytes, keyed by the model version so a new model never
+    reads predictions from the old one.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32) + np.float32(0.0)  # -0.0 -> 0.0
+    raw = X.tobytes()
+    width = X.shape[1] * X.itemsize
+    salt = model_version.encode()[:64]
+    return [
+        hashlib.blake2b(raw[start:start + width], digest_size=16, key=salt).digest()
+        for start in range(0, len(raw), width)
+    ]
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of (probability, flag) by feature-row hash, capped at
+    roughly max_bytes. An optional SQLite file under disk_dir acts as a
+    second tier that survives restarts and is shared by processes on a host.
+    """
+
+    def __init__(self, max_bytes: int, ttl_s: float, disk_dir: Optional[Path] = None):
+        self.max_entries = max(1, max_bytes // ENTRY_BYTES)
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[bytes, Tuple[float, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {name: 0 for name in COUNTERS}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_dir is not None:
+            disk_dir = Path(disk_dir)
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(disk_dir / "predictions.sqlite", check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key BLOB PRIMARY KEY, prob REAL, flag INTEGER, expires REAL)"
+            )
+            self._db.execute("DELETE FROM predictions WHERE expires < ?", (time.time(),))
+            self._db.commit()
+            self._db_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (probs, flags, hit mask); rows that missed hold 0.
+        """
+        n = len(keys)
+        probs = np.zeros(n, dtype=np.float64)
+        flags = np.zeros(n, dtype=np.int8)
+        hit = np.zeros(n, dtype=bool)
+        now = time.time()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] < now:
+                    del self._entries[key]
+                    self.stats["expirations"] += 1
+                    continue
+                self._entries.move_to_end(key)
+                probs[i], flags[i], hit[i] = entry[0], entry[1], True
+
+        if self._db is not None and not hit.all():
+            found = self._disk_get([keys[i] for i in np.flatnonzero(~hit)], now)
+            if found:
+                promoted = []
+                for i in np.flatnonzero(~hit):
+                    entry = found.get(keys[i])
+                    if entry is not None:
+                        probs[i], flags[i], hit[i] = entry[0], entry[1], True
+                        promoted.append((keys[i], entry))
+                with self._lock:
+                    self.stats["disk_hits"] += len(promoted)
+                    for key, entry in promoted:
+                        self._put(key, entry)
+
+        n_hits = int(hit.sum())
+        with self._lock:
+            self.stats["hits"] += n_hits
+            self.stats["misses"] += n - n_hits
+        return probs, flags, hit
+
+    def store(self, keys: List[bytes], probs: np.ndarray, flags: np.ndarray) -> None:
+        expires = time.time() + self.ttl_s
+        entries = [(key, (float(p), int(f), expires)) for key, p, f in zip(keys, probs, flags)]
+        with self._lock:
+            for key, entry in entries:
+                self._put(key, entry)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                    [(key, *entry) for key, entry in entries],
+                )
+                self._db.commit()
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": len(self._entries) * ENTRY_BYTES,
+                "max_bytes": self.max_entries * ENTRY_BYTES,
+            }
+
+    def _put(self, key: bytes, entry: Tuple[float, int, float]) -> None:
+        # Caller holds self._lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, keys: List[bytes], now: float) -> Dict[bytes, Tuple[float, int, float]]:
+        found = {}
+        with self._db_lock:
+            for start in range(0, len(keys), DISK_LOOKUP_CHUNK):
+                chunk = keys[start:start + DISK_LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    "SELECT key, prob, flag, expires FROM predictions "
+                    f"WHERE key IN ({','.join('?' * len(chunk))}) AND expires >= ?",
+                    (*chunk, now),
+                ).fetchall()
+                found.update({key: (prob, flag, expires) for key, prob, flag, expires in rows})
+        return found
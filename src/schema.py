@@ -0,0 +1,197 @@
+from typing import Any, Dict, List, Mapping
+
+import numpy as np
+import pandas as pd
+
+# OrderPayload fields and how each column is typed
+ORDER_SCHEMA = {
+    "order_id": "str",
+    "customer_id": "str",
+    "item_id": "str",
+    "plant": "str",
+    "order_date": "date",
+    "requested_ship_date": "date",
+    "promised_ship_date": "date",
+    "order_priority": "int",
+    "order_qty": "int",
+    "current_available_qty": "int",
+    "historical_lead_time_days": "float",
+    "supplier_reliability_score": "float",
+    "num_open_orders_customer": "int",
+    "past_due_invoices_flag": "int",
+    "weekday_ordered": "int",
+    "month_ordered": "int",
+}
+
+# Inclusive (low, high) bounds; None means unbounded on that side
+ORDER_RANGES = {
+    "order_priority": (1, None),
+    "order_qty": (0, None),
+    "current_available_qty": (0, None),
+    "historical_lead_time_days": (0, None),
+    "supplier_reliability_score": (0, 1),
+    "num_open_orders_customer": (0, None),
+    "past_due_invoices_flag": (0, 1),
+    "weekday_ordered": (0, 6),
+    "month_ordered": (1, 12),
+}
+
+
+class ColumnarValidationError(ValueError):
+    """
+    Carries FastAPI-style error entries ({"loc", "msg", "type"}) for a
+    columnar batch, one per failing field.
+    """
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid field(s)")
+        self.errors = errors
+
+
+def _error(field: str, msg: str, kind: str, rows=None) -> Dict[str, Any]:
+    err = {"loc": ["body", field], "msg": msg, "type": kind}
+    if rows is not None:
+        err["rows"] = [int(i) for i in np.flatnonzero(rows)[:10]]
+    return err
+
+
+def parse_dates(values) -> np.ndarray:
+    """
+    Date-like values -> datetime64[D], NaT where empty or unparseable.
+    ISO strings take the vectorized path; anything else pandas can read
+    (e.g. 03/05/2024, month first) is parsed value by value.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[D]")
+    raw = pd.Series(arr, dtype=object)
+    parsed = pd.to_datetime(raw, format="ISO8601", errors="coerce")
+    retry = (parsed.isna() & raw.notna()).to_numpy()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw[retry], format="mixed", errors="coerce")
+    return parsed.to_numpy(dtype="datetime64[D]")
+
+
+def parse_date(value) -> np.datetime64:
+    """
+    parse_dates for a single value, with NumPy's ISO parser as the fast path.
+    """
+    if isinstance(value, str):
+        try:
+            day = np.datetime64(value, "D")
+        except ValueError:
+            day = np.datetime64("NaT")
+        if not np.isnat(day):
+            return day
+    return parse_dates([value])[0]
+
+
+def require_dates(field: str, values) -> np.ndarray:
+    """
+    parse_dates, raising ColumnarValidationError if any value is empty or
+    unparseable (instead of scoring NaT as a huge day number).
+    """
+    dates = parse_dates(values)
+    bad = np.isnat(dates)
+    if bad.any():
+        raise ColumnarValidationError([_error(field, "not a date", "date_parsing", bad)])
+    return dates
+
+
+def _flat(values):
+    """
+    values as a 1-D array, or None if they hold nested lists.
+    """
+    try:
+        arr = np.asarray(values)
+    except ValueError:  # ragged nesting
+        return None
+    return arr if arr.ndim == 1 else None
+
+
+def _typed_column(field: str, kind: str, values, errors: List[Dict[str, Any]]):
+    arr = _flat(values)
+    if arr is None:
+        errors.append(_error(field, f"expected a flat list of {kind}s", f"{kind}_type"))
+        return None
+
+    if kind == "str":
+        bad = pd.isna(arr)
+        if bad.any():
+            errors.append(_error(field, "null values", "missing", bad))
+        return arr.astype(str)
+
+    if kind == "date":
+        dates = parse_dates(arr)
+        bad = np.isnat(dates)
+        if bad.any():
+            errors.append(_error(field, "not a date", "date_parsing", bad))
+        return dates
+
+    if arr.dtype.kind not in "iufOUS":
+        errors.append(_error(field, f"expected a flat list of {kind}s", f"{kind}_type"))
+        return None
+    if arr.dtype.kind in "OUS":
+        # Mixed or text values (e.g. a CSV cell): report the rows that aren't numbers
+        numeric = pd.to_numeric(pd.Series(arr), errors="coerce").to_numpy(dtype=np.float64)
+        bad = np.isnan(numeric) & ~pd.isna(arr)
+        if bad.any():
+            errors.append(_error(field, f"expected {kind}s", f"{kind}_parsing", bad))
+            return None
+        arr = numeric
+    if arr.dtype.kind == "f" and np.isnan(arr).any():
+        errors.append(_error(field, "null values", "missing", np.isnan(arr)))
+        return None
+    if kind == "int":
+        if arr.dtype.kind == "f":
+            fractional = arr != np.round(arr)
+            if fractional.any():
+                errors.append(_error(field, "expected integers", "int_from_float", fractional))
+                return None
+        return arr.astype(np.int64)
+    return arr.astype(np.float64)
+
+
+def validate_columns(payload: Mapping[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Validate a column-oriented batch ({field: [values...]}) with vectorized
+    dtype and range checks. Returns typed NumPy columns keyed by field;
+    raises ColumnarValidationError listing every problem found.
+    """
+    errors: List[Dict[str, Any]] = []
+
+    missing = [f for f in ORDER_SCHEMA if f not in payload]
+    if missing:
+        raise ColumnarValidationError([_error(f, "field required", "missing") for f in missing])
+
+    not_lists = [f for f in ORDER_SCHEMA if not isinstance(payload[f], (list, tuple, np.ndarray))]
+    if not_lists:
+        raise ColumnarValidationError([_error(f, "expected a list", "list_type") for f in not_lists])
+
+    lengths = {f: len(payload[f]) for f in ORDER_SCHEMA}
+    n_rows = lengths["order_id"]
+    for field, n in lengths.items():
+        if n != n_rows:
+            errors.append(_error(field, f"has {n} values, order_id has {n_rows}", "length_mismatch"))
+    if errors:
+        raise ColumnarValidationError(errors)
+
+    columns: Dict[str, np.ndarray] = {}
+    for field, kind in ORDER_SCHEMA.items():
+        arr = _typed_column(field, kind, payload[field], errors)
+        if arr is None:
+            continue
+        columns[field] = arr
+
+        low, high = ORDER_RANGES.get(field, (None, None))
+        out_of_range = np.zeros(n_rows, dtype=bool)
+        if low is not None:
+            out_of_range |= arr < low
+        if high is not None:
+            out_of_range |= arr > high
+        if out_of_range.any():
+            errors.append(_error(field, f"outside [{low}, {high}]", "range", out_of_range))
+
+    if errors:
+        raise ColumnarValidationError(errors)
+    return columns
@@ -0,0 +1,228 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import orjson
+import pyarrow as pa
+
+# Response formats, picked from the Accept header (see negotiate)
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+COLUMNAR_JSON = "application/vnd.erp.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+FORMATS = (ARROW_STREAM, NDJSON, COLUMNAR_JSON, JSON)
+
+_P1 = b'{"order_id":"'
+_P2 = b'","late_flag_pred":'
+_P3 = b',"late_probability":'
+_P4 = b"}"
+
+
+class Drivers(NamedTuple):
+    """Per-order explanations (see inference.explain), names already resolved."""
+
+    base_probability: float
+    fields: np.ndarray  # (n_rows, k) raw field names
+    contributions: np.ndarray  # (n_rows, k) signed, in probability units
+
+
+def negotiate(accept: str, default: str = JSON) -> str:
+    """
+    Response format for an Accept header: the supported media range with
+    the highest q-value, ties going to the one the client listed first.
+    */* and application/* mean default; q=0 rules a format out. Falls back
+    to default when nothing listed is supported (or the header is missing).
+    """
+    ranges, refused = [], set()
+    for part in (accept or "").split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        media = media.lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = -1.0
+        if media in FORMATS:
+            candidates = [media]
+        elif media in ("*/*", "application/*"):
+            candidates = [default, *FORMATS]
+        else:
+            continue
+        if q > 0:
+            ranges.append((q, candidates))
+        elif q == 0 and media in FORMATS:
+            refused.add(media)
+    # Stable sort: equal q-values keep the client's order
+    for _, candidates in sorted(ranges, key=lambda r: -r[0]):
+        for fmt in candidates:
+            if fmt not in refused:
+                return fmt
+    return default
+
+
+def _utf8(order_ids: Sequence) -> pa.StringArray:
+    arr = pa.array(np.asarray(order_ids, dtype=object), type=pa.string())
+    return arr if arr.offset == 0 else pa.concat_arrays([arr])
+
+
+def _rows(order_ids: Sequence, probs: np.ndarray, preds: np.ndarray, sep: bytes) -> bytes:
+    """
+    Render every row as {"order_id":..., "late_flag_pred":..., "late_probability":...}
+    followed by sep, straight into one byte buffer with no per-row Python
+    objects. Probabilities are rounded to 4 places (written as d.dddd);
+    ids needing JSON escapes go through orjson instead.
+    """
+    n = len(preds)
+    if n == 0:
+        return b""
+    ids = _utf8(order_ids)
+    id_offsets = np.frombuffer(ids.buffers()[1], dtype=np.int32, count=n + 1)
+    id_bytes = np.frombuffer(ids.buffers()[2], dtype=np.uint8, count=int(id_offsets[-1]))
+    if ((id_bytes < 0x20) | (id_bytes == ord('"')) | (id_bytes == ord("\\"))).any():
+        rows = [
+            orjson.dumps({"order_id": i, "late_flag_pred": f, "late_probability": p})
+            for i, f, p in zip(ids.to_pylist(), np.asarray(preds).tolist(), np.round(probs, 4).tolist())
+        ]
+        return sep.join(rows) + sep
+
+    # Everything but the id is fixed width, so rows are the columns of an
+    # (n, width) byte matrix filled from a template; with equal-length ids
+    # (the usual order-number format) they go into the matrix too
+    id_len = np.diff(id_offsets)
+    uniform = int(id_len.min()) == int(id_len.max())
+    gap = int(id_len[0]) if uniform else 0
+    tail = _P2 + b"0" + _P3 + b"0.0000" + _P4 + sep
+    fixed = np.empty((n, len(_P1) + gap + len(tail)), dtype=np.uint8)
+    fixed[:, : len(_P1)] = np.frombuffer(_P1, dtype=np.uint8)
+    fixed[:, len(_P1) + gap :] = np.frombuffer(tail, dtype=np.uint8)
+    if uniform:
+        fixed[:, len(_P1) : len(_P1) + gap] = id_bytes.reshape(n, gap)
+    flag_col = len(_P1) + gap + len(_P2)
+    fixed[:, flag_col] += np.asarray(preds, dtype=np.uint8)
+    q = np.rint(np.clip(probs, 0.0, 1.0) * 10000).astype(np.int32)
+    prob_col = flag_col + 1 + len(_P3)
+    fixed[:, prob_col] += (q // 10000).astype(np.uint8)
+    for k in range(4):
+        fixed[:, prob_col + 2 + k] += (q // 10 ** (3 - k) % 10).astype(np.uint8)
+    if uniform:
+        return fixed.tobytes()
+
+    # Otherwise interleave: row i is fixed[i, :len(_P1)] + id_i + fixed[i, len(_P1):]
+    row_start = np.zeros(n, dtype=np.int64)
+    np.cumsum(id_len[:-1] + fixed.shape[1], out=row_start[1:])
+    is_id = np.zeros(int(id_offsets[-1]) + fixed.size, dtype=bool)
+    is_id[np.repeat(row_start + len(_P1) - id_offsets[:-1], id_len) + np.arange(len(id_bytes))] = True
+    out = np.empty(len(is_id), dtype=np.uint8)
+    out[is_id] = id_bytes
+    out[~is_id] = fixed.ravel()
+    return out.tobytes()
+
+
+def _summary(preds: np.ndarray, drivers: Optional[Drivers] = None) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"n_orders": len(preds), "late_count": int(np.count_nonzero(preds == 1))}
+    if drivers is not None:
+        summary["base_probability"] = round(drivers.base_probability, 4)
+    return summary
+
+
+def _explained_rows(order_ids: Sequence, probs: np.ndarray, preds: np.ndarray, drivers: Drivers) -> List[bytes]:
+    # Rows with a nested drivers list go through orjson one dict at a time;
+    # next to explaining them, this is a small share of the request
+    contributions = np.round(drivers.contributions, 4).tolist()
+    return [
+        orjson.dumps(
+            {
+                "order_id": order_id,
+                "late_flag_pred": flag,
+                "late_probability": prob,
+                "drivers": [{"field": f, "contribution": c} for f, c in zip(fields, values)],
+            }
+        )
+        for order_id, flag, prob, fields, values in zip(
+            np.asarray(order_ids, dtype=object).tolist(),
+            np.asarray(preds).tolist(),
+            np.round(probs, 4).tolist(),
+            drivers.fields.tolist(),
+            contributions,
+        )
+    ]
+
+
+def results_json(order_ids: Sequence, probs: np.ndarray, preds: np.ndarray, drivers: Optional[Drivers] = None) -> bytes:
+    """
+    {"n_orders", "late_count", "results": [{order_id, late_flag_pred, late_probability}, ...]}
+    With drivers, also "base_probability" and a per-result "drivers" list.
+    """
+    head = orjson.dumps(_summary(preds, drivers))[:-1]
+    if drivers is not None:
+        return head + b',"results":[' + b",".join(_explained_rows(order_ids, probs, preds, drivers)) + b"]}"
+    return head + b',"results":[' + _rows(order_ids, probs, preds, b",")[:-1] + b"]}"
+
+
+def results_ndjson(
+    order_ids: Sequence,
+    probs: np.ndarray,
+    preds: np.ndarray,
+    drivers: Optional[Drivers] = None,
+    summary: bool = True,
+) -> bytes:
+    """
+    One result object per line, then (with summary) a {"n_orders", "late_count"} line.
+    """
+    if drivers is not None:
+        body = b"".join(row + b"\n" for row in _explained_rows(order_ids, probs, preds, drivers))
+    else:
+        body = _rows(order_ids, probs, preds, b"\n")
+    return body + orjson.dumps(_summary(preds, drivers)) + b"\n" if summary else body
+
+
+def results_columnar(order_ids: Sequence, probs: np.ndarray, preds: np.ndarray, drivers: Optional[Drivers] = None) -> bytes:
+    """
+    Parallel arrays: {"n_orders", "late_count", "order_id": [...], "late_flag_pred": [...], "late_probability": [...]}
+    With drivers, also "base_probability" plus "driver_field" / "driver_contribution" (k per order).
+    """
+    out = {
+        **_summary(preds, drivers),
+        "order_id": np.asarray(order_ids, dtype=object).tolist(),
+        "late_flag_pred": np.ascontiguousarray(preds, dtype=np.int8),
+        "late_probability": np.round(np.asarray(probs, dtype=np.float64), 4),
+    }
+    if drivers is not None:
+        out["driver_field"] = drivers.fields.tolist()
+        out["driver_contribution"] = np.round(drivers.contributions, 4)
+    return orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def results_arrow(order_ids: Sequence, probs: np.ndarray, preds: np.ndarray, drivers: Optional[Drivers] = None) -> bytes:
+    """
+    Arrow IPC stream of one record batch (order_id, late_flag_pred,
+    late_probability at full precision); the summary is schema metadata.
+    Drivers add fixed-size list columns driver_field / driver_contribution.
+    """
+    columns = {
+        "order_id": _utf8(order_ids),
+        "late_flag_pred": pa.array(np.asarray(preds, dtype=np.int8)),
+        "late_probability": pa.array(np.asarray(probs, dtype=np.float64)),
+    }
+    if drivers is not None:
+        k = drivers.fields.shape[1]
+        columns["driver_field"] = pa.FixedSizeListArray.from_arrays(_utf8(drivers.fields.ravel()), k)
+        columns["driver_contribution"] = pa.FixedSizeListArray.from_arrays(
+            pa.array(np.ravel(drivers.contributions).astype(np.float64)), k
+        )
+    table = pa.table(columns)
+    table = table.replace_schema_metadata({k: str(v) for k, v in _summary(preds, drivers).items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    JSON: results_json,
+    NDJSON: results_ndjson,
+    COLUMNAR_JSON: results_columnar,
+    ARROW_STREAM: results_arrow,
+}
@@ -1,56 +1,248 @@
+import argparse
+import json
+import resource
+import time
 from pathlib import Path
 
-import joblib
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 from sklearn.model_selection import train_test_split
 
+from src.aggregate_store import (
+    AGG_STORE_DIR,
+    AGGREGATE_FEATURES,
+    AggregateStore,
+    PointInTimeAggregates,
+    build_store,
+    point_in_time_features,
+)
+from src.erp_client import ERP_CHUNK_ROWS, iter_open_orders
+from src.features import FeatureEncoder
+from src.forest import FlatForest
+from src.model_search import AUC_TOLERANCE, print_results, search, select
+from src.model_store import save_artifact
+
 # Project paths
 ROOT = Path(__file__).resolve().parents[1]
 DATA_PATH = ROOT / "data" / "open_orders_train.csv"
-MODEL_PATH = ROOT / "models" / "delay_model.pkl"
+MODEL_DIR = ROOT / "models" / "delay_model"
+
+# Probability at which an order is flagged late, plus the dashboard bands
+THRESHOLD = 0.5
+RISK_BANDS = {"high": 0.70, "medium": 0.40}
+
+N_ESTIMATORS = 300
+# Incremental mode: share of each chunk held out for evaluation, and a cap on the total
+HOLDOUT_FRACTION = 0.2
+HOLDOUT_MAX_ROWS = 200_000
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
 
 
-def main():
-    print(f"📦 Loading training data from: {DATA_PATH}")
+def _log_run(path: Path, record: dict) -> None:
+    """
+    Append one JSON line per training run (wall time, peak RSS, ...).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
 
-    df = pd.read_csv(DATA_PATH)
+
+def main(
+    data_path: Path = DATA_PATH,
+    model_dir: Path = MODEL_DIR,
+    agg_dir: Path = AGG_STORE_DIR,
+    incremental: bool = False,
+    chunk_rows: int = ERP_CHUNK_ROWS,
+    search_models: bool = False,
+    auc_tolerance: float = AUC_TOLERANCE,
+):
+    t0 = time.perf_counter()
+    if incremental:
+        clf, encoder, X_test, y_test, stats = train_incremental(data_path, agg_dir, chunk_rows)
+    else:
+        clf, encoder, X_test, y_test, stats = train_in_memory(
+            data_path, agg_dir, search_models, auc_tolerance
+        )
+
+    print("📊 Evaluation on test set:")
+    y_pred = (clf.predict_proba(X_test)[:, 1] >= THRESHOLD).astype(int)
+    print(classification_report(y_test, y_pred))
+
+    print("🧱 Flattening trees for the scoring engine...")
+    forest = FlatForest.from_sklearn(clf)
+
+    version = save_artifact(model_dir, clf, encoder, forest, THRESHOLD, RISK_BANDS)
+    print(f"💾 Model {version} saved to: {model_dir}")
+
+    record = {
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "mode": "incremental" if incremental else "in_memory",
+        "data": str(data_path),
+        "model_version": version,
+        "n_estimators": len(clf.estimators_),
+        **stats,
+        "wall_s": round(time.perf_counter() - t0, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+    # Next to the artifact directory, which is rewritten on every run
+    _log_run(Path(model_dir).parent / "training_runs.jsonl", record)
+    print(f"⏱️ {record['wall_s']}s wall, peak RSS {record['peak_rss_mb']} MB")
+    return record
+
+
+def train_in_memory(
+    data_path: Path,
+    agg_dir: Path,
+    search_models: bool = False,
+    auc_tolerance: float = AUC_TOLERANCE,
+):
+    """
+    Load the whole extract, encode it once and fit the forest on 80% of it.
+    With search_models, the forest's size is picked by model_search first.
+    """
+    print(f"📦 Loading training data from: {data_path}")
+
+    df = pd.read_csv(data_path)
 
     # Target column from generate_data.py
     target_col = "late_flag"
 
+    # The same history seeds the aggregate store used at scoring time; rows
+    # train on point-in-time aggregates (only orders before their own month)
+    print(f"📚 Building aggregate feature store in: {agg_dir}")
+    build_store(df, agg_dir)
+    df = df.assign(**point_in_time_features(df))
+
     # Features = everything except the target
     X = df.drop(columns=[target_col])
     y = df[target_col]
 
-    print("🧮 One-hot encoding categorical features...")
-    X = pd.get_dummies(X, drop_first=True)
+    print("🧮 Encoding features (date deltas, key frequencies, one-hot)...")
+    encoder = FeatureEncoder.fit(X)
+    X = encoder.transform(X)
+    print(f"   {X.shape[1]} feature columns: {encoder.columns}")
 
     print("🔀 Splitting train/test...")
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42, stratify=y
     )
 
-    print("🌲 Training RandomForestClassifier...")
+    params = {"n_estimators": N_ESTIMATORS, "max_depth": None}
+    stats = {"rows": len(df)}
+    if search_models:
+        print("🔍 Searching forest sizes (validation AUC, artifact size, latency)...")
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train, y_train, test_size=0.25, random_state=42, stratify=y_train
+        )
+        results = search(X_fit, y_fit, X_val, y_val, encoder)
+        chosen = select(results, auc_tolerance)
+        print_results(results, chosen)
+        print(f"   Smallest within {auc_tolerance} AUC of the best: {chosen.params}")
+        params = chosen.params
+        stats["search"] = {
+            "candidates": len(results),
+            "auc_tolerance": auc_tolerance,
+            "best_auc": round(max(c.auc for c in results), 4),
+            **chosen._asdict(),
+        }
+
+    print(f"🌲 Training RandomForestClassifier {params}...")
+    clf = RandomForestClassifier(**params, random_state=42, n_jobs=-1)
+    clf.fit(X_train, y_train)
+    return clf, encoder, X_test, y_test, stats
+
+
+def train_incremental(data_path: Path, agg_dir: Path, chunk_rows: int):
+    """
+    Out-of-core training over the extract read in chunks (via the Parquet
+    cache), for histories that do not fit in memory.
+
+    Pass 1 streams the chunks once to fit the encoder's category counts,
+    collect point-in-time aggregate sums and build the aggregate store.
+    Pass 2 encodes one chunk at a time into float32 and grows a
+    warm-started forest, each chunk adding trees in proportion to its
+    rows; a random share of each chunk is held out for evaluation.
+    """
+    print(f"📦 Streaming training data from: {data_path} ({chunk_rows} rows per chunk)")
+    target_col = "late_flag"
+    store = AggregateStore.empty(agg_dir)
+    pit = PointInTimeAggregates()
+    n_rows = 0
+    n_chunks = 0
+
+    def first_pass():
+        nonlocal n_rows, n_chunks
+        for chunk in iter_open_orders(data_path, chunk_rows):
+            pit.add(chunk)
+            store.refresh(chunk, since_watermark=False)
+            n_rows += len(chunk)
+            n_chunks += 1
+            yield chunk.drop(columns=[target_col])
+
+    print("🧮 Pass 1: fitting encoder and aggregate store...")
+    encoder = FeatureEncoder.fit_chunks(first_pass(), aggregates=AGGREGATE_FEATURES)
+    store.save()
+    print(f"   {n_rows} rows in {n_chunks} chunks, {encoder.n_features} feature columns")
+    print(f"📚 Aggregate feature store saved to: {agg_dir}")
+
+    print(f"🌲 Pass 2: growing RandomForestClassifier to {N_ESTIMATORS} trees...")
     clf = RandomForestClassifier(
-        n_estimators=300,
+        n_estimators=0,
         max_depth=None,
         random_state=42,
         n_jobs=-1,
+        warm_start=True,
     )
-    clf.fit(X_train, y_train)
+    rng = np.random.default_rng(42)
+    test_X, test_y = [], []
+    n_test = 0
+    seen = 0
+    for chunk in iter_open_orders(data_path, chunk_rows):
+        X = encoder.transform(chunk.assign(**pit.lookup(chunk)))
+        y = chunk[target_col].to_numpy()
+        seen += len(chunk)
 
-    print("📊 Evaluation on test set:")
-    y_pred = clf.predict(X_test)
-    print(classification_report(y_test, y_pred))
+        holdout = rng.random(len(chunk)) < HOLDOUT_FRACTION
+        holdout &= np.cumsum(holdout) <= HOLDOUT_MAX_ROWS - n_test
+        test_X.append(X[holdout])
+        test_y.append(y[holdout])
+        n_test += int(holdout.sum())
+
+        target = round(N_ESTIMATORS * seen / n_rows)
+        if target > clf.n_estimators:
+            clf.n_estimators = target
+            clf.fit(X[~holdout], y[~holdout])
+        print(f"   {seen}/{n_rows} rows, {len(clf.estimators_)} trees, peak RSS {_peak_rss_mb():.0f} MB")
 
-    MODEL_PATH.parent.mkdir(exist_ok=True)
-    joblib.dump({"model": clf, "columns": X.columns.tolist()}, MODEL_PATH)
-    print(f"💾 Model saved to: {MODEL_PATH}")
+    stats = {"rows": n_rows, "chunks": n_chunks, "chunk_rows": chunk_rows}
+    return clf, encoder, np.concatenate(test_X), np.concatenate(test_y), stats
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the delay-risk model")
+    parser.add_argument("--data", type=Path, default=DATA_PATH)
+    parser.add_argument("--model-dir", type=Path, default=MODEL_DIR)
+    parser.add_argument("--agg-dir", type=Path, default=AGG_STORE_DIR)
+    parser.add_argument(
+        "--incremental", action="store_true", help="stream the data in chunks (out-of-core)"
+    )
+    parser.add_argument("--chunk-rows", type=int, default=ERP_CHUNK_ROWS)
+    parser.add_argument(
+        "--search", action="store_true", help="pick the smallest forest within --auc-tolerance of the best"
+    )
+    parser.add_argument("--auc-tolerance", type=float, default=AUC_TOLERANCE)
+    args = parser.parse_args()
+    if args.search and args.incremental:
+        parser.error("--search needs the in-memory mode")
+
     print("🚀 Starting training script...")
-    main()
+    main(
+        args.data, args.model_dir, args.agg_dir, args.incremental, args.chunk_rows,
+        args.search, args.auc_tolerance,
+    )
     print("✅ Training complete.")
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src import model_store
+from src.features import FeatureEncoder
+from src.forest import FlatForest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
+@pytest.fixture(scope="session")
+def train_df() -> pd.DataFrame:
+    return pd.read_csv(DATA_DIR / "open_orders_train.csv")
+
+
+@pytest.fixture(scope="session")
+def sample_df() -> pd.DataFrame:
+    return pd.read_csv(DATA_DIR / "open_orders_scoring_sample.csv")
+
+
+@pytest.fixture(scope="session")
+def encoder(train_df) -> FeatureEncoder:
+    # No aggregate-store columns, so nothing here needs data/aggregates
+    return FeatureEncoder.fit(train_df.drop(columns=["late_flag"]))
+
+
+@pytest.fixture(scope="session")
+def clf(train_df, encoder) -> RandomForestClassifier:
+    X = encoder.transform(train_df)
+    return RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0, n_jobs=1).fit(
+        X, train_df["late_flag"]
+    )
+
+
+@pytest.fixture(scope="session")
+def model(encoder, clf) -> model_store.ModelArtifact:
+    """
+    A small model trained on the repo's CSV, installed as the shared
+    artifact get_model() returns (no models/ directory needed).
+    """
+    artifact = model_store.ModelArtifact(
+        encoder=encoder,
+        forest=FlatForest.from_sklearn(clf),
+        threshold=0.5,
+        risk_bands={"high": 0.70, "medium": 0.40},
+        version="test-model",
+        sklearn_model=clf,
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(model_store, "_model", artifact)
+        yield artifact
+
+
+@pytest.fixture(scope="session")
+def client(model):
+    from fastapi.testclient import TestClient
+
+    from src.api import app
+
+    # One app lifespan per process: stopping the backend shuts its lanes down
+    with TestClient(app) as c:
+        yield c
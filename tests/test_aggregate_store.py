@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src import aggregate_store, model_store
+from src.aggregate_store import AGG_ENTITIES, AGGREGATE_FEATURES, AggregateStore, build_store, point_in_time_features
+from src.features import FeatureEncoder
+from src.forest import FlatForest
+
+
+def _orders(rows):
+    """(customer_id, order_date, late_flag) tuples -> a closed-order frame."""
+    df = pd.DataFrame(rows, columns=["customer_id", "order_date", "late_flag"])
+    return df.assign(item_id="I1", plant="P1", historical_lead_time_days=10.0)
+
+
+def _count(store, customer):
+    return store.lookup_one({"customer_id": customer, "item_id": "I1", "plant": "P1"})["customer_id_order_count"]
+
+
+def test_refresh_rolls_the_window(tmp_path):
+    store = AggregateStore.empty(tmp_path, window_months=3)
+    store.refresh(_orders([("A", "2024-01-10", 1), ("A", "2024-02-10", 0), ("B", "2024-01-20", 1)]))
+    assert _count(store, "A") == 2 and _count(store, "B") == 1
+
+    # April: window is Feb-Apr, so January's orders drop out
+    store.refresh(_orders([("A", "2024-04-05", 1)]))
+    assert _count(store, "A") == 2
+    assert _count(store, "B") == 0
+    assert store.watermark == "2024-04-05"
+
+
+def test_refresh_only_adds_orders_after_the_watermark(tmp_path):
+    store = AggregateStore.empty(tmp_path, window_months=3)
+    store.refresh(_orders([("A", "2024-03-10", 1)]))
+    added = store.refresh(_orders([("A", "2024-03-10", 1), ("A", "2024-03-11", 0)]))
+    assert added == 1 and _count(store, "A") == 2
+    assert store.refresh(_orders([("A", "2024-03-10", 1)]), since_watermark=False) == 1
+    assert _count(store, "A") == 3
+
+
+def test_save_load_switches_generations(tmp_path, train_df):
+    store = build_store(train_df, tmp_path)
+    assert store.generation == 1
+    store.refresh(_orders([("NEW", "2099-01-01", 1)]))
+    store.save()
+
+    assert not list(tmp_path.glob("*.1.npy"))
+    loaded = AggregateStore.load(tmp_path)
+    assert loaded.generation == 2 and loaded.watermark == "2099-01-01"
+    for entity in AGG_ENTITIES:
+        assert loaded.keys[entity].equals(store.keys[entity])
+        np.testing.assert_array_equal(loaded.tables[entity], store.tables[entity])
+
+
+def test_lookup_matches_lookup_one(tmp_path, train_df, sample_df):
+    store = build_store(train_df, tmp_path)
+    orders = sample_df.head(50).copy()
+    orders.loc[0, "customer_id"] = "C_UNSEEN"
+    batch = store.lookup(orders)
+    typed = store.lookup(orders.astype({e: "category" for e in AGG_ENTITIES}))
+    for i, record in enumerate(orders.to_dict(orient="records")):
+        one = store.lookup_one(record)
+        for name in AGGREGATE_FEATURES:
+            assert batch[name][i] == pytest.approx(one[name])
+            assert typed[name][i] == batch[name][i]
+    # An unseen key gets the prior: no orders of its own
+    assert batch["customer_id_order_count"][0] == 0
+
+
+@pytest.fixture
+def aggregate_model(tmp_path, monkeypatch, train_df):
+    """
+    A model trained on point-in-time aggregates, scoring against a store
+    built from the same history (what train_model does).
+    """
+    monkeypatch.setattr(aggregate_store, "_store", build_store(train_df, tmp_path))
+    df = train_df.assign(**point_in_time_features(train_df))
+    encoder = FeatureEncoder.fit(df.drop(columns=["late_flag"]))
+    assert encoder.aggregates
+    clf = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=0, n_jobs=1)
+    clf.fit(encoder.transform(df), df["late_flag"])
+    artifact = model_store.ModelArtifact(
+        encoder, FlatForest.from_sklearn(clf), 0.5, {"high": 0.7, "medium": 0.4}, "agg-model", sklearn_model=clf
+    )
+    monkeypatch.setattr(model_store, "_model", artifact)
+    return artifact
+
+
+def test_api_scores_with_the_aggregate_store(client, aggregate_model, sample_df):
+    orders = sample_df.head(20)
+    X = aggregate_model.encoder.transform(orders)
+    expected = np.round(aggregate_model.forest.predict_proba(X)[:, 1], 4)
+    for i, record in enumerate(orders.head(3).to_dict(orient="records")):
+        np.testing.assert_array_equal(aggregate_model.encoder.transform_one(record)[0], X[i])
+        assert client.post("/score_order", json=record).json()["late_probability"] == expected[i]
+
+    results = client.post("/batch_score", json=orders.to_dict(orient="records")).json()["results"]
+    assert [r["late_probability"] for r in results] == expected.tolist()
+    assert client.get("/model_info").json()["scoring_version"] == "agg-model+agg1"
@@ -0,0 +1,164 @@
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+
+def _records(df, n=20):
+    return df.head(n).to_dict(orient="records")
+
+
+def test_score_order(client, sample_df):
+    r = client.post("/score_order", json=_records(sample_df, 1)[0])
+    assert r.status_code == 200
+    assert 0.0 <= r.json()["late_probability"] <= 1.0
+
+
+def test_batch_endpoints_agree(client, sample_df):
+    rows = client.post("/batch_score", json=_records(sample_df)).json()["results"]
+    columns = {k: sample_df[k].head(20).tolist() for k in sample_df.columns}
+    col = client.post("/batch_score/columnar", json=columns).json()
+    assert col["late_probability"] == [r["late_probability"] for r in rows]
+    stream = client.post("/batch_score/stream", content=sample_df.head(20).to_csv(index=False),
+                         headers={"Content-Type": "text/csv"})
+    lines = [json.loads(line) for line in stream.text.splitlines()]
+    assert lines[:-1] == rows and lines[-1]["n_orders"] == 20
+
+
+def test_columnar_range_error_is_422(client, sample_df):
+    columns = {k: sample_df[k].head(3).tolist() for k in sample_df.columns}
+    columns["month_ordered"][1] = 13
+    r = client.post("/batch_score/columnar", json=columns)
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"] == ["body", "month_ordered"]
+
+
+def test_explain_drivers(client, sample_df):
+    r = client.post("/batch_score?explain=true&top_k=2", json=_records(sample_df, 5)).json()
+    assert "base_probability" in r
+    assert all(len(row["drivers"]) == 2 for row in r["results"])
+
+
+def test_non_iso_dates_score_like_iso(client, sample_df):
+    record = _records(sample_df, 1)[0]
+    us = dict(record, order_date="{1}/{2}/{0}".format(*record["order_date"].split("-")))
+    iso = client.post("/score_order", json=record).json()
+    assert client.post("/score_order", json=us).json() == iso
+    assert client.post("/batch_score", json=[us]).json()["results"][0]["late_probability"] == round(
+        iso["late_probability"], 4
+    )
+
+
+def test_bad_dates_are_422(client, sample_df):
+    record = _records(sample_df, 1)[0]
+    for value in ["", "soon"]:
+        for path, body in [("/score_order", dict(record, order_date=value)),
+                           ("/batch_score", [dict(record, order_date=value)])]:
+            r = client.post(path, json=body)
+            assert r.status_code == 422, (path, value)
+            assert "order_date" in json.dumps(r.json()["detail"])
+
+
+def _stream(client, body, csv=False):
+    headers = {"Content-Type": "text/csv"} if csv else {}
+    r = client.post("/batch_score/stream", content=body, headers=headers)
+    assert r.status_code == 200
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_stream_rejects_out_of_range_rows(client, sample_df):
+    df = sample_df.head(5).copy()
+    df.loc[3, "supplier_reliability_score"] = 7.0
+    *_, last = _stream(client, df.to_csv(index=False), csv=True)
+    assert last["error"] == "invalid rows"
+    assert last["detail"] == [{"loc": ["body", "supplier_reliability_score"], "msg": "outside [0, 1]",
+                               "type": "range", "rows": [3]}]
+
+
+def test_stream_reports_bad_values_per_row(client, sample_df):
+    df = sample_df.head(4).copy()
+    df["order_qty"] = df["order_qty"].astype(object)
+    df.loc[2, "order_qty"] = "abc"
+    (err,) = _stream(client, df.to_csv(index=False), csv=True)[-1]["detail"]
+    assert err["loc"] == ["body", "order_qty"] and err["rows"] == [2]
+
+    lines = [json.dumps(r) for r in _records(sample_df, 3)]
+    lines.insert(1, "not json")
+    (err,) = _stream(client, "\n".join(lines))[-1]["detail"]
+    assert err["type"] == "json_invalid" and err["rows"] == [1]
+
+
+def test_stream_error_rows_count_from_stream_start(client, sample_df, monkeypatch):
+    from src import api
+
+    monkeypatch.setattr(api, "STREAM_CHUNK_ROWS", 4)
+    df = sample_df.head(10).copy()
+    df.loc[9, "month_ordered"] = 0
+    lines = _stream(client, df.to_csv(index=False), csv=True)
+    assert len(lines) == 9  # two good chunks, then the error
+    assert lines[-1]["detail"][0]["rows"] == [9]
+
+
+def test_every_endpoint_accepts_the_same_dates(client, sample_df):
+    df = sample_df.head(3).copy()
+    expected = client.post("/batch_score", json=_records(df, 3)).json()["results"]
+    df["order_date"] = pd.to_datetime(df["order_date"]).dt.strftime("%m/%d/%Y")
+    assert client.post("/batch_score", json=_records(df, 3)).json()["results"] == expected
+    columns = {k: df[k].tolist() for k in df.columns}
+    col = client.post("/batch_score/columnar", json=columns).json()
+    assert col["late_probability"] == [r["late_probability"] for r in expected]
+    assert _stream(client, df.to_csv(index=False), csv=True)[:-1] == expected
+
+
+def test_unparseable_dates_rejected_everywhere(client, sample_df):
+    df = sample_df.head(3).copy()
+    df.loc[1, "order_date"] = "soon"
+    assert client.post("/batch_score", json=_records(df, 3)).status_code == 422
+    columns = {k: df[k].tolist() for k in df.columns}
+    r = client.post("/batch_score/columnar", json=columns)
+    assert r.status_code == 422 and r.json()["detail"][0]["rows"] == [1]
+    (err,) = _stream(client, df.to_csv(index=False), csv=True)[-1]["detail"]
+    assert err == {"loc": ["body", "order_date"], "msg": "not a date", "type": "date_parsing", "rows": [1]}
+
+
+def test_columnar_scalar_field_is_422(client, sample_df):
+    columns = {k: sample_df[k].head(3).tolist() for k in sample_df.columns}
+    columns["order_qty"] = 5
+    r = client.post("/batch_score/columnar", json=columns)
+    assert r.status_code == 422 and r.json()["detail"][0]["type"] == "list_type"
+
+
+def test_stream_csv_keeps_quoted_line_breaks(client, sample_df):
+    df = sample_df.head(4).copy()
+    df["order_id"] = ["SO-1", "SO\n2", 'SO "3"', "SO-4\r\n\nend"]
+    rows = _stream(client, df.to_csv(index=False), csv=True)
+    assert [r["order_id"] for r in rows[:-1]] == df["order_id"].tolist()
+    assert rows[-1]["n_orders"] == 4
+
+
+def test_score_order_encodes_on_the_interactive_lane(client, model, sample_df, monkeypatch):
+    threads = []
+    encode = model.encoder.transform_one
+
+    def spy(record):
+        threads.append(threading.current_thread().name)
+        return encode(record)
+
+    monkeypatch.setattr(model.encoder, "transform_one", spy)
+    record = sample_df.head(1).to_dict(orient="records")[0]
+    assert client.post("/score_order", json=record).status_code == 200
+    assert threads and threads[0].startswith("score-interactive")
+
+
+@pytest.mark.parametrize("field, value", [("supplier_reliability_score", 5.0), ("month_ordered", 40), ("order_qty", -1)])
+def test_out_of_range_rejected_everywhere(client, sample_df, field, value):
+    df = sample_df.head(3).copy()
+    df[field] = df[field].astype(type(value))
+    df.loc[1, field] = value
+    r = client.post("/score_order", json=_records(df, 3)[1])
+    assert r.status_code == 422 and r.json()["detail"][0]["loc"] == ["body", field]
+    assert client.post("/batch_score", json=_records(df, 3)).status_code == 422
+    columns = {k: df[k].tolist() for k in df.columns}
+    assert client.post("/batch_score/columnar", json=columns).status_code == 422
+    assert _stream(client, df.to_csv(index=False), csv=True)[-1]["error"] == "invalid rows"
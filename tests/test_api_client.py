@@ -0,0 +1,52 @@
+import io
+
+import orjson
+import pandas as pd
+import pytest
+
+from src.api_client import BatchRejected, ScoringClient, _csv_records
+
+
+def test_csv_records_keep_quoted_line_breaks():
+    data = b'id,note\n1,"two\nlines"\n2,"say ""hi""\n"\n3,plain'
+    assert _csv_records(data) == [b"id,note\n", b'1,"two\nlines"\n', b'2,"say ""hi""\n"\n', b"3,plain"]
+
+
+class _Response:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+def _fake_stream(self, method, path, handle, data, **kwargs):
+    """
+    Stand-in for the server: echo each chunk's order_ids, or reject its
+    rows whose order_id starts with "bad" (row numbers relative to the chunk).
+    """
+    df = pd.read_csv(io.BytesIO(data), dtype=str)
+    bad = [i for i, o in enumerate(df["order_id"]) if o.startswith("bad")]
+    if bad:
+        lines = [orjson.dumps({"error": "invalid rows", "detail": [{"loc": ["body", "order_id"], "rows": bad}]})]
+    else:
+        lines = [orjson.dumps({"order_id": o}) for o in df["order_id"]]
+        lines.append(orjson.dumps({"n_orders": len(df), "late_count": 0}))
+    return handle(_Response(lines)), 1
+
+
+def test_score_csv_chunks_on_record_boundaries(monkeypatch):
+    monkeypatch.setattr(ScoringClient, "_request", _fake_stream)
+    ids = ["a", "b\nc", 'd "e"', "f", "g\r\nh"]
+    data = pd.DataFrame({"order_id": ids, "x": range(5)}).to_csv(index=False).encode()
+    out = ScoringClient("http://api").score_csv(data, chunk_rows=2, parallelism=2)
+    assert out["n_chunks"] == 3 and out["n_orders"] == 5
+    assert [r["order_id"] for r in out["results"]] == ids
+
+
+def test_score_csv_reports_rows_from_upload_start(monkeypatch):
+    monkeypatch.setattr(ScoringClient, "_request", _fake_stream)
+    data = pd.DataFrame({"order_id": ["a", "b", "c", "bad"]}).to_csv(index=False).encode()
+    with pytest.raises(BatchRejected, match="invalid rows") as exc:
+        ScoringClient("http://api").score_csv(data, chunk_rows=2)
+    assert exc.value.detail == [{"loc": ["body", "order_id"], "rows": [3]}]
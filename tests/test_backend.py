@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from src import model_store
+from src.backend import AdmissionMiddleware, ScoringBackend
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def lane():
+    """
+    A one-slot interactive lane in front of endpoints that hold it until
+    told to finish.
+    """
+    backend = ScoringBackend(interactive_threads=1, interactive_max_queue=0)
+    release = asyncio.Event()
+
+    async def hold(request):
+        await release.wait()
+        return JSONResponse({"ok": True})
+
+    async def stream(request):
+        async def body():
+            for i in range(3):
+                yield f"{i}\n".encode()
+        return StreamingResponse(body())
+
+    app = Starlette(routes=[Route("/hold", hold, methods=["POST"]), Route("/stream", stream, methods=["POST"])])
+    lanes = {"/hold": "interactive", "/stream": "interactive"}
+    yield backend, AdmissionMiddleware(app, backend=backend, lanes=lanes), release
+    backend.stop()
+
+
+def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_saturated_lane_sheds_with_retry_after(lane):
+    backend, app, release = lane
+
+    async def run():
+        async with _client(app) as client:
+            held = asyncio.create_task(client.post("/hold"))
+            while backend.admitted["interactive"] == 0:
+                await asyncio.sleep(0.001)
+            shed = await client.post("/hold")
+            release.set()
+            return shed, await held
+
+    shed, held = asyncio.run(run())
+    assert shed.status_code == 503 and shed.headers["retry-after"] == "1"
+    assert held.status_code == 200
+    assert backend.counters()["shed_interactive"] == 1
+    assert backend.admitted["interactive"] == 0
+
+
+def test_slot_released_after_a_streamed_response(lane):
+    backend, app, _ = lane
+
+    async def run():
+        async with _client(app) as client:
+            for _ in range(3):  # a leaked slot would shed the second request
+                r = await client.post("/stream")
+                assert r.status_code == 200 and r.text == "0\n1\n2\n"
+
+    asyncio.run(run())
+    assert backend.admitted["interactive"] == 0
+
+
+def test_slot_released_after_a_client_disconnect(lane):
+    backend, app, _ = lane
+    scope = {"type": "http", "path": "/stream", "method": "POST", "headers": [], "query_string": b""}
+
+    def receiver():
+        messages = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+        async def receive():
+            return next(messages, {"type": "http.disconnect"})
+        return receive
+
+    async def send(message):
+        # The server fails the first body write once the client has gone
+        if message["type"] == "http.response.body":
+            raise OSError("client disconnected")
+
+    async def ignore(message):
+        pass
+
+    asyncio.run(app(scope, receiver(), ignore))  # disconnect reported mid-stream
+    assert backend.admitted["interactive"] == 0
+
+    with pytest.raises(OSError):
+        asyncio.run(app(scope, receiver(), send))
+    assert backend.admitted["interactive"] == 0
+
+    async def cancelled():
+        task = asyncio.create_task(app({**scope, "path": "/hold"}, receiver(), send))
+        while backend.admitted["interactive"] == 0:
+            await asyncio.sleep(0.001)
+        task.cancel()  # how servers abandon a request whose client went away
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+    assert backend.admitted["interactive"] == 0
+
+
+_POOL_CHILD = """
+import json, sys
+from fastapi.testclient import TestClient
+from src import api
+
+submitted = []
+with TestClient(api.app) as client:
+    submit = api.backend.pool.submit
+    api.backend.pool.submit = lambda *a, **k: submitted.append(1) or submit(*a, **k)
+    orders = json.load(sys.stdin)
+    singles = [client.post("/score_order", json=o).json() for o in orders[:5]]
+    batch = client.post("/batch_score", json=orders).json()
+print(json.dumps({"singles": singles, "batch": batch, "submitted": len(submitted)}))
+"""
+
+
+def test_process_pool_scores_like_in_process(tmp_path, client, model, clf, sample_df):
+    model_store.save_artifact(tmp_path, clf, model.encoder, model.forest, model.threshold, model.risk_bands)
+    orders = sample_df.head(300).to_dict(orient="records")
+    env = {
+        **os.environ,
+        "MODEL_DIR": str(tmp_path),
+        "SCORING_PROCESSES": "2",
+        # Every request, single orders included, goes to the worker pool
+        "FLAT_FOREST_MAX_ROWS": "0",
+        "POOL_MIN_ROWS": "1",
+        "POOL_SHARD_ROWS": "64",
+        "PREDICTION_CACHE_MB": "0",
+    }
+    out = subprocess.run(
+        [sys.executable, "-c", _POOL_CHILD], input=json.dumps(orders), env=env, cwd=ROOT,
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+    pooled = json.loads(out.stdout.splitlines()[-1])
+    # One shard per single order, then the batch in 64-row shards
+    assert pooled["submitted"] == 5 + -(-len(orders) // 64)
+
+    assert pooled["singles"] == [client.post("/score_order", json=o).json() for o in orders[:5]]
+    assert pooled["batch"] == client.post("/batch_score", json=orders).json()
@@ -0,0 +1,111 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src import batch_store
+from src.batch_store import ScoredBatchStore
+from src.kpis import RISK_BINS, batch_kpis
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Small row groups so a few hundred rows span several of them
+    monkeypatch.setattr(batch_store, "ROW_GROUP_ROWS", 100)
+    return ScoredBatchStore(tmp_path, ttl_s=3600, max_batches=3)
+
+
+def _batch(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "order_id": np.arange(n),
+        "plant": np.where(np.arange(n) % 2, "P1", "P2"),
+        "late_probability": np.linspace(0, 1, n),
+    })
+
+
+def test_pages_span_row_groups(store):
+    df = _batch(350)
+    batch_id = store.save(df)
+    assert store.n_rows(batch_id) == 350
+
+    # Page boundaries that never line up with the 100-row groups
+    pages = [store.page(batch_id, p, 70) for p in range(6)]
+    assert [len(p) for p in pages] == [70, 70, 70, 70, 70, 0]
+    pd.testing.assert_frame_equal(pd.concat(pages[:5], ignore_index=True), df)
+    assert store.page(batch_id, 1, 150)["order_id"].tolist() == list(range(150, 300))
+    assert store.page(batch_id, 9, 70).columns.tolist() == df.columns.tolist()
+
+
+def test_export_csv(store):
+    df = _batch(250)
+    path = store.export_csv(store.save(df))
+    pd.testing.assert_frame_equal(pd.read_csv(path), df)
+
+    # A writer closed before any rows leaves a file with no row groups at all
+    pq.ParquetWriter(store._path("empty"), pa.Schema.from_pandas(df, preserve_index=False)).close()
+    assert pq.ParquetFile(store._path("empty")).num_row_groups == 0
+    assert store.export_csv("empty").read_text().strip() == "order_id,plant,late_probability"
+
+
+def test_evicts_past_the_cap_and_ttl(store):
+    ids = []
+    for i in range(5):
+        ids.append(store.save(_batch(10)))
+        store.export_csv(ids[-1])
+        # Distinct mtimes so "newest" is well defined
+        stamp = time.time() - 10 + i
+        os.utime(store._path(ids[-1]), (stamp, stamp))
+    store.evict()
+    assert [store.exists(b) for b in ids] == [False, False, True, True, True]
+    assert not store._path(ids[0], ".csv").exists()
+
+    old = time.time() - 2 * store.ttl_s
+    os.utime(store._path(ids[2]), (old, old))
+    store.evict()
+    assert [store.exists(b) for b in ids[2:]] == [False, True, True]
+    with pytest.raises(KeyError):
+        store.n_rows("../etc")
+
+
+def test_batch_kpis_totals_and_bands():
+    batch = pd.DataFrame({
+        "plant": ["P1", "P1", "P2", "P2", "P2"],
+        "customer_id": ["C1", "C2", "C1", "C1", "C3"],
+        "item_id": ["I1"] * 5,
+        "late_probability": [0.05, 0.25, 0.5, 0.85, 1.0],
+        "late_flag_pred": [0, 0, 1, 1, 1],
+        "order_qty": [10, 10, 10, 10, 0],
+        "current_available_qty": [20, 5, 0, 10, 0],
+        "supplier_reliability_score": [0.9, 0.8, 0.7, 0.6, 0.5],
+    })
+    k = batch_kpis(batch)
+    assert (k["total"], k["late_count"]) == (5, 3)
+    assert k["late_rate"] == pytest.approx(0.6) and k["on_time_rate"] == pytest.approx(0.4)
+    # ATP capped at 1 per order; zero quantities don't divide by zero
+    assert k["atp_ratio"] == pytest.approx((1 + 0.5 + 0 + 1 + 0) / 5)
+    assert k["avg_supplier_rel"] == pytest.approx(0.7)
+    assert np.isnan(k["avg_lead"])
+
+    # One order per band; 1.0 falls in the last one
+    assert len(RISK_BINS) - 1 == len(k["risk_hist"])
+    assert k["risk_hist"].tolist() == [1, 1, 1, 0, 2]
+    assert k["risk_hist"].index[0] == "0.00–0.20"
+    assert k["risk_dist"].sum() == 5
+
+    plants = k["groups"]["plant"]
+    assert plants.index.tolist() == ["P2", "P1"]
+    assert plants.loc["P2", "orders"] == 3 and plants.loc["P2", "expected_late"] == pytest.approx(2.35)
+    assert plants.loc["P1", "late_rate"] == 0
+    assert len(k["scatter"]) == 5
+    assert len(batch_kpis(batch, scatter_points=2)["scatter"]) == 2
+
+
+def test_batch_kpis_empty_batch():
+    k = batch_kpis(pd.DataFrame(columns=["late_probability", "late_flag_pred", "order_qty", "current_available_qty"]))
+    assert (k["total"], k["late_count"], k["late_rate"]) == (0, 0, 0.0)
+    assert np.isnan(k["atp_ratio"])
+    assert k["risk_hist"].sum() == 0
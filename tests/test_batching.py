@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.batching import MicroBatcher
+
+
+def _score(X):
+    return X[:, 0], (X[:, 0] >= 0.5).astype(np.int8)
+
+
+def test_submit_before_start_raises():
+    batcher = MicroBatcher(_score)
+    with pytest.raises(RuntimeError, match="start"):
+        asyncio.run(batcher.submit(np.zeros((1, 2))))
+
+
+def test_rows_come_back_to_their_callers():
+    calls = []
+
+    def score(X):
+        calls.append(len(X))
+        return _score(X)
+
+    async def run():
+        batcher = MicroBatcher(score, max_wait_ms=20)
+        await batcher.start()
+        rows = [np.array([[p, 0.0]]) for p in (0.1, 0.6, 0.3)]
+        results = await asyncio.gather(*(batcher.submit(r) for r in rows))
+        await batcher.stop()
+        with pytest.raises(RuntimeError):
+            await batcher.submit(rows[0])
+        return results
+
+    assert asyncio.run(run()) == [(0.1, 0), (0.6, 1), (0.3, 0)]
+    assert calls == [3]
+
+
+
+def test_stop_fails_waiting_callers():
+    release = threading.Event()
+
+    async def run():
+        loop, scoring = asyncio.get_running_loop(), asyncio.Event()
+
+        def score(X):
+            loop.call_soon_threadsafe(scoring.set)
+            release.wait()
+            return _score(X)
+
+        # max_batch=1: the first order is mid-score while the second is still queued
+        batcher = MicroBatcher(score, max_wait_ms=0, max_batch=1)
+        await batcher.start()
+        calls = [asyncio.create_task(batcher.submit(np.array([[p, 0.0]]))) for p in (0.1, 0.6)]
+        await scoring.wait()
+        await batcher.stop()
+        # Let the executor thread finish so asyncio.run can shut it down
+        release.set()
+        # Bounded: callers that are never resolved would otherwise hang the test
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 5)
+
+    results = asyncio.run(run())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert all("stopped" in str(r) for r in results)
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from src.api_client import ScoringClient
+from src.batch_store import ScoredBatchStore
+from src.metrics import MetricsRegistry
+
+DASHBOARD = str(Path(__file__).resolve().parents[1] / "src" / "dashboard.py")
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    monkeypatch.setenv("DASH_USER", "exec@example.com")
+    monkeypatch.setenv("DASH_PASS", "secret")
+    monkeypatch.setattr(ScoredBatchStore.__init__, "__defaults__", (tmp_path, 86400.0, 100))
+
+    def run(server_metrics: dict) -> AppTest:
+        monkeypatch.setattr(ScoringClient, "get_json", lambda self, path, **kw: server_metrics)
+        st.cache_data.clear()  # fetch_server_metrics is cached per process
+        app = AppTest.from_file(DASHBOARD, default_timeout=30)
+        app.session_state["authed"] = True
+        app.session_state["user"] = "exec@example.com"
+        app.session_state["role"] = "EXEC"
+        return app.run()
+
+    return run
+
+
+def test_metrics_render_after_a_rejected_request(dashboard):
+    # A 422 is timed by the middleware but never reaches a scoring stage
+    registry = MetricsRegistry()
+    registry.observe_request("/score_order", 422, 1.5)
+    app = dashboard(registry.to_json())
+    assert not app.exception
+    assert any(m.label == "Server p50" for m in app.metric)
+    assert not any("Per-stage" in c.value for c in app.caption)
+
+
+def test_stage_table_shown_for_scored_requests(dashboard):
+    registry = MetricsRegistry()
+    registry.observe_request("/score_order", 200, 1.5)
+    registry.observe_stage("/score_order", "predict", 0.5)
+    app = dashboard(registry.to_json())
+    assert not app.exception
+    assert any("Per-stage" in c.value for c in app.caption)
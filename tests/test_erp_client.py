@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from src import erp_client
+
+
+@pytest.fixture
+def extract(tmp_path, monkeypatch, train_df):
+    monkeypatch.setattr(erp_client, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(erp_client, "CACHE_DIR", tmp_path / ".cache")
+    df = train_df.head(600).copy()
+    # 100 customers in the first chunk, 500 more in the rest (int8 -> int16 codes)
+    df["customer_id"] = [f"C{i % 100}" if i < 200 else f"C{i}" for i in range(len(df))]
+    df.to_csv(tmp_path / "orders.csv", index=False)
+    return df
+
+
+def test_cache_survives_growing_categories(extract):
+    chunks = list(erp_client.iter_open_orders("orders.csv", chunk_rows=200))
+    assert sum(len(c) for c in chunks) == len(extract)
+    cached = erp_client.load_open_orders("orders.csv")
+    assert cached["customer_id"].astype(str).tolist() == extract["customer_id"].tolist()
+    assert len(list((erp_client.CACHE_DIR).glob("*.parquet"))) == 1
+
+
+def test_changed_source_gets_a_new_cache(extract, tmp_path):
+    erp_client.load_open_orders("orders.csv")
+    changed = extract.head(50)
+    changed.to_csv(tmp_path / "orders.csv", index=False)
+    st = (tmp_path / "orders.csv").stat()
+    os.utime(tmp_path / "orders.csv", ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert len(erp_client.load_open_orders("orders.csv")) == 50
+    assert [p.name for p in erp_client.CACHE_DIR.glob("*.parquet")] == [
+        erp_client._cache_path(tmp_path / "orders.csv").name
+    ]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from src.features import FeatureEncoder
+from src.schema import ColumnarValidationError
+
+
+def test_transform_one_matches_transform(encoder, sample_df):
+    X = encoder.transform(sample_df)
+    for i, record in enumerate(sample_df.head(20).to_dict(orient="records")):
+        np.testing.assert_array_equal(encoder.transform_one(record)[0], X[i])
+
+
+def test_unknown_categories_encode_as_zero(encoder, sample_df):
+    row = sample_df.head(1).copy()
+    row["plant"] = "PLANT_UNSEEN"
+    row["customer_id"] = "C_UNSEEN"
+    X = encoder.transform(row)
+    plant_cols = list(encoder.categories["plant"].values())
+    assert X[0, plant_cols].sum() == 0
+    assert X[0, encoder.columns.index("customer_id_freq")] == 0
+
+
+def test_round_trip_through_dict(encoder, sample_df):
+    restored = FeatureEncoder.from_dict(encoder.to_dict())
+    np.testing.assert_array_equal(restored.transform(sample_df), encoder.transform(sample_df))
+
+
+def test_fit_chunks_matches_fit(train_df):
+    df = train_df.drop(columns=["late_flag"])
+    whole = FeatureEncoder.fit(df)
+    chunked = FeatureEncoder.fit_chunks([df.iloc[i:i + 700] for i in range(0, len(df), 700)])
+    assert chunked.to_dict() == whole.to_dict()
+
+
+def test_source_fields_rows_sum_to_one(encoder):
+    fields, weights = encoder.source_fields()
+    assert weights.shape == (encoder.n_features, len(fields))
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+    assert "plant" in fields and "order_date" in fields
+
+
+def test_transform_one_rejects_bad_date(encoder, sample_df):
+    record = sample_df.head(1).to_dict(orient="records")[0]
+    for value in ["", "soon"]:
+        with pytest.raises(ColumnarValidationError) as exc:
+            encoder.transform_one(dict(record, promised_ship_date=value))
+        assert exc.value.errors[0]["loc"] == ["body", "promised_ship_date"]
@@ -0,0 +1,58 @@
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.forest import FlatForest
+
+
+def test_flat_forest_matches_sklearn(clf, encoder, sample_df):
+    X = encoder.transform(sample_df)
+    forest = FlatForest.from_sklearn(clf)
+    np.testing.assert_allclose(forest.predict_proba(X), clf.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_apply_returns_leaves(clf, encoder, sample_df):
+    forest = FlatForest.from_sklearn(clf)
+    leaves = forest.apply(encoder.transform(sample_df))
+    assert leaves.shape == (len(sample_df), forest.n_trees)
+    assert forest.is_leaf[leaves].all()
+    np.testing.assert_array_equal(leaves, clf.apply(encoder.transform(sample_df)) + forest.roots)
+
+
+def test_single_row(clf, encoder, sample_df):
+    X = encoder.transform(sample_df.head(1))
+    forest = FlatForest.from_sklearn(clf)
+    np.testing.assert_allclose(forest.predict_proba(X), clf.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_contributions_sum_to_probability(clf, encoder, sample_df):
+    X = encoder.transform(sample_df)
+    forest = FlatForest.from_sklearn(clf)
+    contrib = forest.contributions(forest.apply(X), encoder.n_features)
+    np.testing.assert_allclose(forest.bias + contrib.sum(axis=1), clf.predict_proba(X)[:, 1], atol=1e-6)
+
+
+def test_leaf_contributions_built_once_under_concurrency(clf, encoder, monkeypatch):
+    forest = FlatForest.from_sklearn(clf)
+    build = forest._build_leaf_contributions
+    calls = []
+
+    def slow_build(n_features):
+        calls.append(n_features)
+        time.sleep(0.05)
+        return build(n_features)
+
+    monkeypatch.setattr(forest, "_build_leaf_contributions", slow_build)
+    with ThreadPoolExecutor(8) as pool:
+        tables = list(pool.map(lambda _: forest.leaf_contributions(encoder.n_features), range(8)))
+    assert len(calls) == 1
+    assert all(t is tables[0] for t in tables)
+
+
+def test_pickled_forest_rebuilds_contributions(clf, encoder):
+    forest = FlatForest.from_sklearn(clf)
+    _, contrib = forest.leaf_contributions(encoder.n_features)
+    restored = pickle.loads(pickle.dumps(forest))
+    np.testing.assert_array_equal(restored.leaf_contributions(encoder.n_features)[1], contrib)
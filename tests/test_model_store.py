@@ -0,0 +1,43 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+from src import aggregate_store, model_store
+from src.forest import FlatForest
+
+
+def test_artifact_round_trip(tmp_path, encoder, clf, sample_df):
+    version = model_store.save_artifact(tmp_path, clf, encoder, FlatForest.from_sklearn(clf), 0.5, {"high": 0.7})
+    loaded = model_store.load_artifact(tmp_path)
+    assert loaded.version == version
+    X = encoder.transform(sample_df)
+    np.testing.assert_allclose(loaded.forest.predict_proba(X), clf.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_sklearn_model_scores_single_threaded(tmp_path, encoder, clf, train_df):
+    parallel = clone(clf).set_params(n_jobs=-1).fit(encoder.transform(train_df), train_df["late_flag"])
+    model_store.save_artifact(tmp_path, parallel, encoder, FlatForest.from_sklearn(parallel), 0.5, {})
+    assert joblib.load(tmp_path / model_store.SKLEARN_NAME).n_jobs == 1
+
+    # Older artifacts were saved with n_jobs=-1
+    joblib.dump(clone(clf).set_params(n_jobs=-1), tmp_path / model_store.SKLEARN_NAME)
+    assert model_store.load_artifact(tmp_path, verify=False).sklearn_model.n_jobs == 1
+
+
+def test_scoring_version_tracks_the_aggregate_store(tmp_path, monkeypatch, model):
+    assert model.scoring_version == model.version  # no aggregate columns
+
+    store = aggregate_store.AggregateStore.empty(tmp_path)
+    monkeypatch.setattr(aggregate_store, "_store", store)
+    monkeypatch.setattr(model.encoder, "aggregates", aggregate_store.AGGREGATE_FEATURES[:1])
+    before = model.scoring_version
+    store.generation += 1
+    assert model.scoring_version != before and model.scoring_version.startswith(model.version)
+
+
+def test_missing_aggregate_store_is_a_clear_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregate_store, "_store", None)
+    monkeypatch.setattr(aggregate_store, "AGG_STORE_DIR", tmp_path)
+    with pytest.raises(FileNotFoundError, match="src.train_model"):
+        aggregate_store.get_store()
@@ -0,0 +1,44 @@
+import numpy as np
+
+from src.prediction_cache import PredictionCache, row_keys
+
+
+def test_row_keys_depend_on_row_and_version():
+    X = np.array([[1.0, 2.0], [1.0, 2.0], [1.0, 3.0]], dtype=np.float32)
+    keys = row_keys(X, "v1")
+    assert keys[0] == keys[1] != keys[2]
+    assert row_keys(X, "v2")[0] != keys[0]
+    assert row_keys(np.array([[-0.0, 2.0]]), "v1")[0] == row_keys(np.array([[0.0, 2.0]]), "v1")[0]
+
+
+def test_lookup_hits_after_store():
+    cache = PredictionCache(1 << 20, ttl_s=60)
+    keys = row_keys(np.eye(3, dtype=np.float32), "v1")
+    cache.store(keys[:2], np.array([0.25, 0.75]), np.array([0, 1]))
+    probs, flags, hit = cache.lookup(keys)
+    assert hit.tolist() == [True, True, False]
+    assert probs[:2].tolist() == [0.25, 0.75] and flags[:2].tolist() == [0, 1]
+    assert cache.counters()["hits"] == 2 and cache.counters()["misses"] == 1
+
+
+def test_entries_expire():
+    cache = PredictionCache(1 << 20, ttl_s=-1)
+    keys = row_keys(np.eye(2, dtype=np.float32), "v1")
+    cache.store(keys, np.array([0.1, 0.2]), np.array([0, 0]))
+    assert not cache.lookup(keys)[2].any()
+    assert cache.counters()["expirations"] == 2
+
+
+def test_lru_eviction_respects_cap():
+    cache = PredictionCache(0, ttl_s=60)  # one entry
+    keys = row_keys(np.eye(2, dtype=np.float32), "v1")
+    cache.store(keys, np.array([0.1, 0.2]), np.array([0, 0]))
+    assert len(cache) == 1
+    assert cache.lookup(keys)[2].tolist() == [False, True]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    keys = row_keys(np.eye(2, dtype=np.float32), "v1")
+    PredictionCache(1 << 20, 60, disk_dir=tmp_path).store(keys, np.array([0.1, 0.9]), np.array([0, 1]))
+    probs, flags, hit = PredictionCache(1 << 20, 60, disk_dir=tmp_path).lookup(keys)
+    assert hit.all() and probs.tolist() == [0.1, 0.9]
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import erp_client, rescore
+from src.inference import predict
+from src.order_delta import FingerprintStore, ScoredOrderTable
+
+
+def test_diff_finds_new_changed_and_closed(tmp_path, sample_df):
+    store = FingerprintStore(tmp_path / "fp.npz", "v1")
+    book = sample_df.head(5)
+    assert len(store.diff(book).new) == 5
+    store.commit(store.diff(book))
+
+    nxt = book.drop(index=0).copy()
+    nxt.loc[2, "order_qty"] += 1
+    nxt = pd.concat([nxt, sample_df.iloc[[10]]])
+    delta = FingerprintStore(tmp_path / "fp.npz", "v1").diff(nxt)
+    assert delta.new["order_id"].tolist() == [sample_df.loc[10, "order_id"]]
+    assert delta.changed["order_id"].tolist() == [book.loc[2, "order_id"]]
+    assert delta.closed.tolist() == [book.loc[0, "order_id"]]
+
+    # Another scoring version: every open order counts as changed
+    stale = FingerprintStore(tmp_path / "fp.npz", "v2").diff(book)
+    assert len(stale.new) == 0 and len(stale.changed) == 5
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch, model, sample_df):
+    """
+    Writes an open-order book where rescore() reads it, bumping the mtime
+    so erp_client's cache always sees the new extract.
+    """
+    monkeypatch.setattr(erp_client, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(erp_client, "CACHE_DIR", tmp_path / ".cache")
+    path = tmp_path / "open.csv"
+
+    def write(df):
+        old = path.stat().st_mtime_ns if path.exists() else 0
+        df.to_csv(path, index=False)
+        mtime = max(path.stat().st_mtime_ns, old + 1)
+        os.utime(path, ns=(mtime, mtime))
+
+    write(sample_df.head(50))
+    return write
+
+
+def _run(tmp_path):
+    return rescore.rescore("open.csv", tmp_path / "delta")
+
+
+def _table(tmp_path):
+    table = ScoredOrderTable(tmp_path / "delta" / "scored_orders.sqlite")
+    try:
+        return table.read().set_index("order_id")
+    finally:
+        table.close()
+
+
+def test_rescore_scores_only_the_delta(tmp_path, feed, model, sample_df):
+    assert _run(tmp_path)["scored"] == 50
+    assert _run(tmp_path)["scored"] == 0
+
+    book = sample_df.head(51).drop(index=0).copy()
+    book.loc[7, "current_available_qty"] += 1
+    feed(book)
+    summary = _run(tmp_path)
+    assert (summary["new"], summary["changed"], summary["closed"], summary["scored"]) == (1, 1, 1, 2)
+
+    table = _table(tmp_path)
+    assert len(table) == 50 and sample_df.loc[0, "order_id"] not in table.index
+    probs, _ = predict(model.encoder.transform(book))
+    np.testing.assert_allclose(table.loc[book["order_id"], "late_probability"], np.round(probs, 4))
+
+
+def test_scoring_version_change_rescores_everything(tmp_path, feed, model, monkeypatch):
+    _run(tmp_path)
+    monkeypatch.setattr(model, "version", "test-model-2")
+    assert _run(tmp_path)["scored"] == 50
+    assert set(_table(tmp_path)["model_version"]) == {"test-model-2"}
+
+
+def test_failed_run_leaves_fingerprints_uncommitted(tmp_path, feed, sample_df, monkeypatch):
+    _run(tmp_path)
+    fingerprints = (tmp_path / "delta" / "fingerprints.npz").read_bytes()
+    book = sample_df.head(50).copy()
+    book.loc[3, "order_qty"] += 5
+    feed(book)
+
+    def broken(X):
+        raise RuntimeError("scoring failed")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(rescore, "predict", broken)
+        with pytest.raises(RuntimeError):
+            _run(tmp_path)
+    assert (tmp_path / "delta" / "fingerprints.npz").read_bytes() == fingerprints
+    assert _run(tmp_path)["changed"] == 1
+
+
+def test_crash_between_merge_and_commit_rescores(tmp_path, feed, sample_df, monkeypatch):
+    # The table is written first, so a crash before the commit re-scores
+    # the same rows next cycle rather than skipping them
+    _run(tmp_path)
+    book = sample_df.head(50).copy()
+    book.loc[3, "order_qty"] += 5
+    feed(book)
+
+    def crash(self, delta):
+        raise RuntimeError("crashed before commit")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(FingerprintStore, "commit", crash)
+        with pytest.raises(RuntimeError):
+            _run(tmp_path)
+    scored_at = _table(tmp_path).loc[book.loc[3, "order_id"], "scored_at"]
+    assert _run(tmp_path)["changed"] == 1
+    assert _table(tmp_path).loc[book.loc[3, "order_id"], "scored_at"] > scored_at
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.schema import ColumnarValidationError, parse_date, parse_dates, validate_columns
+
+
+@pytest.fixture
+def payload(sample_df):
+    return {k: sample_df[k].head(5).tolist() for k in sample_df.columns}
+
+
+def test_valid_payload(payload):
+    columns = validate_columns(payload)
+    assert columns["order_qty"].dtype == np.int64
+    assert columns["order_date"].dtype == np.dtype("datetime64[D]")
+    assert columns["order_id"].tolist() == payload["order_id"]
+
+
+def _errors(payload):
+    with pytest.raises(ColumnarValidationError) as exc:
+        validate_columns(payload)
+    return exc.value.errors
+
+
+def test_missing_field(payload):
+    del payload["plant"]
+    assert _errors(payload) == [{"loc": ["body", "plant"], "msg": "field required", "type": "missing"}]
+
+
+def test_out_of_range_rows_reported(payload):
+    payload["supplier_reliability_score"][3] = 1.5
+    (err,) = _errors(payload)
+    assert err["type"] == "range" and err["rows"] == [3]
+
+
+def test_length_mismatch(payload):
+    payload["order_qty"] = payload["order_qty"][:2]
+    assert _errors(payload)[0]["type"] == "length_mismatch"
+
+
+def test_fractional_int(payload):
+    payload["order_qty"][0] = 1.5
+    assert _errors(payload)[0]["type"] == "int_from_float"
+
+
+def test_parse_dates_formats():
+    dates = parse_dates(["2024-03-05", "03/05/2024", "March 5, 2024", "", None, "soon"])
+    assert dates[:3].tolist() == [np.datetime64("2024-03-05", "D").item()] * 3
+    assert np.isnat(dates[3:]).all()
+    assert parse_date("2024-03-05T10:00") == np.datetime64("2024-03-05")
+    assert parse_date("03/05/2024") == np.datetime64("2024-03-05")
+    assert np.isnat(parse_date(""))
+
+
+@pytest.mark.parametrize("value", [5, "abc", None, {"a": 1}])
+def test_scalar_column(payload, value):
+    payload["order_qty"] = value
+    assert _errors(payload) == [{"loc": ["body", "order_qty"], "msg": "expected a list", "type": "list_type"}]
+
+
+@pytest.mark.parametrize("field", ["order_qty", "plant", "order_date"])
+def test_nested_values(payload, field):
+    payload[field] = [[1, 2], [3]] + payload[field][2:]
+    assert _errors(payload)[0]["loc"] == ["body", field]
@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from src import serialize
+
+
+@pytest.fixture
+def batch():
+    rng = np.random.default_rng(0)
+    probs = rng.random(50)
+    probs[:3] = [0.0, 1.0, 0.99995]
+    return [f"SO{i:05d}" for i in range(50)], probs, (probs >= 0.5).astype(np.int8)
+
+
+def _expected(ids, probs, preds):
+    return [
+        {"order_id": i, "late_flag_pred": int(f), "late_probability": round(float(p), 4)}
+        for i, f, p in zip(ids, preds, probs)
+    ]
+
+
+@pytest.mark.parametrize("ids", [None, [f"O{i}" for i in range(50)], ['A"1', "b\\2", "é\n"] + ["x"] * 47])
+def test_results_json_matches_row_dicts(batch, ids):
+    ids = ids or batch[0]
+    _, probs, preds = batch
+    out = json.loads(serialize.results_json(ids, probs, preds))
+    assert out == {"n_orders": 50, "late_count": int(preds.sum()), "results": _expected(ids, probs, preds)}
+
+
+def test_results_ndjson(batch):
+    lines = [json.loads(line) for line in serialize.results_ndjson(*batch).splitlines()]
+    assert lines[:-1] == _expected(*batch)
+    assert lines[-1] == {"n_orders": 50, "late_count": int(batch[2].sum())}
+    assert serialize.results_ndjson(*batch, None, False).count(b"\n") == 50
+
+
+def test_results_columnar(batch):
+    ids, probs, preds = batch
+    out = json.loads(serialize.results_columnar(ids, probs, preds))
+    assert out["order_id"] == ids
+    assert out["late_flag_pred"] == preds.tolist()
+    assert out["late_probability"] == np.round(probs, 4).tolist()
+
+
+def test_results_arrow(batch):
+    ids, probs, preds = batch
+    table = pa.ipc.open_stream(serialize.results_arrow(ids, probs, preds)).read_all()
+    assert table["order_id"].to_pylist() == ids
+    assert table["late_probability"].to_pylist() == probs.tolist()
+    assert table.schema.metadata[b"n_orders"] == b"50"
+
+
+def test_empty_batch():
+    out = json.loads(serialize.results_json([], np.empty(0), np.empty(0, dtype=np.int8)))
+    assert out == {"n_orders": 0, "late_count": 0, "results": []}
+
+
+def test_drivers_in_every_format(batch):
+    ids, probs, preds = batch
+    drivers = serialize.Drivers(0.5, np.full((50, 2), "plant", dtype=object), np.full((50, 2), 0.01))
+    row = json.loads(serialize.results_json(ids, probs, preds, drivers))
+    assert row["base_probability"] == 0.5
+    assert row["results"][0]["drivers"] == [{"field": "plant", "contribution": 0.01}] * 2
+    assert json.loads(serialize.results_columnar(ids, probs, preds, drivers))["driver_field"][0] == ["plant", "plant"]
+    table = pa.ipc.open_stream(serialize.results_arrow(ids, probs, preds, drivers)).read_all()
+    assert table["driver_contribution"][0].as_py() == [0.01, 0.01]
+
+
+@pytest.mark.parametrize(
+    "accept, default, expected",
+    [
+        (None, serialize.JSON, serialize.JSON),
+        ("*/*", serialize.COLUMNAR_JSON, serialize.COLUMNAR_JSON),
+        ("application/vnd.apache.arrow.stream, */*", serialize.JSON, serialize.ARROW_STREAM),
+        ("application/x-ndjson", serialize.JSON, serialize.NDJSON),
+        # q=0 rules a format out
+        ("application/json, application/vnd.apache.arrow.stream;q=0", serialize.JSON, serialize.JSON),
+        ("*/*, application/vnd.erp.columnar+json;q=0", serialize.COLUMNAR_JSON, serialize.ARROW_STREAM),
+        # Highest q wins, whatever the order
+        ("application/vnd.apache.arrow.stream;q=0.5, application/x-ndjson", serialize.JSON, serialize.NDJSON),
+        ("application/json;q=0.9, */*;q=0.1", serialize.ARROW_STREAM, serialize.JSON),
+        # Equal q: the client's first choice
+        ("application/json, application/vnd.apache.arrow.stream", serialize.COLUMNAR_JSON, serialize.JSON),
+        ("application/x-ndjson;q=0.8, application/json;q=0.8", serialize.JSON, serialize.NDJSON),
+        # Nothing supported
+        ("text/html", serialize.JSON, serialize.JSON),
+        ("application/vnd.apache.arrow.stream;q=bogus", serialize.JSON, serialize.JSON),
+    ],
+)
+def test_negotiate(accept, default, expected):
+    assert serialize.negotiate(accept, default) == expected